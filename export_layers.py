@@ -26,6 +26,7 @@ import gimpenums
 from export_layers import batcher as batcher_
 from export_layers import exceptions
 from export_layers import settings_main
+from export_layers import sharding
 from export_layers import update
 from export_layers import utils as utils_
 from export_layers.gui import main as gui_main
@@ -108,11 +109,103 @@ def plug_in_export_layers_repeat(run_mode, image):
     pg.setting.StringSetting(name='config_filepath', display_name=_('Path to configuration file'))]
 )
 def plug_in_export_layers_with_config(run_mode, image, config_filepath):
-  if not config_filepath or not os.path.isfile(config_filepath):
+  layer_tree = pg.itemtree.LayerTree(image, name=pg.config.SOURCE_NAME)
+  
+  if not _load_settings_from_config(config_filepath):
     sys.exit(1)
   
+  _run_plugin_noninteractive(gimpenums.RUN_NONINTERACTIVE, layer_tree)
+
+
+@pg.procedure(
+  blurb=_(
+    'Run "{}" with the specified configuration file in multiple GIMP instances'
+  ).format(pg.config.PLUGIN_TITLE),
+  description=_(
+    'Layers are split into groups, each exported by a separate GIMP instance'
+    ' running in the background. Output filenames are the same as if the layers'
+    ' were exported in a single GIMP instance.'
+    ' If the configuration cannot be processed in multiple instances (e.g. when'
+    ' batch editing or exporting multiple layers into a single image), layers are'
+    ' processed in the current GIMP instance.'
+    ' This procedure will fail if the specified configuration file does not exist'
+    ' or is not valid.'),
+  author=pg.config.AUTHOR_NAME,
+  copyright_notice=pg.config.AUTHOR_NAME,
+  date=pg.config.COPYRIGHT_YEARS,
+  parameters=[
+    SETTINGS['special/run_mode'],
+    SETTINGS['special/image'],
+    pg.setting.StringSetting(name='config_filepath', display_name=_('Path to configuration file')),
+    pg.setting.IntSetting(
+      name='num_workers',
+      display_name=_('Number of GIMP instances (0 = number of CPUs)'),
+      min_value=0)]
+)
+def plug_in_export_layers_parallel(run_mode, image, config_filepath, num_workers):
   layer_tree = pg.itemtree.LayerTree(image, name=pg.config.SOURCE_NAME)
   
+  if not _load_settings_from_config(config_filepath):
+    sys.exit(1)
+  
+  batcher = batcher_.Batcher(
+    gimpenums.RUN_NONINTERACTIVE,
+    layer_tree.image,
+    SETTINGS['main/procedures'],
+    SETTINGS['main/constraints'])
+  
+  try:
+    sharding.run(
+      batcher,
+      config_filepath,
+      num_workers=num_workers if num_workers > 0 else None,
+      item_tree=layer_tree,
+      **utils_.get_settings_for_batcher(SETTINGS['main']))
+  except exceptions.BatcherCancelError:
+    pass
+
+
+@pg.procedure(
+  blurb=_('Export layers from a group created by "{}"').format(
+    'plug-in-export-layers-parallel'),
+  description=_(
+    'This procedure is used internally by GIMP instances started from'
+    ' "plug-in-export-layers-parallel" and is not meant to be invoked directly.'),
+  author=pg.config.AUTHOR_NAME,
+  copyright_notice=pg.config.AUTHOR_NAME,
+  date=pg.config.COPYRIGHT_YEARS,
+  parameters=[
+    SETTINGS['special/run_mode'],
+    SETTINGS['special/image'],
+    pg.setting.StringSetting(name='config_filepath', display_name=_('Path to configuration file')),
+    pg.setting.StringSetting(name='shard_filepath', display_name=_('Path to shard file'))]
+)
+def plug_in_export_layers_shard(run_mode, image, config_filepath, shard_filepath):
+  if not shard_filepath or not os.path.isfile(shard_filepath):
+    sys.exit(1)
+  
+  layer_tree = pg.itemtree.LayerTree(image, name=pg.config.SOURCE_NAME)
+  
+  if not _load_settings_from_config(config_filepath):
+    sys.exit(1)
+  
+  batcher = batcher_.Batcher(
+    gimpenums.RUN_NONINTERACTIVE,
+    layer_tree.image,
+    SETTINGS['main/procedures'],
+    SETTINGS['main/constraints'])
+  
+  sharding.run_shard(
+    batcher,
+    shard_filepath,
+    item_tree=layer_tree,
+    **utils_.get_settings_for_batcher(SETTINGS['main']))
+
+
+def _load_settings_from_config(config_filepath):
+  if not config_filepath or not os.path.isfile(config_filepath):
+    return False
+  
   if config_filepath.endswith('.pkl'):
     setting_source_class = pg.setting.PickleFileSource
   else:
@@ -124,14 +217,11 @@ def plug_in_export_layers_with_config(run_mode, image, config_filepath):
   status, unused_ = update.update(
     SETTINGS, handle_invalid='abort', sources={'persistent': setting_source})
   if status == update.ABORT:
-    sys.exit(1)
+    return False
   
   load_result = SETTINGS.load({'persistent': setting_source})
-  if load_result.status not in [
-       pg.setting.Persistor.SUCCESS, pg.setting.Persistor.PARTIAL_SUCCESS]:
-    sys.exit(1)
-  
-  _run_plugin_noninteractive(gimpenums.RUN_NONINTERACTIVE, layer_tree)
+  return load_result.status in [
+    pg.setting.Persistor.SUCCESS, pg.setting.Persistor.PARTIAL_SUCCESS]
 
 
 def _run_noninteractive(layer_tree, args):
@@ -690,6 +690,19 @@ def walk(actions, action_type=None, setting_name=None):
         yield action[setting_name]
 
 
+def get_values_hash(*actions_list):
+  """Returns a hash of the values of all settings in the specified setting
+  groups containing actions.
+  
+  The hash changes if a setting value of any action changes or if an action is
+  added, removed or reordered.
+  """
+  return hash(tuple(
+    (setting.get_path(), repr(setting.value))
+    for actions in actions_list
+    for setting in actions.walk()))
+
+
 _ACTION_TYPES_AND_FUNCTIONS = {
   'procedure': _create_procedure,
   'constraint': _create_constraint,
@@ -8,6 +8,8 @@ from future.builtins import *
 import collections
 import functools
 import inspect
+import io
+import os
 import traceback
 
 import gimp
@@ -21,12 +23,20 @@ from export_layers import builtin_procedures
 from export_layers import exceptions
 from export_layers import export as export_
 from export_layers import placeholders
+from export_layers import profiling
 
 
 _BATCHER_ARG_POSITION_IN_ACTIONS = 0
 _NAME_ONLY_ACTION_GROUP = 'name'
 
 
+_ActionPlan = collections.namedtuple(
+  '_ActionPlan',
+  ['procedures', 'constraints', 'add_default_rename_procedure', 'add_default_export_procedure'])
+
+_CompiledAction = collections.namedtuple('_CompiledAction', ['action', 'function', 'action_groups'])
+
+
 def _set_attributes_on_init(func):
   
   @functools.wraps(func)
@@ -84,6 +94,14 @@ class Batcher(object):
         process_contents=True,
         process_names=True,
         process_export=True,
+        resolved_names=None,
+        profile_actions=False,
+        profile_filepath=None,
+        reorder_constraints=False,
+        cache_pdb_queries=False,
+        instrument_pdb_calls=False,
+        pdb_call_report_filepath=None,
+        scratch_image_pool=None,
         export_context_manager=None,
         export_context_manager_args=None,
         export_context_manager_kwargs=None):
@@ -92,10 +110,15 @@ class Batcher(object):
     self._current_procedure = None
     self._current_constraint = None
     self._current_image = None
+    self._current_group = None
     
     self._orig_active_layer = None
+    self._layer_stager = None
+    
+    self._profile = None
     
     self._exported_raw_items = []
+    self._unchanged_raw_items = []
     self._skipped_procedures = collections.defaultdict(list)
     self._skipped_constraints = collections.defaultdict(list)
     self._failed_procedures = collections.defaultdict(list)
@@ -105,6 +128,12 @@ class Batcher(object):
     
     self._invoker = None
     self._initial_invoker = pg.invoker.Invoker()
+    
+    self._instrumented_pdb = None
+    self._cached_pdb = None
+    self._current_action_names = []
+    self._action_plan = None
+    self._action_plan_key = None
   
   @property
   def initial_run_mode(self):
@@ -227,6 +256,120 @@ class Batcher(object):
     """
     return self._process_export
   
+  @property
+  def resolved_names(self):
+    """Dictionary of (original item name, processed item name) pairs to use
+    instead of processing item names during export.
+    
+    Folders are specified as `(original item name, pygimplib.itemtree.FOLDER_KEY)`
+    keys.
+    
+    If `None` (the default), item names are processed as usual. Otherwise, the
+    names of the exported items and their parents are taken from this
+    dictionary. This allows processing only a subset of items (e.g. one shard
+    from `sharding`) while preserving names obtained from processing all items.
+    """
+    return self._resolved_names
+  
+  @property
+  def profile_actions(self):
+    """If `True`, record the time spent in actions and the number of calls per
+    action, per item and per action group. The recorded data are available in
+    `profile` after `run()`.
+    
+    In addition, the time spent in constraints and the number of items matched
+    by each constraint are available via `item_tree.filter.stats()`.
+    """
+    return self._profile_actions
+  
+  @property
+  def profile_filepath(self):
+    """File path to save data recorded if `profile_actions` is `True` to.
+    
+    The data are saved at the end of `run()`, even if an exception is raised.
+    If the file extension is `'csv'`, the data are saved as CSV, otherwise as
+    JSON. If `None`, the data are not saved.
+    """
+    return self._profile_filepath
+  
+  @property
+  def reorder_constraints(self):
+    """If `True`, constraints are evaluated in the order minimizing the time
+    spent in constraints rather than in the order they were added, based on the
+    time and the number of items matched by each constraint so far. See
+    `pygimplib.objectfilter.ObjectFilter.reorder_rules` for more information.
+    """
+    return self._reorder_constraints
+  
+  @property
+  def cache_pdb_queries(self):
+    """If `True`, results of read-only PDB queries on items (e.g. validity,
+    visibility, size or lock states) are cached during `run()`. See
+    `pygimplib.pdbutils.CachedPdb` for more information.
+    """
+    return self._cache_pdb_queries
+  
+  @property
+  def scratch_image_pool(self):
+    """`pygimplib.pdbutils.ScratchImagePool` instance to obtain image copies
+    from, or `None`.
+    
+    If not `None`, image copies created during `run()` are taken from and
+    returned to the pool rather than being created and deleted in each `run()`.
+    An image copy returned by `run()` if `keep_image_copy` is `True` should be
+    returned to the pool via `ScratchImagePool.release()` once no longer needed.
+    The pool is not cleared by this class.
+    """
+    return self._scratch_image_pool
+  
+  @property
+  def instrument_pdb_calls(self):
+    """If `True`, record the number of calls and the time spent in each PDB
+    procedure called through `pdb` during `run()`, grouped by the action being
+    applied at the time of each call. The recorded data are available in
+    `pdb_call_stats` after `run()`.
+    
+    If `cache_pdb_queries` is also `True`, only calls not answered from the
+    cache are recorded.
+    """
+    return self._instrument_pdb_calls
+  
+  @property
+  def pdb_call_report_filepath(self):
+    """File path to save a summary of PDB calls recorded if
+    `instrument_pdb_calls` is `True` to.
+    
+    The summary is saved at the end of `run()`, even if an exception is raised.
+    If `None`, the summary is not saved.
+    """
+    return self._pdb_call_report_filepath
+  
+  @property
+  def pdb(self):
+    """GIMP procedural database to be used by actions during `run()`.
+    
+    If `cache_pdb_queries` is `True`, this is a `pygimplib.pdbutils.CachedPdb`
+    instance created for each `run()`. Otherwise, this is `uncached_pdb`. PDB
+    procedures added as actions are obtained from this object.
+    """
+    if self._cached_pdb is not None:
+      return self._cached_pdb
+    else:
+      return self.uncached_pdb
+  
+  @property
+  def uncached_pdb(self):
+    """GIMP procedural database bypassing the cache of PDB queries.
+    
+    Use this object for queries whose results may be changed by actions
+    calling `gimp.pdb` directly (e.g. whether an item is still valid).
+    
+    If `instrument_pdb_calls` is `True`, this is a
+    `pygimplib.pdbutils.InstrumentedPdb` instance created for each `run()`,
+    otherwise `gimp.pdb`.
+    """
+    return self._instrumented_pdb if self._instrumented_pdb is not None else pdb
+  
   @property
   def export_context_manager(self):
     """Context manager that wraps exporting a single layer.
@@ -291,6 +434,16 @@ class Batcher(object):
     """
     return list(self._exported_raw_items)
   
+  @property
+  def unchanged_raw_items(self):
+    """List of layers that were not exported because neither the layers nor
+    the procedures applied to them changed since the previous export.
+    
+    Layers are only checked for changes if the `skip_unchanged_layers` argument
+    of the export procedure is `True`.
+    """
+    return list(self._unchanged_raw_items)
+  
   @property
   def skipped_procedures(self):
     """Procedures that were skipped during processing.
@@ -327,12 +480,43 @@ class Batcher(object):
     """
     return dict(self._failed_constraints)
   
+  @property
+  def profile(self):
+    """`profiling.ActionProfile` instance containing the time spent in actions
+    during the last `run()`, or `None` if `profile_actions` was `False`.
+    """
+    return self._profile
+  
+  @property
+  def pdb_call_stats(self):
+    """`pygimplib.pdbutils.InstrumentedPdb` instance containing the number of
+    calls and the time spent in PDB procedures during the last `run()`, or
+    `None` if `instrument_pdb_calls` was `False`.
+    
+    To obtain a summary of the calls, use `get_pdb_call_report()`.
+    """
+    return self._instrumented_pdb
+  
+  @property
+  def current_action_name(self):
+    """Name of the action currently being applied if `instrument_pdb_calls` is
+    `True`, `None` otherwise or if no action is being applied.
+    """
+    return self._current_action_names[-1] if self._current_action_names else None
+  
+  @property
+  def should_stop(self):
+    """`True` if `stop()` was called since the start of the last run, `False`
+    otherwise.
+    """
+    return self._should_stop
+  
   @property
   def invoker(self):
     """`pygimplib.invoker.Invoker` instance to manage procedures and constraints
     applied on layers.
     
-    This property is reset on each call of `run()`.
+    This property is reset on each call of `run()` and `run_single()`.
     """
     return self._invoker
   
@@ -353,23 +537,78 @@ class Batcher(object):
     self._init_attributes(**kwargs)
     self._prepare_for_processing(self._item_tree, keep_image_copy)
     
-    exception_occurred = False
+    return self._run(self._item_tree)
+  
+  def run_single(self, item, keep_image_copy=False, **kwargs):
+    """Processes only the specified item from `item_tree`.
     
-    if self._process_contents:
-      self._setup_contents()
-    try:
-      self._process_items()
-    except Exception:
-      exception_occurred = True
-      raise
-    finally:
-      if self._process_contents:
-        self._cleanup_contents(exception_occurred)
+    Unlike `run()`, only `item` is evaluated against constraints and processed.
+    Other items in `item_tree` are left untouched, except for items that
+    actions explicitly access (e.g. layers inserted as background). The time
+    spent by this method therefore does not grow with the number of items in
+    `item_tree`. This is useful to quickly render a single item, e.g. for the
+    image preview.
     
-    if self._process_contents and self._keep_image_copy:
-      return self._image_copy
-    else:
+    Actions compiled from `procedures` and `constraints` during the last `run()`
+    or `run_single()` are reused if the same `procedures` and `constraints` are
+    used, the values of their settings did not change (including added, removed
+    or reordered actions) and `is_preview` and `edit_mode` did not change.
+    Actions are compiled again if `profile_actions`, `cache_pdb_queries` or
+    `instrument_pdb_calls` is enabled, as the compiled actions are bound to
+    objects created for a single run.
+    
+    `item_tree` must be passed in `**kwargs` or must have been set by a previous
+    run, otherwise `ValueError` is raised.
+    
+    The meaning of `keep_image_copy`, `**kwargs` and the return value is the
+    same as in `run()`. If `item` does not match the constraints, no item is
+    processed.
+    """
+    self._init_attributes(**kwargs)
+    
+    if self._item_tree is None:
+      raise ValueError('item tree must be specified to process a single item')
+    
+    self._prepare_for_processing(self._item_tree, keep_image_copy, reuse_action_plan=True)
+    
+    return self._run([item] if self._item_tree.is_included(item, with_folders=False) else [])
+  
+  def get_pdb_call_report(self, num_procedures=10):
+    """Returns a summary of PDB calls recorded during the last `run()` as a
+    string, including the number of calls per exported layer.
+    
+    `None` is returned if `instrument_pdb_calls` was `False`.
+    
+    See `pygimplib.pdbutils.InstrumentedPdb.get_report()` for more information.
+    """
+    if self._instrumented_pdb is None:
       return None
+    
+    return self._instrumented_pdb.get_report(
+      num_items=len(self._exported_raw_items), num_procedures=num_procedures)
+  
+  def set_results(
+        self,
+        exported_raw_items=None,
+        unchanged_raw_items=None,
+        skipped_procedures=None,
+        skipped_constraints=None,
+        failed_procedures=None,
+        failed_constraints=None):
+    """Replaces the results of the last run with the specified results.
+    
+    This is useful if items were processed outside this instance, e.g. by
+    separate GIMP instances (see the `sharding` module).
+    
+    The arguments have the same format as the corresponding properties. Results
+    that are not specified are cleared.
+    """
+    self._exported_raw_items = list(exported_raw_items or [])
+    self._unchanged_raw_items = list(unchanged_raw_items or [])
+    self._skipped_procedures = collections.defaultdict(list, skipped_procedures or {})
+    self._skipped_constraints = collections.defaultdict(list, skipped_constraints or {})
+    self._failed_procedures = collections.defaultdict(list, failed_procedures or {})
+    self._failed_constraints = collections.defaultdict(list, failed_constraints or {})
   
   def stop(self):
     """Terminates batch processing prematurely.
@@ -454,14 +693,8 @@ class Batcher(object):
     self._initial_invoker.reorder(*args, **kwargs)
   
   def _add_action_from_settings(self, action, tags=None, action_groups=None):
-    """Adds an action and wraps/processes the action's function according to the
-    action's settings.
-    
-    For PDB procedures, the function name is converted to a proper function
-    object. For constraints, the function is wrapped to act as a proper filter
-    rule for `item_tree.filter`. Any placeholder objects (e.g. "current image")
-    as function arguments are replaced with real objects during processing of
-    each item.
+    """Compiles an action from the action's settings via `_compile_action()`
+    and adds the compiled action.
     
     If `tags` is not `None`, the action will not be added if it does not contain
     any of the specified tags.
@@ -469,6 +702,64 @@ class Batcher(object):
     If `action_groups` is not `None`, the action will be added to the specified
     action groups instead of the groups defined in `action['action_groups']`.
     """
+    self._add_compiled_action(self._compile_action(action), tags, action_groups)
+  
+  def _add_compiled_action(self, compiled_action, tags=None, action_groups=None):
+    if compiled_action is None:
+      return
+    
+    if tags is not None and not any(tag in compiled_action.action.tags for tag in tags):
+      return
+    
+    if action_groups is None:
+      action_groups = compiled_action.action_groups
+    
+    self._invoker.add(compiled_action.function, action_groups)
+  
+  def _compile_action_plan(self):
+    """Compiles procedures and constraints into an `_ActionPlan` instance.
+    
+    Settings of actions are read only here, once per `run()`, rather than for
+    each item. `run_single()` may reuse the action plan from the previous run.
+    """
+    compiled_procedures = []
+    compiled_constraints = []
+    has_enabled_rename_procedure = False
+    has_enabled_export_procedure = False
+    
+    for procedure in actions.walk(self._procedures):
+      if procedure['enabled'].value:
+        if procedure['orig_name'].value == 'rename':
+          has_enabled_rename_procedure = True
+        elif procedure['orig_name'].value == 'export':
+          has_enabled_export_procedure = True
+      
+      compiled_procedure = self._compile_action(procedure)
+      if compiled_procedure is not None:
+        compiled_procedures.append(compiled_procedure)
+    
+    for constraint in actions.walk(self._constraints):
+      compiled_constraint = self._compile_action(constraint)
+      if compiled_constraint is not None:
+        compiled_constraints.append(compiled_constraint)
+    
+    return _ActionPlan(
+      tuple(compiled_procedures),
+      tuple(compiled_constraints),
+      not self._edit_mode and not has_enabled_rename_procedure,
+      not self._edit_mode and not has_enabled_export_procedure)
+  
+  def _compile_action(self, action):
+    """Returns a `_CompiledAction` instance containing a function applying the
+    action according to the action's settings, or `None` if the action is not
+    enabled.
+    
+    For PDB procedures, the function name is converted to a proper function
+    object. For constraints, the function is wrapped to act as a proper filter
+    rule for `item_tree.filter`. Any placeholder objects (e.g. "current image")
+    as function arguments are replaced with real objects during processing of
+    each item.
+    """
     if action['origin'].is_item('builtin'):
       if 'procedure' in action.tags:
         function = builtin_procedures.BUILTIN_PROCEDURES_FUNCTIONS[action['orig_name'].value]
@@ -480,7 +771,7 @@ class Batcher(object):
         raise exceptions.ActionError(message, action, None, None)
     elif action['origin'].is_item('gimp_pdb'):
       if pdb.gimp_procedural_db_proc_exists(action['function'].value):
-        function = pdb[pg.utils.safe_encode_gimp(action['function'].value)]
+        function = self.pdb[pg.utils.safe_encode_gimp(action['function'].value)]
       else:
         if action['enabled'].value:
           message = 'PDB procedure "{}" not found'.format(action['function'].value)
@@ -492,45 +783,59 @@ class Batcher(object):
           
           raise exceptions.ActionError(message, action, None, None)
         else:
-          return
+          return None
     else:
       message = 'invalid origin {} for action "{}"'.format(action['origin'].value, action.name)
       raise exceptions.ActionError(message, action, None, None)
     
-    if function is None:
-      return
+    if function is None or not self._is_enabled(action):
+      return None
     
-    if tags is not None and not any(tag in action.tags for tag in tags):
-      return
+    processed_function = self._get_processed_function(action, function)
     
-    processed_function = self._get_processed_function(action)
-      
     processed_function = self._handle_exceptions_from_action(processed_function, action)
     
-    if action_groups is None:
-      action_groups = action['action_groups'].value
+    processed_function = self._get_function_tracking_action(processed_function, action.name)
     
-    invoker_args = list(action['arguments']) + [function]
+    processed_function = self._get_profiled_function(processed_function, action.name)
     
-    self._invoker.add(processed_function, action_groups, invoker_args)
+    return _CompiledAction(action, processed_function, list(action['action_groups'].value))
   
-  def _get_processed_function(self, action):
+  def _get_processed_function(self, action, function):
+    is_procedure = 'procedure' in action.tags
+    is_constraint = 'constraint' in action.tags
     
-    def _function_wrapper(*action_args_and_function):
-      action_args, function = action_args_and_function[:-1], action_args_and_function[-1]
-      
-      if not self._is_enabled(action):
-        return False
+    action_args, placeholder_slots = self._get_static_args_and_placeholder_slots(
+      action['arguments'])
+    
+    if action['origin'].is_item('gimp_pdb'):
+      has_run_mode_param = self._has_run_mode_param(function)
+      get_args_and_kwargs = functools.partial(
+        self._get_pdb_args_and_kwargs, has_run_mode_param=has_run_mode_param)
+    else:
+      get_args_and_kwargs = self._get_args_and_kwargs
+    
+    if is_constraint:
+      orig_function = function
+      function = self._set_apply_constraint_to_folders(function, action)
+      function = self._get_constraint_func(
+        function, orig_function, action['orig_name'].value, action.name)
+    
+    def _function_wrapper(*additional_args):
+      if is_procedure:
+        self._current_procedure = action
       
-      self._set_current_procedure_and_constraint(action)
+      if is_constraint:
+        self._current_constraint = action
       
-      orig_function = function
+      args = list(additional_args)
+      args.extend(action_args)
       
-      args, kwargs = self._get_action_args_and_kwargs(action, action_args, orig_function)
+      for position, placeholder_name in placeholder_slots:
+        args[len(additional_args) + position] = placeholders.get_replaced_arg(
+          placeholder_name, self)
       
-      if 'constraint' in action.tags:
-        function = self._set_apply_constraint_to_folders(function, action)
-        function = self._get_constraint_func(function, orig_function, action['orig_name'].value)
+      args, kwargs = get_args_and_kwargs(args)
       
       return function(*args, **kwargs)
     
@@ -546,41 +851,39 @@ class Batcher(object):
     
     return True
   
-  def _set_current_procedure_and_constraint(self, action):
-    if 'procedure' in action.tags:
-      self._current_procedure = action
-    
-    if 'constraint' in action.tags:
-      self._current_constraint = action
-  
-  def _get_action_args_and_kwargs(self, action, action_args, function):
-    args = self._get_replaced_args(action_args)
-    kwargs = {}
+  def _get_static_args_and_placeholder_slots(self, action_arguments):
+    """Returns a list of values of action arguments and a list of
+    (argument position, placeholder name) pairs.
     
-    if action['origin'].is_item('gimp_pdb'):
-      args.pop(_BATCHER_ARG_POSITION_IN_ACTIONS)
-      
-      if self._has_run_mode_param(function):
-        kwargs = {b'run_mode': args[0]}
-        args = args[1:]
-    
-    return args, kwargs
-  
-  def _get_replaced_args(self, action_arguments):
-    """Returns a list of action arguments, replacing any placeholder values with
-    real values."""
-    replaced_args = []
+    Values of placeholder arguments are replaced with real values when invoking
+    the action for each item.
+    """
+    static_args = []
+    placeholder_slots = []
     
-    for argument in action_arguments:
+    for position, argument in enumerate(action_arguments):
       if isinstance(argument, placeholders.PlaceholderSetting):
-        replaced_args.append(placeholders.get_replaced_arg(argument.value, self))
+        static_args.append(None)
+        placeholder_slots.append((position, argument.value))
       elif isinstance(argument, pg.setting.Setting):
-        replaced_args.append(argument.value)
+        static_args.append(argument.value)
       else:
-        # Other arguments inserted within `Batcher`
-        replaced_args.append(argument)
+        static_args.append(argument)
+    
+    return static_args, placeholder_slots
+  
+  @staticmethod
+  def _get_args_and_kwargs(args):
+    return args, {}
+  
+  @staticmethod
+  def _get_pdb_args_and_kwargs(args, has_run_mode_param):
+    args.pop(_BATCHER_ARG_POSITION_IN_ACTIONS)
     
-    return replaced_args
+    if has_run_mode_param:
+      return args[1:], {b'run_mode': args[0]}
+    else:
+      return args, {}
   
   def _has_run_mode_param(self, pdb_procedure):
     return pdb_procedure.params and pdb_procedure.params[0][1] == 'run-mode'
@@ -602,24 +905,37 @@ class Batcher(object):
     else:
       return function
   
-  def _get_constraint_func(self, func, orig_func=None, name=''):
+  def _get_constraint_func(self, func, orig_func=None, name='', action_name=None):
+    has_batcher_param = self._has_batcher_param(orig_func if orig_func is not None else func)
     
     def _function_wrapper(*args, **kwargs):
-      func_args = self._get_args_for_constraint_func(
-        orig_func if orig_func is not None else func,
-        args)
+      func_args = self._get_args_for_constraint_func(has_batcher_param, args)
       
-      self._item_tree.filter.add(func, func_args, kwargs, name=name)
+      filter_func = self._get_function_tracking_action(
+        func, action_name if action_name is not None else (name or func.__name__))
+      
+      if self._profile is not None:
+        filter_func = self._get_profiled_constraint_func(
+          filter_func, action_name if action_name is not None else (name or func.__name__))
+      
+      self._item_tree.filter.add(filter_func, func_args, kwargs, name=name)
     
     return _function_wrapper
   
-  def _get_args_for_constraint_func(self, func, args):
-    try:
-      batcher_arg_position = inspect.getargspec(func).args.index('batcher')
-    except ValueError:
-      batcher_arg_position = None
+  def _get_profiled_constraint_func(self, func, action_name):
+    
+    def _function_wrapper(item, *args, **kwargs):
+      with self._profile.measure(actions.DEFAULT_CONSTRAINTS_GROUP, action_name, item.orig_name):
+        return func(item, *args, **kwargs)
     
-    if batcher_arg_position is not None:
+    return _function_wrapper
+  
+  @staticmethod
+  def _has_batcher_param(func):
+    return 'batcher' in inspect.getargspec(func).args
+  
+  def _get_args_for_constraint_func(self, has_batcher_param, args):
+    if has_batcher_param:
       func_args = args
     else:
       if len(args) > 1:
@@ -653,6 +969,55 @@ class Batcher(object):
     
     return _handle_exceptions
   
+  def _get_profiled_function(self, function, action_name):
+    if self._profile is None:
+      return function
+    
+    return profiling.get_profiled_function(
+      function,
+      self._profile,
+      lambda: self._current_group,
+      action_name,
+      lambda: self._current_item.orig_name if self._current_item is not None else None)
+  
+  def _get_function_tracking_action(self, function, action_name):
+    if not self._instrument_pdb_calls:
+      return function
+    
+    return profiling.get_function_tracking_action(
+      function, action_name, self._current_action_names)
+  
+  def _save_pdb_call_report(self, filepath):
+    pg.path.make_dirs(os.path.dirname(os.path.abspath(filepath)))
+    
+    with io.open(filepath, 'w', encoding=pg.TEXT_FILE_ENCODING) as f:
+      f.write(self.get_pdb_call_report())
+  
+  def _run(self, items):
+    exception_occurred = False
+    
+    if self._process_contents:
+      self._setup_contents()
+    try:
+      self._process_items(items)
+    except Exception:
+      exception_occurred = True
+      raise
+    finally:
+      if self._process_contents:
+        self._cleanup_contents(exception_occurred)
+      
+      if self._profile is not None and self._profile_filepath:
+        self._profile.save(self._profile_filepath)
+      
+      if self._instrumented_pdb is not None and self._pdb_call_report_filepath:
+        self._save_pdb_call_report(self._pdb_call_report_filepath)
+    
+    if self._process_contents and self._keep_image_copy:
+      return self._image_copy
+    else:
+      return None
+  
   def _init_attributes(self, **kwargs):
     init_argspec_names = set(inspect.getargspec(self._orig___init__).args)
     init_argspec_names.discard('self')
@@ -681,7 +1046,7 @@ class Batcher(object):
     if self._export_context_manager_kwargs is None:
       self._export_context_manager_kwargs = {}
   
-  def _prepare_for_processing(self, item_tree, keep_image_copy):
+  def _prepare_for_processing(self, item_tree, keep_image_copy, reuse_action_plan=False):
     if item_tree is not None:
       self._item_tree = item_tree
     else:
@@ -690,6 +1055,20 @@ class Batcher(object):
     if self._item_tree.filter:
       self._item_tree.reset_filter()
     
+    self._item_tree.filter.record_stats = self._profile_actions
+    self._item_tree.filter.reorder_rules = self._reorder_constraints
+    
+    self._current_action_names = []
+    
+    if self._instrument_pdb_calls:
+      self._instrumented_pdb = pg.pdbutils.InstrumentedPdb(
+        get_group=lambda: self.current_action_name)
+    else:
+      self._instrumented_pdb = None
+    
+    self._cached_pdb = (
+      pg.pdbutils.CachedPdb(self.uncached_pdb) if self._cache_pdb_queries else None)
+    
     self._keep_image_copy = keep_image_copy
     
     self._current_item = None
@@ -697,18 +1076,33 @@ class Batcher(object):
     self._current_procedure = None
     self._current_constraint = None
     self._current_image = self._input_image
+    self._current_group = None
     
     self._image_copy = None
     self._orig_active_layer = None
+    self._layer_stager = None
     
     self._should_stop = False
     
     self._exported_raw_items = []
+    self._unchanged_raw_items = []
     self._skipped_procedures = collections.defaultdict(list)
     self._skipped_constraints = collections.defaultdict(list)
     self._failed_procedures = collections.defaultdict(list)
     self._failed_constraints = collections.defaultdict(list)
     
+    self._profile = profiling.ActionProfile() if self._profile_actions else None
+    
+    action_plan_key = self._get_action_plan_key()
+    if (not reuse_action_plan
+        or action_plan_key is None
+        or self._action_plan is None
+        or action_plan_key != self._action_plan_key):
+      self._action_plan = self._compile_action_plan()
+      self._action_plan_key = action_plan_key
+    
+    # A new invoker is created even if the action plan is reused since the
+    # invoker holds the state of actions that are generators.
     self._invoker = pg.invoker.Invoker()
     self._add_actions()
     self._add_name_only_actions()
@@ -717,23 +1111,41 @@ class Batcher(object):
     
     self._progress_updater.reset()
   
+  def _get_action_plan_key(self):
+    """Returns a key identifying the settings the action plan is compiled from,
+    or `None` if the action plan must not be reused in subsequent runs.
+    """
+    if self._profile_actions or self._cache_pdb_queries or self._instrument_pdb_calls:
+      return None
+    
+    return (
+      id(self._procedures),
+      id(self._constraints),
+      actions.get_values_hash(self._procedures, self._constraints),
+      self._is_preview,
+      self._edit_mode)
+  
   def _add_actions(self):
     self._invoker.add(
-      builtin_procedures.set_active_and_current_layer, [actions.DEFAULT_PROCEDURES_GROUP])
+      self._get_builtin_function_tracking_action(builtin_procedures.set_active_and_current_layer),
+      [actions.DEFAULT_PROCEDURES_GROUP])
     
     self._invoker.add(
-      builtin_procedures.set_active_and_current_layer_after_action,
+      self._get_builtin_function_tracking_action(
+        builtin_procedures.set_active_and_current_layer_after_action),
       [actions.DEFAULT_PROCEDURES_GROUP],
       foreach=True)
     
     self._invoker.add(
-      builtin_procedures.sync_item_name_and_raw_item_name,
+      self._get_builtin_function_tracking_action(
+        builtin_procedures.sync_item_name_and_raw_item_name),
       [actions.DEFAULT_PROCEDURES_GROUP],
       foreach=True)
     
     if self._edit_mode:
       self._invoker.add(
-        builtin_procedures.preserve_locks_between_actions,
+        self._get_builtin_function_tracking_action(
+          builtin_procedures.preserve_locks_between_actions),
         [actions.DEFAULT_PROCEDURES_GROUP],
         foreach=True)
     
@@ -743,99 +1155,126 @@ class Batcher(object):
     
     self._add_default_rename_procedure([actions.DEFAULT_PROCEDURES_GROUP])
     
-    for procedure in actions.walk(self._procedures):
-      self._add_action_from_settings(procedure)
+    for compiled_procedure in self._action_plan.procedures:
+      self._add_compiled_action(compiled_procedure)
     
     self._add_default_export_procedure([actions.DEFAULT_PROCEDURES_GROUP])
     
-    for constraint in actions.walk(self._constraints):
-      self._add_action_from_settings(constraint)
+    for compiled_constraint in self._action_plan.constraints:
+      self._add_compiled_action(compiled_constraint)
+  
+  def _get_builtin_function_tracking_action(self, function):
+    return self._get_function_tracking_action(function, function.__name__)
   
   def _add_name_only_actions(self):
     self._add_default_rename_procedure([_NAME_ONLY_ACTION_GROUP])
     
-    for procedure in actions.walk(self._procedures):
-      self._add_action_from_settings(
-        procedure, [builtin_procedures.NAME_ONLY_TAG], [_NAME_ONLY_ACTION_GROUP])
+    for compiled_procedure in self._action_plan.procedures:
+      self._add_compiled_action(
+        compiled_procedure, [builtin_procedures.NAME_ONLY_TAG], [_NAME_ONLY_ACTION_GROUP])
     
     self._add_default_export_procedure([_NAME_ONLY_ACTION_GROUP])
     
-    for constraint in actions.walk(self._constraints):
-      self._add_action_from_settings(
-        constraint, [builtin_procedures.NAME_ONLY_TAG], [_NAME_ONLY_ACTION_GROUP])
+    for compiled_constraint in self._action_plan.constraints:
+      self._add_compiled_action(
+        compiled_constraint, [builtin_procedures.NAME_ONLY_TAG], [_NAME_ONLY_ACTION_GROUP])
   
   def _add_default_rename_procedure(self, action_groups):
-    if (not self._edit_mode
-        and not any(
-          procedure['orig_name'].value == 'rename' and procedure['enabled'].value
-          for procedure in actions.walk(self._procedures))):
+    if self._action_plan.add_default_rename_procedure:
       self._invoker.add(
-        builtin_procedures.rename_layer,
+        self._get_profiled_function(
+          self._get_function_tracking_action(builtin_procedures.rename_layer, 'default_rename'),
+          'default_rename'),
         groups=action_groups,
         args=[self._layer_filename_pattern])
   
   def _add_default_export_procedure(self, action_groups):
-    if (not self._edit_mode
-        and not any(
-          procedure['orig_name'].value == 'export' and procedure['enabled'].value
-          for procedure in actions.walk(self._procedures))):
+    if self._action_plan.add_default_export_procedure:
       self._invoker.add(
-        export_.export,
+        self._get_profiled_function(
+          self._get_function_tracking_action(export_.export, 'default_export'),
+          'default_export'),
         groups=action_groups,
         args=[self._output_directory, self._file_extension, export_.ExportModes.EACH_LAYER])
   
+  def _invoke_actions(self, group, additional_args):
+    if self._profile is None:
+      self._invoker.invoke(
+        [group], additional_args, additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+      return
+    
+    self._current_group = group
+    
+    try:
+      with self._profile.measure_group(group):
+        self._invoker.invoke(
+          [group], additional_args, additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+    finally:
+      self._current_group = None
+  
   def _set_constraints(self):
-    self._invoker.invoke(
-      [actions.DEFAULT_CONSTRAINTS_GROUP],
-      [self],
-      additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+    self._invoke_actions(actions.DEFAULT_CONSTRAINTS_GROUP, [self])
   
   def _setup_contents(self):
-    pdb.gimp_context_push()
+    self.pdb.gimp_context_push()
     
     if not self._edit_mode or self._is_preview:
-      self._image_copy = pg.pdbutils.create_image_from_metadata(self._input_image)
+      self._image_copy = self._create_image_copy()
       self._current_image = self._image_copy
       
-      pdb.gimp_image_undo_freeze(self._current_image)
+      self.pdb.gimp_image_undo_freeze(self._current_image)
       
       if pg.config.DEBUG_IMAGE_PROCESSING:
-        self._display_id = pdb.gimp_display_new(self._current_image)
+        self._display_id = self.pdb.gimp_display_new(self._current_image)
     else:
       self._current_image = self._input_image
-      pdb.gimp_image_undo_group_start(self._current_image)
+      self.pdb.gimp_image_undo_group_start(self._current_image)
+    
+    # Actions applied before processing items may insert layers, hence the
+    # number of layers is not known in advance.
+    self._layer_stager = pg.pdbutils.LayerStager(self._current_image, self.pdb)
     
     self._orig_active_layer = self._current_image.active_layer
   
   def _cleanup_contents(self, exception_occurred=False):
-    self._invoker.invoke(
-      ['cleanup_contents'],
-      [self],
-      additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+    self._invoke_actions('cleanup_contents', [self])
     
     if not self._edit_mode or self._is_preview:
       self._copy_non_modifying_parasites(self._current_image, self._input_image)
       
-      pdb.gimp_image_undo_thaw(self._current_image)
+      self.pdb.gimp_image_undo_thaw(self._current_image)
       
       if pg.config.DEBUG_IMAGE_PROCESSING:
-        pdb.gimp_display_delete(self._display_id)
+        self.pdb.gimp_display_delete(self._display_id)
       
       if not self._keep_image_copy or exception_occurred:
-        pg.pdbutils.try_delete_image(self._current_image)
+        self._delete_image_copy(self._current_image)
     else:
-      if pdb.gimp_item_is_valid(self._orig_active_layer):
+      if self.uncached_pdb.gimp_item_is_valid(self._orig_active_layer):
         self._current_image.active_layer = self._orig_active_layer
-      pdb.gimp_image_undo_group_end(self._current_image)
-      pdb.gimp_displays_flush()
+      self.pdb.gimp_image_undo_group_end(self._current_image)
+      self.pdb.gimp_displays_flush()
     
-    pdb.gimp_context_pop()
+    self.pdb.gimp_context_pop()
     
     self._current_item = None
     self._current_raw_item = None
     self._current_procedure = None
     self._current_constraint = None
     self._current_image = None
+    self._layer_stager = None
+  
+  def _create_image_copy(self):
+    if self._scratch_image_pool is not None:
+      return self._scratch_image_pool.acquire(self._input_image)
+    else:
+      return pg.pdbutils.create_image_from_metadata(self._input_image)
+  
+  def _delete_image_copy(self, image):
+    if self._scratch_image_pool is not None:
+      self._scratch_image_pool.release(image)
+    else:
+      pg.pdbutils.try_delete_image(image)
   
   @staticmethod
   def _copy_non_modifying_parasites(src_image, dest_image):
@@ -848,21 +1287,15 @@ class Batcher(object):
         if parasite.flags == 0:
           dest_image.parasite_attach(parasite)
   
-  def _process_items(self):
-    self._progress_updater.num_total_tasks = len(self._item_tree)
+  def _process_items(self, items):
+    self._progress_updater.num_total_tasks = len(items)
     
-    self._invoker.invoke(
-      ['before_process_items'],
-      [self],
-      additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+    self._invoke_actions('before_process_items', [self])
     
     if self._process_contents:
-      self._invoker.invoke(
-        ['before_process_items_contents'],
-        [self],
-        additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+      self._invoke_actions('before_process_items_contents', [self])
     
-    for item in self._item_tree:
+    for item in items:
       if self._should_stop:
         raise exceptions.BatcherCancelError('stopped by user')
       
@@ -872,15 +1305,9 @@ class Batcher(object):
       self._process_item(item)
     
     if self._process_contents:
-      self._invoker.invoke(
-        ['after_process_items_contents'],
-        [self],
-        additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+      self._invoke_actions('after_process_items_contents', [self])
     
-    self._invoker.invoke(
-      ['after_process_items'],
-      [self],
-      additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+    self._invoke_actions('after_process_items', [self])
   
   def _process_item(self, item):
     self._current_item = item
@@ -896,68 +1323,47 @@ class Batcher(object):
     self._progress_updater.update_tasks()
   
   def _process_item_with_name_only_actions(self):
-    self._invoker.invoke(
-      ['before_process_item'],
-      [self, self._current_item, self._current_raw_item],
-      additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+    self._invoke_actions('before_process_item', [self, self._current_item, self._current_raw_item])
     
-    self._invoker.invoke(
-      [_NAME_ONLY_ACTION_GROUP],
-      [self],
-      additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+    self._invoke_actions(_NAME_ONLY_ACTION_GROUP, [self])
     
-    self._invoker.invoke(
-      ['after_process_item'],
-      [self, self._current_item, self._current_raw_item],
-      additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+    self._invoke_actions('after_process_item', [self, self._current_item, self._current_raw_item])
   
   def _process_item_with_actions(self, item, raw_item):
     if not self._edit_mode or self._is_preview:
-      raw_item_copy = pg.pdbutils.copy_and_paste_layer(
-        raw_item, self._current_image, None, len(self._current_image.layers), True, True, True)
+      raw_item_copy = self._layer_stager.stage(raw_item)
       
       self._current_raw_item = raw_item_copy
       self._current_raw_item.name = raw_item.name
     
-    if self._edit_mode and not self._is_preview and pdb.gimp_item_is_group(raw_item):
+    if self._edit_mode and not self._is_preview and self.pdb.gimp_item_is_group(raw_item):
       # Layer groups must be copied and inserted as layers as some procedures
       # do not work on layer groups.
-      raw_item_copy = pg.pdbutils.copy_and_paste_layer(
-        raw_item, self._current_image, raw_item.parent,
-        pdb.gimp_image_get_item_position(self._current_image, raw_item) + 1,
-        True, True, True)
+      raw_item_copy = self._layer_stager.stage(
+        raw_item,
+        raw_item.parent,
+        self.pdb.gimp_image_get_item_position(self._current_image, raw_item) + 1)
       
       self._current_raw_item = raw_item_copy
       self._current_raw_item.name = raw_item.name
     
-    self._invoker.invoke(
-      ['before_process_item'],
-      [self, self._current_item, self._current_raw_item],
-      additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+    self._invoke_actions('before_process_item', [self, self._current_item, self._current_raw_item])
     
     if self._process_contents:
-      self._invoker.invoke(
-        ['before_process_item_contents'],
-        [self, self._current_item, self._current_raw_item],
-        additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+      self._invoke_actions(
+        'before_process_item_contents', [self, self._current_item, self._current_raw_item])
     
-    self._invoker.invoke(
-      [actions.DEFAULT_PROCEDURES_GROUP],
-      [self],
-      additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+    self._invoke_actions(actions.DEFAULT_PROCEDURES_GROUP, [self])
     
     if self._process_contents:
-      self._invoker.invoke(
-        ['after_process_item_contents'],
-        [self, self._current_item, self._current_raw_item],
-        additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+      self._invoke_actions(
+        'after_process_item_contents', [self, self._current_item, self._current_raw_item])
     
-    self._invoker.invoke(
-      ['after_process_item'],
-      [self, self._current_item, self._current_raw_item],
-      additional_args_position=_BATCHER_ARG_POSITION_IN_ACTIONS)
+    self._invoke_actions('after_process_item', [self, self._current_item, self._current_raw_item])
   
   def _refresh_current_image(self, raw_item):
     if not self._edit_mode and not self._keep_image_copy:
-      for layer in self._current_image.layers:
-        pdb.gimp_image_remove_layer(self._current_image, layer)
+      self._layer_stager.clear()
+    else:
+      # Actions may have inserted or removed layers.
+      self._layer_stager.invalidate()
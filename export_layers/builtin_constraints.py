@@ -36,8 +36,8 @@ def is_top_level(item):
   return item.depth == 0
 
 
-def is_visible(item):
-  return item.raw.visible
+def is_visible(item, batcher):
+  return batcher.pdb.gimp_item_get_visible(item.raw)
 
 
 def has_tags(item, tags=None):
@@ -8,7 +8,6 @@ from future.builtins import *
 import collections
 
 import gimp
-from gimp import pdb
 import gimpenums
 
 from export_layers import background_foreground
@@ -20,10 +19,10 @@ NAME_ONLY_TAG = 'name'
 
 
 def set_active_and_current_layer(batcher):
-  if pdb.gimp_item_is_valid(batcher.current_raw_item):
+  if batcher.uncached_pdb.gimp_item_is_valid(batcher.current_raw_item):
     batcher.current_image.active_layer = batcher.current_raw_item
   else:
-    if pdb.gimp_item_is_valid(batcher.current_image.active_layer):
+    if batcher.uncached_pdb.gimp_item_is_valid(batcher.current_image.active_layer):
       # The active layer may have been set by the procedure.
       batcher.current_raw_item = batcher.current_image.active_layer
     else:
@@ -63,42 +62,44 @@ def preserve_locks_between_actions(batcher):
   locks_content = {}
   
   for item_or_parent in [item] + item.parents:
-    if pdb.gimp_item_is_valid(item_or_parent.raw):
-      locks_content[item_or_parent] = pdb.gimp_item_get_lock_content(item_or_parent.raw)
+    if batcher.pdb.gimp_item_is_valid(item_or_parent.raw):
+      locks_content[item_or_parent] = batcher.pdb.gimp_item_get_lock_content(item_or_parent.raw)
   
-  if not is_item_group and pdb.gimp_item_is_valid(item.raw):
+  if not is_item_group and batcher.pdb.gimp_item_is_valid(item.raw):
     if gimp.version >= (2, 10):
-      lock_position = pdb.gimp_item_get_lock_position(item.raw)
+      lock_position = batcher.pdb.gimp_item_get_lock_position(item.raw)
     else:
       lock_position = None
-    lock_alpha = pdb.gimp_layer_get_lock_alpha(item.raw)
+    lock_alpha = batcher.pdb.gimp_layer_get_lock_alpha(item.raw)
   else:
     lock_position = None
     lock_alpha = None
   
   for item_or_parent, lock_content in locks_content.items():
     if lock_content:
-      pdb.gimp_item_set_lock_content(item_or_parent.raw, False)
+      batcher.pdb.gimp_item_set_lock_content(item_or_parent.raw, False)
   
   if not is_item_group:
     if lock_position:
       if gimp.version >= (2, 10):
-        pdb.gimp_item_set_lock_position(item.raw, False)
+        batcher.pdb.gimp_item_set_lock_position(item.raw, False)
     if lock_alpha:
-      pdb.gimp_layer_set_lock_alpha(item.raw, False)
+      batcher.pdb.gimp_layer_set_lock_alpha(item.raw, False)
   
   yield
   
+  # Actions may remove items without going through `batcher.pdb`, hence the
+  # validity is not obtained from the cache.
   for item_or_parent, lock_content in locks_content.items():
-    if lock_content and pdb.gimp_item_is_valid(item_or_parent.raw):
-      pdb.gimp_item_set_lock_content(item_or_parent.raw, lock_content)
+    if lock_content and batcher.uncached_pdb.gimp_item_is_valid(item_or_parent.raw):
+      batcher.pdb.gimp_item_set_lock_content(item_or_parent.raw, lock_content)
   
-  if not is_item_group and pdb.gimp_item_is_valid(item.raw):
+  if not is_item_group and batcher.uncached_pdb.gimp_item_is_valid(item.raw):
     if lock_position:
       if gimp.version >= (2, 10):
-        pdb.gimp_item_set_lock_position(item.raw, lock_position)
+        batcher.pdb.gimp_item_set_lock_position(item.raw, lock_position)
     if lock_alpha:
-      pdb.gimp_layer_set_lock_alpha(item.raw, lock_alpha)
+      batcher.pdb.gimp_layer_set_lock_alpha(item.raw, lock_alpha)
 
 
 def remove_folder_hierarchy_from_item(batcher):
@@ -141,11 +142,12 @@ def resize_to_layer_size(batcher):
   layer = batcher.current_raw_item
   
   layer_offset_x, layer_offset_y = layer.offsets
-  pdb.gimp_image_resize(image, layer.width, layer.height, -layer_offset_x, -layer_offset_y)
+  batcher.pdb.gimp_image_resize(
+    image, layer.width, layer.height, -layer_offset_x, -layer_offset_y)
 
 
 def scale(
-      _batcher,
+      batcher,
       image,
       raw_item,
       new_width,
@@ -158,12 +160,12 @@ def scale(
   width_pixels = _convert_to_pixels(image, raw_item, new_width, width_unit)
   height_pixels = _convert_to_pixels(image, raw_item, new_height, height_unit)
 
-  pdb.gimp_context_push()
-  pdb.gimp_context_set_interpolation(interpolation)
+  batcher.pdb.gimp_context_push()
+  batcher.pdb.gimp_context_set_interpolation(interpolation)
   
-  pdb.gimp_layer_scale(raw_item, width_pixels, height_pixels, local_origin)
+  batcher.pdb.gimp_layer_scale(raw_item, width_pixels, height_pixels, local_origin)
 
-  pdb.gimp_context_pop()
+  batcher.pdb.gimp_context_pop()
 
 
 def _convert_to_pixels(image, raw_item, dimension, dimension_unit):
@@ -266,6 +268,13 @@ _BUILTIN_PROCEDURES_LIST = [
         'display_name': _('Preserve layer name after export'),
         'gui_type': 'check_button_no_text',
       },
+      {
+        'type': 'boolean',
+        'name': 'skip_unchanged_layers',
+        'default_value': False,
+        'display_name': _('Skip layers unchanged since last export'),
+        'gui_type': 'check_button_no_text',
+      },
     ],
   },
   {
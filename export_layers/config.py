@@ -36,3 +36,24 @@ c.BUG_REPORT_URL_LIST = [
 
 # If True, display each step of image/layer editing in GIMP.
 c.DEBUG_IMAGE_PROCESSING = False
+
+# If True, write the number of hits and misses of the cache of rendered images
+# in the image preview to the output log file in the plug-in directory.
+c.DEBUG_IMAGE_PREVIEW_CACHE = False
+
+# If True, record the number of calls and the time spent in each PDB procedure
+# per action during batch processing and save a summary to the file below.
+c.INSTRUMENT_PDB_CALLS = False
+c.PDB_CALL_REPORT_FILEPATH = os.path.join(c.PLUGIN_SUBDIRPATH, 'pdb_calls.txt')
+
+# If True, record the time spent in each procedure and constraint during batch
+# processing and display the slowest actions in the GUI.
+c.PROFILE_ACTIONS = False
+
+# If True, evaluate cheap constraints excluding the most layers first during
+# batch processing. Constraints must not depend on the order of evaluation.
+c.REORDER_CONSTRAINTS = False
+
+# If True, cache results of read-only PDB queries on layers (e.g. visibility,
+# size, lock states) during batch processing.
+c.CACHE_PDB_QUERIES = False
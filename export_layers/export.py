@@ -9,12 +9,12 @@ import collections
 import os
 
 import gimp
-from gimp import pdb
 import gimpenums
 
 from export_layers import pygimplib as pg
 
 from export_layers import exceptions
+from export_layers import manifest as manifest_
 from export_layers import renamer as renamer_
 from export_layers import uniquifier
 
@@ -36,11 +36,14 @@ def export(
       single_image_filename_pattern=None,
       use_file_extension_in_item_name=False,
       convert_file_extension_to_lowercase=False,
-      preserve_layer_name_after_export=False):
+      preserve_layer_name_after_export=False,
+      skip_unchanged_layers=False):
   item_uniquifier = uniquifier.ItemUniquifier()
   file_extension_properties = _FileExtensionProperties()
   processed_parent_names = set()
   default_file_extension = file_extension
+  dir_snapshot = pg.path.DirectorySnapshot()
+  resolved_names_with_default_file_extension = None
   
   if export_mode == ExportModes.ENTIRE_IMAGE_AT_ONCE and single_image_filename_pattern is not None:
     renamer_for_image = renamer_.ItemRenamer(single_image_filename_pattern)
@@ -48,18 +51,32 @@ def export(
     renamer_for_image = None
   
   if export_mode != ExportModes.EACH_LAYER and batcher.process_export:
-    multi_layer_image = pg.pdbutils.create_image_from_metadata(batcher.input_image)
-    pdb.gimp_image_undo_freeze(multi_layer_image)
+    multi_layer_image = _create_image_copy(batcher)
+    batcher.pdb.gimp_image_undo_freeze(multi_layer_image)
     batcher.invoker.add(_delete_image_on_cleanup, ['cleanup_contents'], [multi_layer_image])
+    multi_layer_image_stager = pg.pdbutils.LayerStager(
+      multi_layer_image, batcher.pdb, num_layers=0)
   else:
     multi_layer_image = None
+    multi_layer_image_stager = None
   
   if batcher.edit_mode and batcher.process_export:
-    image_copy = pg.pdbutils.create_image_from_metadata(batcher.input_image)
-    pdb.gimp_image_undo_freeze(image_copy)
+    image_copy = _create_image_copy(batcher)
+    batcher.pdb.gimp_image_undo_freeze(image_copy)
     batcher.invoker.add(_delete_image_on_cleanup, ['cleanup_contents'], [image_copy])
+    image_copy_stager = pg.pdbutils.LayerStager(image_copy, batcher.pdb, num_layers=0)
   else:
     image_copy = batcher.current_image
+    image_copy_stager = None
+  
+  if skip_unchanged_layers and batcher.process_export:
+    export_manifest = manifest_.ExportManifest(output_directory)
+    procedures_hash = manifest_.get_procedures_hash(
+      batcher.procedures, export_mode, default_file_extension)
+    batcher.invoker.add(_save_manifest_on_cleanup, ['cleanup_contents'], [export_manifest])
+  else:
+    export_manifest = None
+    procedures_hash = None
   
   while True:
     item = batcher.current_item
@@ -69,7 +86,7 @@ def export(
     raw_item_to_process = batcher.current_raw_item
     
     if batcher.edit_mode and batcher.process_export:
-      raw_item_to_process = _copy_layer(raw_item_to_process, image_copy, item)
+      raw_item_to_process = _copy_layer(batcher, image_copy_stager, raw_item_to_process, item)
     
     if multi_layer_image is None:
       image_to_process = image_copy
@@ -79,10 +96,11 @@ def export(
     if export_mode == ExportModes.ENTIRE_IMAGE_AT_ONCE:
       if batcher.process_export:
         raw_item_to_process = _merge_and_resize_image(batcher, image_copy, raw_item_to_process)
-        raw_item_to_process = _copy_layer(raw_item_to_process, image_to_process, item)
+        raw_item_to_process = _copy_layer(
+          batcher, multi_layer_image_stager, raw_item_to_process, item)
       
       if batcher.item_tree.next(item, with_folders=False) is not None:
-        _refresh_image_copy_for_edit_mode(batcher, image_copy)
+        _refresh_image_copy_for_edit_mode(batcher, image_copy_stager)
         yield
         continue
       else:
@@ -94,13 +112,14 @@ def export(
     elif export_mode == ExportModes.EACH_TOP_LEVEL_LAYER_OR_GROUP:
       if batcher.process_export:
         raw_item_to_process = _merge_and_resize_image(batcher, image_copy, raw_item_to_process)
-        raw_item_to_process = _copy_layer(raw_item_to_process, image_to_process, item)
+        raw_item_to_process = _copy_layer(
+          batcher, multi_layer_image_stager, raw_item_to_process, item)
       
       current_top_level_item = _get_top_level_item(item)
       next_top_level_item = _get_top_level_item(batcher.item_tree.next(item, with_folders=False))
       
       if current_top_level_item == next_top_level_item:
-        _refresh_image_copy_for_edit_mode(batcher, image_copy)
+        _refresh_image_copy_for_edit_mode(batcher, image_copy_stager)
         yield
         continue
       else:
@@ -109,7 +128,9 @@ def export(
     if preserve_layer_name_after_export:
       item_to_process.push_state()
     
-    if batcher.process_names:
+    if batcher.resolved_names is not None:
+      _set_resolved_names(batcher.resolved_names, item_to_process)
+    elif batcher.process_names:
       if use_file_extension_in_item_name:
         current_file_extension = _get_current_file_extension(
           item_to_process, default_file_extension, file_extension_properties)
@@ -126,22 +147,51 @@ def export(
       if export_mode == ExportModes.EACH_LAYER:
         raw_item_to_process = _merge_and_resize_image(batcher, image_copy, raw_item_to_process)
       else:
-        pdb.gimp_image_resize_to_layers(image_to_process)
+        batcher.pdb.gimp_image_resize_to_layers(image_to_process)
       
-      overwrite_mode, export_status = _export_item(
-        batcher, item_to_process, image_to_process, raw_item_to_process,
-        output_directory, default_file_extension, file_extension_properties)
+      if export_manifest is not None:
+        image_fingerprint = manifest_.get_image_fingerprint(image_to_process)
+        # The file path is determined before falling back to the default file
+        # extension so that the same path is looked up in subsequent exports.
+        manifest_filepath = _get_item_filepath(item_to_process, output_directory)
+      else:
+        image_fingerprint = None
+        manifest_filepath = None
+      
+      if export_manifest is not None and export_manifest.is_unchanged(
+           manifest_filepath, image_fingerprint, procedures_hash):
+        overwrite_mode = pg.overwrite.OverwriteModes.SKIP
+        export_status = ExportStatuses.UNCHANGED
+        # Append the original raw item
+        batcher._unchanged_raw_items.append(item_to_process.raw)
+      else:
+        overwrite_mode, export_status, output_filepath = _export_item(
+          batcher, item_to_process, image_to_process, raw_item_to_process,
+          output_directory, default_file_extension, file_extension_properties, dir_snapshot)
       
       if export_status == ExportStatuses.USE_DEFAULT_FILE_EXTENSION:
-        if batcher.process_names:
+        if batcher.resolved_names is not None:
+          if resolved_names_with_default_file_extension is None:
+            resolved_names_with_default_file_extension = (
+              _get_resolved_names_with_default_file_extension(batcher, default_file_extension))
+          
+          item_to_process.name = resolved_names_with_default_file_extension[
+            item_to_process.orig_name]
+        elif batcher.process_names:
           _process_item_name(
             batcher, item_to_process, item_uniquifier,
             current_file_extension, default_file_extension, force_default_file_extension=True)
         
         if batcher.process_export:
-          overwrite_mode, unused_ = _export_item(
+          overwrite_mode, export_status, output_filepath = _export_item(
             batcher, item_to_process, image_to_process, raw_item_to_process,
-            output_directory, default_file_extension, file_extension_properties)
+            output_directory, default_file_extension, file_extension_properties, dir_snapshot)
+      
+      if (export_manifest is not None
+          and export_status == ExportStatuses.EXPORT_SUCCESSFUL
+          and overwrite_mode != pg.overwrite.OverwriteModes.SKIP):
+        export_manifest.update(
+          manifest_filepath, image_fingerprint, procedures_hash, output_filepath)
       
       if overwrite_mode != pg.overwrite.OverwriteModes.SKIP:
         file_extension_properties[
@@ -154,18 +204,39 @@ def export(
     
     _sync_raw_item_name(batcher, item_to_process)
     
-    if multi_layer_image is not None:
-      _refresh_image(multi_layer_image)
+    if multi_layer_image_stager is not None:
+      multi_layer_image_stager.clear()
     
-    _refresh_image_copy_for_edit_mode(batcher, image_copy)
+    _refresh_image_copy_for_edit_mode(batcher, image_copy_stager)
     
     yield
 
 
+def _create_image_copy(batcher):
+  if batcher.scratch_image_pool is not None:
+    return batcher.scratch_image_pool.acquire(batcher.input_image)
+  else:
+    return pg.pdbutils.create_image_from_metadata(batcher.input_image)
+
+
 def _delete_image_on_cleanup(batcher, image):
   if batcher.process_export:
     if image is not None:
-      pg.pdbutils.try_delete_image(image)
+      if batcher.scratch_image_pool is not None:
+        if batcher.pdb.gimp_image_is_valid(image):
+          batcher.pdb.gimp_image_undo_thaw(image)
+        batcher.scratch_image_pool.release(image)
+      else:
+        pg.pdbutils.try_delete_image(image)
+
+
+def _save_manifest_on_cleanup(batcher, export_manifest):
+  try:
+    export_manifest.save()
+  except (IOError, OSError):
+    # Failing to save the manifest only causes all layers to be exported again
+    # next time, hence we do not interrupt the cleanup.
+    pass
 
 
 def _get_top_level_item(item):
@@ -184,6 +255,52 @@ def _process_parent_folder_names(item, item_uniquifier, processed_parent_names):
       processed_parent_names.add(parent)
 
 
+def _set_resolved_names(resolved_names, item):
+  for parent in item.parents:
+    parent.name = resolved_names[(parent.orig_name, pg.itemtree.FOLDER_KEY)]
+  
+  item.name = resolved_names[item.orig_name]
+
+
+def _get_resolved_names_with_default_file_extension(batcher, default_file_extension):
+  """Returns a dictionary of (original item name, resolved name with the default
+  file extension) pairs for items whose resolved names have a different file
+  extension.
+  
+  The names are made unique among the resolved names of all items under the
+  same parent. As the names are obtained from all items rather than from items
+  processed in this run, items processed by other workers (see the `sharding`
+  module) are assigned the same names in each worker and names never collide.
+  """
+  items = [
+    item for item in batcher.item_tree.iter(with_folders=False, filtered=False)
+    if item.orig_name in batcher.resolved_names]
+  
+  item_names_in_parents = collections.defaultdict(set)
+  for item in items:
+    item_names_in_parents[item.parent].add(batcher.resolved_names[item.orig_name])
+  
+  names_with_default_file_extension = {}
+  
+  for item in items:
+    resolved_name = batcher.resolved_names[item.orig_name]
+    if pg.path.get_file_extension(resolved_name) == default_file_extension:
+      continue
+    
+    name = pg.path.get_filename_with_new_file_extension(
+      resolved_name, default_file_extension, keep_extra_trailing_periods=True)
+    
+    item_names = item_names_in_parents[item.parent]
+    
+    name = pg.path.uniquify_string(
+      name, item_names, _get_unique_substring_position(name, default_file_extension))
+    
+    item_names.add(name)
+    names_with_default_file_extension[item.orig_name] = name
+  
+  return names_with_default_file_extension
+
+
 def _process_item_name(
       batcher, item, item_uniquifier,
       current_file_extension, default_file_extension, force_default_file_extension):
@@ -223,8 +340,9 @@ def _merge_and_resize_image(batcher, image, raw_item):
   """
   raw_item_name = raw_item.name
   
-  raw_item_merged = pdb.gimp_image_merge_visible_layers(image, gimpenums.EXPAND_AS_NECESSARY)
-  pdb.gimp_layer_resize_to_image_size(raw_item_merged)
+  raw_item_merged = batcher.pdb.gimp_image_merge_visible_layers(
+    image, gimpenums.EXPAND_AS_NECESSARY)
+  batcher.pdb.gimp_layer_resize_to_image_size(raw_item_merged)
   
   raw_item_merged.name = raw_item_name
   image.active_layer = raw_item_merged
@@ -235,10 +353,9 @@ def _merge_and_resize_image(batcher, image, raw_item):
   return raw_item_merged
 
 
-def _copy_layer(raw_item, dest_image, item):
-  raw_item_copy = pg.pdbutils.copy_and_paste_layer(
-    raw_item, dest_image, None, len(dest_image.layers), True, True, True)
-  pdb.gimp_item_set_name(raw_item_copy, item.name)
+def _copy_layer(batcher, layer_stager, raw_item, item):
+  raw_item_copy = layer_stager.stage(raw_item)
+  batcher.pdb.gimp_item_set_name(raw_item_copy, item.name)
   
   return raw_item_copy
 
@@ -252,7 +369,7 @@ def _get_unique_substring_position(str_, file_extension):
 
 def _export_item(
       batcher, item, image, raw_item,
-      output_directory, default_file_extension, file_extension_properties):
+      output_directory, default_file_extension, file_extension_properties, dir_snapshot):
   output_filepath = _get_item_filepath(item, output_directory)
   file_extension = pg.path.get_file_extension(item.name)
   export_status = ExportStatuses.NOT_EXPORTED_YET
@@ -261,13 +378,14 @@ def _export_item(
   
   overwrite_mode, output_filepath = pg.overwrite.handle_overwrite(
     output_filepath, batcher.overwrite_chooser,
-    _get_unique_substring_position(output_filepath, file_extension))
+    _get_unique_substring_position(output_filepath, file_extension),
+    dir_snapshot=dir_snapshot)
   
   if overwrite_mode == pg.overwrite.OverwriteModes.CANCEL:
     raise exceptions.BatcherCancelError('cancelled')
   
   if overwrite_mode != pg.overwrite.OverwriteModes.SKIP:
-    _make_dirs(item, os.path.dirname(output_filepath), default_file_extension)
+    _make_dirs(item, os.path.dirname(output_filepath), default_file_extension, dir_snapshot)
     
     export_status = _export_item_once_wrapper(
       batcher,
@@ -291,8 +409,11 @@ def _export_item(
         file_extension,
         default_file_extension,
         file_extension_properties)
+    
+    if export_status == ExportStatuses.EXPORT_SUCCESSFUL:
+      dir_snapshot.add(output_filepath)
   
-  return overwrite_mode, export_status
+  return overwrite_mode, export_status, output_filepath
 
 
 def _get_item_filepath(item, dirpath):
@@ -321,9 +442,9 @@ def _get_item_filepath(item, dirpath):
   return os.path.join(path, item.name)
 
 
-def _make_dirs(item, dirpath, default_file_extension):
+def _make_dirs(item, dirpath, default_file_extension, dir_snapshot):
   try:
-    pg.path.make_dirs(dirpath)
+    dir_snapshot.make_dirs(dirpath)
   except OSError as e:
     try:
       message = e.args[1]
@@ -366,12 +487,13 @@ def _export_item_once(
   export_status = ExportStatuses.NOT_EXPORTED_YET
   
   try:
-    export_func(
-      run_mode,
-      image,
-      raw_item,
-      pg.utils.safe_encode_gimp(output_filepath),
-      pg.utils.safe_encode_gimp(os.path.basename(output_filepath)))
+    with _measure_save_procedure(batcher, file_extension):
+      export_func(
+        run_mode,
+        image,
+        raw_item,
+        pg.utils.safe_encode_gimp(output_filepath),
+        pg.utils.safe_encode_gimp(os.path.basename(output_filepath)))
   except RuntimeError as e:
     # HACK: Examining the exception message seems to be the only way to determine
     # some specific cases of export failure.
@@ -390,6 +512,15 @@ def _export_item_once(
   return export_status
 
 
+def _measure_save_procedure(batcher, file_extension):
+  # File save procedures are not called through `batcher.pdb`, hence they must
+  # be recorded explicitly.
+  if batcher.pdb_call_stats is not None:
+    return batcher.pdb_call_stats.measure('file-save ({})'.format(file_extension))
+  else:
+    return pg.utils.empty_context
+
+
 def _was_export_canceled_by_user(exception_message):
   return any(message in exception_message.lower() for message in ['cancelled', 'canceled'])
 
@@ -409,14 +540,9 @@ def _sync_raw_item_name(batcher, item_to_process):
     batcher.current_raw_item.name = batcher.current_item.name
 
 
-def _refresh_image_copy_for_edit_mode(batcher, image_copy):
+def _refresh_image_copy_for_edit_mode(batcher, image_copy_stager):
   if batcher.edit_mode and batcher.process_export:
-    _refresh_image(image_copy)
-
-
-def _refresh_image(image):
-  for layer in image.layers:
-    pdb.gimp_image_remove_layer(image, layer)
+    image_copy_stager.clear()
 
 
 class _FileExtension(object):
@@ -460,5 +586,6 @@ class _FileExtensionProperties(object):
 
 class ExportStatuses(object):
   EXPORT_STATUSES = (
-    NOT_EXPORTED_YET, EXPORT_SUCCESSFUL, FORCE_INTERACTIVE, USE_DEFAULT_FILE_EXTENSION
-  ) = (0, 1, 2, 3)
+    NOT_EXPORTED_YET, EXPORT_SUCCESSFUL, FORCE_INTERACTIVE, USE_DEFAULT_FILE_EXTENSION,
+    UNCHANGED,
+  ) = (0, 1, 2, 3, 4)
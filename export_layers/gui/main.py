@@ -111,6 +111,17 @@ def stop_batcher(batcher):
     return False
 
 
+def _display_export_summary_message(batcher, parent):
+  if not batcher.exported_raw_items and not batcher.unchanged_raw_items:
+    messages_.display_message(_('No layers were exported.'), gtk.MESSAGE_INFO, parent=parent)
+  elif batcher.unchanged_raw_items:
+    messages_.display_message(
+      _('Layers exported: {}\nLayers skipped as unchanged since the last export: {}').format(
+        len(batcher.exported_raw_items), len(batcher.unchanged_raw_items)),
+      gtk.MESSAGE_INFO,
+      parent=parent)
+
+
 def _set_settings(func):
   """
   This is a decorator for `Group.apply_gui_values_to_settings()` that prevents
@@ -243,6 +254,8 @@ class ExportLayersDialog(object):
   
   _MAXIMUM_IMAGE_PREVIEW_AUTOMATIC_UPDATE_DURATION_SECONDS = 1.0
   
+  _NUM_SLOWEST_ACTIONS_TO_DISPLAY = 3
+  
   def __init__(self, initial_layer_tree, settings, run_gui_func=None):
     self._initial_layer_tree = initial_layer_tree
     self._settings = settings
@@ -250,6 +263,8 @@ class ExportLayersDialog(object):
     self._image = self._initial_layer_tree.image
     self._message_setting = None
     self._batcher = None
+    # Image copies are reused by previews and export while the dialog is open.
+    self._scratch_image_pool = pg.pdbutils.ScratchImagePool()
     self._batcher_for_previews = batcher_.Batcher(
       gimpenums.RUN_NONINTERACTIVE,
       self._image,
@@ -257,7 +272,8 @@ class ExportLayersDialog(object):
       self._settings['main/constraints'],
       overwrite_chooser=pg.overwrite.NoninteractiveOverwriteChooser(
         self._settings['main/overwrite_mode'].items['replace']),
-      item_tree=self._initial_layer_tree)
+      item_tree=self._initial_layer_tree,
+      scratch_image_pool=self._scratch_image_pool)
     
     if gimp.version[:2] == (2, 8):
       pg.pdbutils.suppress_gimp_progress()
@@ -275,10 +291,13 @@ class ExportLayersDialog(object):
     pg.gui.set_gui_excepthook_additional_callback(
       self._display_inline_message_on_setting_value_error)
     
-    if not run_gui_func:
-      gtk.main()
-    else:
-      run_gui_func(self, self._dialog, self._settings)
+    try:
+      if not run_gui_func:
+        gtk.main()
+      else:
+        run_gui_func(self, self._dialog, self._settings)
+    finally:
+      self._scratch_image_pool.clear()
   
   @property
   def name_preview(self):
@@ -561,7 +580,8 @@ class ExportLayersDialog(object):
       'changed',
       self._on_text_entry_changed,
       self._settings['main/layer_filename_pattern'],
-      'invalid_layer_filename_pattern')
+      'invalid_layer_filename_pattern',
+      previews_controller_.PreviewUpdateScheduler.UPDATE_NAMES)
     
     self._dialog.connect('key-press-event', self._on_dialog_key_press_event)
     self._dialog.connect('delete-event', self._on_dialog_delete_event)
@@ -576,6 +596,7 @@ class ExportLayersDialog(object):
     
     self._previews_controller.connect_setting_changes_to_previews()
     self._previews_controller.connect_name_preview_events()
+    self._previews_controller.connect_image_preview_events()
     
     self._image_preview.connect('preview-updated', self._on_image_preview_updated)
     self._name_preview.connect('preview-updated', self._on_name_preview_updated)
@@ -818,7 +839,12 @@ class ExportLayersDialog(object):
     
     return filepath, file_format, load_size_settings
   
-  def _on_text_entry_changed(self, entry, setting, name_preview_lock_update_key=None):
+  def _on_text_entry_changed(
+        self,
+        entry,
+        setting,
+        name_preview_lock_update_key=None,
+        name_preview_update_kind=previews_controller_.PreviewUpdateScheduler.UPDATE_CONTENTS):
     try:
       setting.gui.update_setting_value()
     except pg.setting.SettingValueError as e:
@@ -835,9 +861,10 @@ class ExportLayersDialog(object):
       self._name_preview.add_function_at_update(
         self._name_preview.set_sensitive, True)
       
-      pg.invocation.timeout_add_strict(
-        self._DELAY_NAME_PREVIEW_UPDATE_TEXT_ENTRIES_MILLISECONDS,
-        self._name_preview.update)
+      self._previews_controller.update_scheduler.request(
+        self._name_preview,
+        name_preview_update_kind,
+        self._DELAY_NAME_PREVIEW_UPDATE_TEXT_ENTRIES_MILLISECONDS)
   
   def _on_file_extension_entry_focus_out_event(self, entry, event, setting):
     setting.apply_to_gui()
@@ -1036,12 +1063,12 @@ class ExportLayersDialog(object):
       self._settings['special/first_plugin_run'].set_value(False)
       self._settings['special/first_plugin_run'].save()
       
-      if self._settings['main/edit_mode'].value or not self._batcher.exported_raw_items:
+      if self._settings['main/edit_mode'].value or not (
+           self._batcher.exported_raw_items or self._batcher.unchanged_raw_items):
         should_quit = False
       
-      if not self._settings['main/edit_mode'].value and not self._batcher.exported_raw_items:
-        messages_.display_message(
-          _('No layers were exported.'), gtk.MESSAGE_INFO, parent=self._dialog)
+      if not self._settings['main/edit_mode'].value:
+        _display_export_summary_message(self._batcher, self._dialog)
     finally:
       item_progress_indicator.uninstall_progress_for_status()
       self._name_preview.lock_update(False, lock_update_key)
@@ -1093,6 +1120,12 @@ class ExportLayersDialog(object):
       self._settings['main/constraints'],
       overwrite_chooser=overwrite_chooser,
       progress_updater=progress_updater,
+      profile_actions=pg.config.PROFILE_ACTIONS,
+      reorder_constraints=pg.config.REORDER_CONSTRAINTS,
+      cache_pdb_queries=pg.config.CACHE_PDB_QUERIES,
+      instrument_pdb_calls=pg.config.INSTRUMENT_PDB_CALLS,
+      pdb_call_report_filepath=pg.config.PDB_CALL_REPORT_FILEPATH,
+      scratch_image_pool=self._scratch_image_pool,
       export_context_manager=handle_gui_in_export,
       export_context_manager_args=[self._dialog])
     
@@ -1179,6 +1212,22 @@ class ExportLayersDialog(object):
         else:
           if clear_previous:
             box_item.set_warning(False)
+    
+    if batcher.profile is not None:
+      self._set_slowest_action_tooltips(action_boxes, batcher.profile)
+  
+  def _set_slowest_action_tooltips(self, action_boxes, profile):
+    slowest_actions = {
+      entry.action_name: entry
+      for entry in profile.get_slowest_actions(self._NUM_SLOWEST_ACTIONS_TO_DISPLAY)}
+    
+    for action_box in action_boxes:
+      for box_item in action_box.items:
+        if not box_item.has_warning() and box_item.action.name in slowest_actions:
+          entry = slowest_actions[box_item.action.name]
+          box_item.set_tooltip(
+            _('One of the slowest actions: {:.2f} s in total, {:.3f} s per call ({} calls)').format(
+              entry.total_time, entry.average_time, entry.num_calls))
   
   def _reset_action_tooltips_and_indicators(self):
     for action_box in [self._box_procedures, self._box_constraints]:
@@ -1288,9 +1337,8 @@ class ExportLayersRepeatDialog(object):
       else:
         messages_.display_invalid_image_failure_message(parent=self._dialog)
     else:
-      if not self._settings['main/edit_mode'].value and not self._batcher.exported_raw_items:
-        messages_.display_message(
-          _('No layers were exported.'), gtk.MESSAGE_INFO, parent=self._dialog)
+      if not self._settings['main/edit_mode'].value:
+        _display_export_summary_message(self._batcher, self._dialog)
     finally:
       item_progress_indicator.uninstall_progress_for_status()
   
@@ -20,6 +20,10 @@ class Preview(gtk.VBox):
     
     self._functions_to_invoke_at_update = []
   
+  @property
+  def is_update_locked(self):
+    return self._update_locked
+  
   def update(self):
     """Updates the preview if update is not locked (see `lock_update()`)."""
     if self._update_locked:
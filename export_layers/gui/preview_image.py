@@ -22,7 +22,6 @@ import gimpenums
 from export_layers import pygimplib as pg
 
 from export_layers import actions
-from export_layers import builtin_constraints
 from export_layers import exceptions
 from export_layers import utils as utils_
 
@@ -73,6 +72,10 @@ class ImagePreview(preview_base_.Preview):
     self._previous_preview_pixbuf_width = None
     self._previous_preview_pixbuf_height = None
     
+    # key: whether the pixbuf has an alpha channel
+    # value: pixbuf whose memory is reused when resizing the displayed preview
+    self._resize_buffer_pixbufs = {}
+    
     self.draw_checkboard_alpha_background = True
     
     self._is_updating = False
@@ -87,6 +90,12 @@ class ImagePreview(preview_base_.Preview):
     self._scale_item_action_id = None
     self._resize_item_action_id = None
     
+    # key: (raw item ID, preview size, raw item size, hash of settings,
+    #   dirty state of the image)
+    # value: (pixbuf without alpha background, displayed pixbuf)
+    self._pixbuf_cache = pg.utils.LruCache(
+      self._get_pixbuf_cache_max_size(), get_size=self._get_cached_pixbufs_size)
+    
     self.prepare_image_for_rendering()
     
     self._init_gui()
@@ -101,6 +110,9 @@ class ImagePreview(preview_base_.Preview):
     self._menu_item_update_automatically.connect(
       'toggled', self._on_menu_item_update_automatically_toggled)
     self._button_refresh.connect('clicked', self._on_button_refresh_clicked)
+    
+    self._settings['gui/image_preview_cache_size_megabytes'].connect_event(
+      'value-changed', self._on_image_preview_cache_size_changed)
   
   @property
   def item(self):
@@ -146,6 +158,48 @@ class ImagePreview(preview_base_.Preview):
       self._show_folder_image()
       self._set_item_name_label(self.item.name)
   
+  def prefetch(self, item):
+    """Renders `item` and caches the result without displaying it, so that a
+    subsequent update of the preview for `item` is instant.
+    
+    Nothing is rendered if the update is locked, the preview has not been
+    displayed yet, `item` is a folder or the rendered image of `item` is already
+    cached. Errors are not displayed to the user.
+    
+    Returns the duration of rendering in seconds, or `None` if nothing was
+    rendered.
+    """
+    if (self._update_locked
+        or not self._is_preview_image_allocated_size
+        or item.type == pg.itemtree.TYPE_FOLDER
+        or not pdb.gimp_item_is_valid(item.raw)):
+      return None
+    
+    cache_key = self._get_pixbuf_cache_key(item.raw)
+    if cache_key in self._pixbuf_cache:
+      return None
+    
+    start_update_time = time.time()
+    
+    # Rendering replaces the pixbuf used to resize the displayed image.
+    orig_preview_pixbuf = self._preview_pixbuf
+    
+    with pg.pdbutils.redirect_messages():
+      self._get_in_memory_preview_and_add_to_cache(item, cache_key, display_errors=False)
+    
+    self._preview_pixbuf = orig_preview_pixbuf
+    
+    return time.time() - start_update_time
+  
+  def invalidate_cache(self):
+    """Discards all rendered images cached by the preview.
+    
+    Call this method if the contents of the image may have changed in a way not
+    reflected by the dirty state of the image (e.g. if the image was modified
+    outside the plug-in dialog) or if tags of items changed.
+    """
+    self._pixbuf_cache.clear()
+  
   def clear(self, use_item_name=False):
     self.item = None
     self._preview_image.clear()
@@ -237,7 +291,7 @@ class ImagePreview(preview_base_.Preview):
     start_update_time = time.time()
     
     with pg.pdbutils.redirect_messages():
-      preview_pixbuf, error = self._get_in_memory_preview(self.item.raw)
+      preview_pixbuf, error = self._get_cached_or_in_memory_preview(self.item)
     
     if preview_pixbuf is not None:
       self._preview_image.set_from_pixbuf(preview_pixbuf)
@@ -311,18 +365,88 @@ class ImagePreview(preview_base_.Preview):
         
     self._show_placeholder_image()
   
-  def _get_in_memory_preview(self, raw_item):
+  def _get_cached_or_in_memory_preview(self, item):
+    raw_item = item.raw
+    
+    cache_key = self._get_pixbuf_cache_key(raw_item)
+    cached_pixbufs = self._pixbuf_cache.get(cache_key)
+    
+    if pg.config.DEBUG_IMAGE_PREVIEW_CACHE:
+      self._log_pixbuf_cache_access(raw_item, cached_pixbufs is not None)
+    
+    if cached_pixbufs is not None:
+      self._preview_pixbuf, raw_item_preview_pixbuf = cached_pixbufs
+      return raw_item_preview_pixbuf, None
+    
+    return self._get_in_memory_preview_and_add_to_cache(item, cache_key)
+  
+  def _log_pixbuf_cache_access(self, raw_item, is_hit):
+    log_file = pg.logging.create_log_file(
+      pg.config.PLUGINS_LOG_DIRPATHS, pg.config.PLUGINS_LOG_STDOUT_FILENAME)
+    
+    if log_file is None:
+      return
+    
+    with log_file:
+      log_file.write(
+        'Image preview cache: {} for "{}" ({} hits, {} misses, {} entries, {} bytes)\n'.format(
+          'hit' if is_hit else 'miss',
+          pg.utils.safe_decode_gimp(raw_item.name),
+          self._pixbuf_cache.num_hits,
+          self._pixbuf_cache.num_misses,
+          len(self._pixbuf_cache),
+          self._pixbuf_cache.size))
+  
+  def _get_in_memory_preview_and_add_to_cache(self, item, cache_key, display_errors=True):
+    raw_item_preview_pixbuf, error = self._get_in_memory_preview(item, display_errors)
+    
+    if raw_item_preview_pixbuf is not None and error is None:
+      self._pixbuf_cache.add(cache_key, (self._preview_pixbuf, raw_item_preview_pixbuf))
+    
+    return raw_item_preview_pixbuf, error
+  
+  def _get_pixbuf_cache_key(self, raw_item):
+    return (
+      raw_item.ID,
+      self._get_preview_size(raw_item.width, raw_item.height),
+      (raw_item.width, raw_item.height),
+      self._get_settings_hash(),
+      pdb.gimp_image_is_dirty(self._batcher.input_image))
+  
+  def _get_settings_hash(self):
+    settings_for_batcher = utils_.get_settings_for_batcher(self._settings['main'])
+    
+    actions_hash = actions.get_values_hash(
+      settings_for_batcher.pop('procedures'), settings_for_batcher.pop('constraints'))
+    
+    other_values = sorted((name, repr(value)) for name, value in settings_for_batcher.items())
+    
+    return hash((actions_hash, tuple(other_values)))
+  
+  def _get_pixbuf_cache_max_size(self):
+    return self._settings['gui/image_preview_cache_size_megabytes'].value * 1024 * 1024
+  
+  @staticmethod
+  def _get_cached_pixbufs_size(pixbufs):
+    return sum(pixbuf.get_rowstride() * pixbuf.get_height() for pixbuf in set(pixbufs))
+  
+  def _on_image_preview_cache_size_changed(self, setting):
+    self._pixbuf_cache.max_size = self._get_pixbuf_cache_max_size()
+  
+  def _get_in_memory_preview(self, item, display_errors=True):
+    raw_item = item.raw
+    
     self._preview_width, self._preview_height = self._get_preview_size(
       raw_item.width, raw_item.height)
     self._preview_scaling_factor = self._preview_width / raw_item.width
     
-    image_preview, error = self._get_image_preview()
+    image_preview, error = self._get_image_preview(item, display_errors)
     
     if image_preview is None or not pdb.gimp_image_is_valid(image_preview):
       return None, error
     
     if not image_preview.layers:
-      pg.pdbutils.try_delete_image(image_preview)
+      self._delete_image_preview(image_preview)
       return None, error
     
     if image_preview.base_type != gimpenums.RGB:
@@ -343,34 +467,33 @@ class ImagePreview(preview_base_.Preview):
     raw_item_preview_pixbuf = self._get_preview_pixbuf(
       raw_item_preview, self._preview_width, self._preview_height, preview_data)
     
-    pdb.gimp_image_delete(image_preview)
+    self._delete_image_preview(image_preview)
     
     return raw_item_preview_pixbuf, error
   
-  def _get_image_preview(self):
-    # The processing requires items in their original state as some procedures
-    # might depend on their values, which would otherwise produce an image that
-    # would not correspond to the real output. We therefore reset items.
-    # Also, we need to restore the items' state once the processing is finished
-    # so that proper names are displayed in the image preview - the same ones as
-    # produced by the name preview, since we assume here that the image preview
-    # is updated after the name preview.
-    if self._batcher.item_tree is not None:
-      for item in self._batcher.item_tree.iter_all():
-        item.push_state()
-        item.reset()
-    
-    only_selected_item_constraint_id = self._batcher.add_constraint(
-      builtin_constraints.is_item_in_selected_items,
-      groups=[actions.DEFAULT_CONSTRAINTS_GROUP],
-      args=[[self.item.raw.ID]])
+  def _get_image_preview(self, item_to_process, display_errors=True):
+    # The processing requires the item in its original state as some procedures
+    # might depend on its values, which would otherwise produce an image that
+    # would not correspond to the real output. We therefore reset the item and
+    # its parents (whose names may be used by procedures). Also, we need to
+    # restore their state once the processing is finished so that proper names
+    # are displayed in the image preview - the same ones as produced by the name
+    # preview. `PreviewsController` ensures that a pending update of the name
+    # preview is executed before the image preview is updated. A snapshot of the
+    # item tree also restores any other items modified during the processing.
+    item_tree = self._batcher.item_tree
+    item_tree_snapshot = item_tree.snapshot()
+    
+    for item in [item_to_process] + item_to_process.parents:
+      item.reset()
     
     error = None
     
     try:
-      image_preview = self._batcher.run(
+      image_preview = self._batcher.run_single(
+        item_to_process,
         keep_image_copy=True,
-        item_tree=self._batcher.item_tree,
+        item_tree=item_tree,
         is_preview=True,
         process_contents=True,
         process_names=False,
@@ -379,33 +502,36 @@ class ImagePreview(preview_base_.Preview):
     except exceptions.BatcherCancelError as e:
       pass
     except exceptions.ActionError as e:
-      messages_.display_failure_message(
-        messages_.get_failing_action_message(e),
-        failure_message=str(e),
-        details=traceback.format_exc(),
-        parent=pg.gui.get_toplevel_window(self))
+      if display_errors:
+        messages_.display_failure_message(
+          messages_.get_failing_action_message(e),
+          failure_message=str(e),
+          details=traceback.format_exc(),
+          parent=pg.gui.get_toplevel_window(self))
       
       error = e
       image_preview = None
     except Exception as e:
-      messages_.display_failure_message(
-        _('There was a problem with updating the image preview:'),
-        failure_message=str(e),
-        details=traceback.format_exc(),
-        parent=pg.gui.get_toplevel_window(self))
+      if display_errors:
+        messages_.display_failure_message(
+          _('There was a problem with updating the image preview:'),
+          failure_message=str(e),
+          details=traceback.format_exc(),
+          parent=pg.gui.get_toplevel_window(self))
       
       error = e
       image_preview = None
     
-    self._batcher.remove_action(
-      only_selected_item_constraint_id, [actions.DEFAULT_CONSTRAINTS_GROUP])
-    
-    if self._batcher.item_tree is not None:
-      for item in self._batcher.item_tree.iter_all():
-        item.pop_state()
+    item_tree.restore(item_tree_snapshot)
     
     return image_preview, error
   
+  def _delete_image_preview(self, image_preview):
+    if self._batcher.scratch_image_pool is not None:
+      self._batcher.scratch_image_pool.release(image_preview)
+    else:
+      pg.pdbutils.try_delete_image(image_preview)
+  
   def _resize_image_for_batcher(self, batcher, *args, **kwargs):
     image = batcher.current_image
     
@@ -507,16 +633,38 @@ class ImagePreview(preview_base_.Preview):
         and self._previous_preview_pixbuf_height == scaled_preview_height):
       return
     
-    scaled_preview_pixbuf = preview_pixbuf.scale_simple(
-      scaled_preview_width, scaled_preview_height, gtk.gdk.INTERP_BILINEAR)
-    
-    scaled_preview_pixbuf = self._add_alpha_background_to_pixbuf(
-      scaled_preview_pixbuf,
-      100,
-      self.draw_checkboard_alpha_background,
-      self._PREVIEW_ALPHA_CHECK_SIZE,
-      self._preview_alpha_check_color_first,
-      self._preview_alpha_check_color_second)
+    if preview_pixbuf.get_has_alpha():
+      scaled_preview_pixbuf = self._get_resize_buffer_pixbuf(
+        scaled_preview_width,
+        scaled_preview_height,
+        not self.draw_checkboard_alpha_background)
+      
+      # Scaling is performed as part of compositing to avoid allocating an
+      # intermediate scaled pixbuf.
+      self._add_alpha_background_to_pixbuf(
+        preview_pixbuf,
+        100,
+        self.draw_checkboard_alpha_background,
+        self._PREVIEW_ALPHA_CHECK_SIZE,
+        self._preview_alpha_check_color_first,
+        self._preview_alpha_check_color_second,
+        dest_pixbuf=scaled_preview_pixbuf,
+        interpolation_type=gtk.gdk.INTERP_BILINEAR)
+    else:
+      scaled_preview_pixbuf = self._get_resize_buffer_pixbuf(
+        scaled_preview_width, scaled_preview_height, False)
+      
+      preview_pixbuf.scale(
+        scaled_preview_pixbuf,
+        0,
+        0,
+        scaled_preview_width,
+        scaled_preview_height,
+        0,
+        0,
+        scaled_preview_width / preview_pixbuf.get_width(),
+        scaled_preview_height / preview_pixbuf.get_height(),
+        gtk.gdk.INTERP_BILINEAR)
     
     self._preview_image.set_from_pixbuf(scaled_preview_pixbuf)
     self.queue_draw()
@@ -524,6 +672,30 @@ class ImagePreview(preview_base_.Preview):
     self._previous_preview_pixbuf_width = scaled_preview_width
     self._previous_preview_pixbuf_height = scaled_preview_height
   
+  def _get_resize_buffer_pixbuf(self, width, height, has_alpha):
+    """Returns a pixbuf of the specified size sharing memory with a buffer
+    pixbuf that is only reallocated if it is smaller than the requested size.
+    
+    Resizing the preview (e.g. by dragging a pane) thus does not allocate memory
+    for each new size. The returned pixbuf is only valid until the next call to
+    this method.
+    """
+    buffer_pixbuf = self._resize_buffer_pixbufs.get(has_alpha)
+    
+    if (buffer_pixbuf is None
+        or buffer_pixbuf.get_width() < width
+        or buffer_pixbuf.get_height() < height):
+      buffer_width, buffer_height = width, height
+      if buffer_pixbuf is not None:
+        buffer_width = max(buffer_width, buffer_pixbuf.get_width())
+        buffer_height = max(buffer_height, buffer_pixbuf.get_height())
+      
+      buffer_pixbuf = gtk.gdk.Pixbuf(
+        gtk.gdk.COLORSPACE_RGB, has_alpha, 8, buffer_width, buffer_height)
+      self._resize_buffer_pixbufs[has_alpha] = buffer_pixbuf
+    
+    return buffer_pixbuf.subpixbuf(0, 0, width, height)
+  
   def _on_size_allocate(self, preview, allocation):
     if not self._is_updating and not self._preview_image.get_mapped():
       preview_widget_allocated_width = allocation.width - self._BORDER_WIDTH
@@ -578,6 +750,9 @@ class ImagePreview(preview_base_.Preview):
       self.lock_update(True, self._MANUAL_UPDATE_LOCK)
   
   def _on_button_refresh_clicked(self, button):
+    # Refreshing manually should always render the image anew.
+    self.invalidate_cache()
+    
     if self._MANUAL_UPDATE_LOCK in self._lock_keys:
       self.lock_update(False, self._MANUAL_UPDATE_LOCK)
       self.update()
@@ -592,26 +767,42 @@ class ImagePreview(preview_base_.Preview):
         use_checkboard_background=False,
         check_size=None,
         check_color_first=None,
-        check_color_second=None):
-    if use_checkboard_background:
-      pixbuf_with_alpha_background = gtk.gdk.Pixbuf(
+        check_color_second=None,
+        dest_pixbuf=None,
+        interpolation_type=gtk.gdk.INTERP_NEAREST):
+    """Composites `pixbuf` onto a checkerboard or a transparent background.
+    
+    If `dest_pixbuf` is `None`, a new pixbuf of the same size as `pixbuf` is
+    created. Otherwise, `pixbuf` is scaled to the size of `dest_pixbuf` and
+    composited onto it, overwriting its contents. `dest_pixbuf` must not have
+    an alpha channel if `use_checkboard_background` is `True` and must have an
+    alpha channel otherwise.
+    """
+    if dest_pixbuf is None:
+      dest_pixbuf = gtk.gdk.Pixbuf(
         gtk.gdk.COLORSPACE_RGB,
-        False,
+        not use_checkboard_background,
         8,
         pixbuf.get_width(),
         pixbuf.get_height())
-      
+    
+    scale_x = dest_pixbuf.get_width() / pixbuf.get_width()
+    scale_y = dest_pixbuf.get_height() / pixbuf.get_height()
+    
+    if use_checkboard_background:
+      # The checks are drawn while compositing, hence no separate background
+      # pixbuf needs to be created or cached.
       pixbuf.composite_color(
-        pixbuf_with_alpha_background,
+        dest_pixbuf,
         0,
         0,
-        pixbuf.get_width(),
-        pixbuf.get_height(),
+        dest_pixbuf.get_width(),
+        dest_pixbuf.get_height(),
         0,
         0,
-        1.0,
-        1.0,
-        gtk.gdk.INTERP_NEAREST,
+        scale_x,
+        scale_y,
+        interpolation_type,
         int(round((opacity / 100.0) * 255)),
         0,
         0,
@@ -619,31 +810,33 @@ class ImagePreview(preview_base_.Preview):
         check_color_first,
         check_color_second)
     else:
-      pixbuf_with_alpha_background = gtk.gdk.Pixbuf(
-        gtk.gdk.COLORSPACE_RGB,
-        True,
-        8,
-        pixbuf.get_width(),
-        pixbuf.get_height())
-      pixbuf_with_alpha_background.fill(0xffffff00)
+      dest_pixbuf.fill(0xffffff00)
       
       pixbuf.composite(
-        pixbuf_with_alpha_background,
+        dest_pixbuf,
         0,
         0,
-        pixbuf.get_width(),
-        pixbuf.get_height(),
+        dest_pixbuf.get_width(),
+        dest_pixbuf.get_height(),
         0,
         0,
-        1.0,
-        1.0,
-        gtk.gdk.INTERP_NEAREST,
+        scale_x,
+        scale_y,
+        interpolation_type,
         int(round((opacity / 100.0) * 255)))
     
-    return pixbuf_with_alpha_background
+    return dest_pixbuf
   
   @staticmethod
   def _get_preview_data(raw_item, preview_width, preview_height):
+    if raw_item.width == preview_width and raw_item.height == preview_height:
+      # The item was already scaled to the preview size during processing.
+      # Reading the pixels directly yields a string, avoiding the conversion of
+      # the tuple of integers returned by `gimp-drawable-thumbnail`, and is not
+      # subject to the maximum thumbnail size.
+      pixel_region = raw_item.get_pixel_rgn(0, 0, preview_width, preview_height, False, False)
+      return preview_width, preview_height, pixel_region[0:preview_width, 0:preview_height]
+    
     actual_preview_width, actual_preview_height, unused_, unused_, preview_data = (
       pdb.gimp_drawable_thumbnail(raw_item, preview_width, preview_height))
     
@@ -135,8 +135,8 @@ class NamePreview(preview_base_.Preview):
     item group, etc.).
     
     If `reset_items` is `True`, perform full update - add new items, remove
-    non-existent items, etc. Note that setting this to `True` may introduce a
-    performance penalty for hundreds of items.
+    non-existent items, etc. The existing item tree is refreshed rather than
+    created anew (see `pygimplib.itemtree.ItemTree.refresh()`).
     
     If `update_existing_contents_only` is `True`, only update the contents of
     the existing items. Note that the items will not be reparented,
@@ -151,25 +151,24 @@ class NamePreview(preview_base_.Preview):
     if update_locked:
       return
     
-    if not update_existing_contents_only:
-      self.clear()
-    
     error = self._process_items(reset_items=reset_items)
     
     if error:
+      if not update_existing_contents_only:
+        self.clear()
+      
       self.emit('preview-updated', error)
       return
     
     items = self._get_items_to_process()
     
     if not update_existing_contents_only:
-      self._insert_items(items)
-      self._set_expanded_items()
+      self._update_tree_model(items)
+      self._set_selection()
     else:
       self._update_items(items)
-    
-    self._set_selection()
-    self._set_item_tree_sensitive_for_selected(items)
+      self._set_selection()
+      self._set_item_tree_sensitive_for_selected(items)
     
     self._update_available_tags()
     
@@ -213,6 +212,25 @@ class NamePreview(preview_base_.Preview):
     else:
       return None
   
+  def get_items_around_cursor(self):
+    """Returns a tuple of items in the visible rows directly above and below the
+    row at the cursor.
+    
+    `None` is returned in place of an item if there is no such row or if there
+    is no cursor.
+    """
+    tree_path, unused_ = self._tree_view.get_cursor()
+    if tree_path is None:
+      return None, None
+    
+    return tuple(
+      self._batcher.item_tree[
+        self._get_key_from_tree_iter(self._tree_model.get_iter(neighbouring_tree_path))]
+      if neighbouring_tree_path is not None else None
+      for neighbouring_tree_path in [
+        self._get_previous_visible_tree_path(tree_path),
+        self._get_next_visible_tree_path(tree_path)])
+  
   def _init_gui(self):
     self._tree_model = gtk.TreeStore(*[column[1] for column in self._COLUMNS])
     
@@ -516,12 +534,53 @@ class NamePreview(preview_base_.Preview):
       self._get_key_from_tree_iter(self._tree_model.get_iter(tree_path))
       for tree_path in tree_paths]
   
+  def _get_previous_visible_tree_path(self, tree_path):
+    if tree_path[-1] == 0:
+      return tree_path[:-1] if len(tree_path) > 1 else None
+    
+    previous_tree_path = tree_path[:-1] + (tree_path[-1] - 1,)
+    
+    # Descend to the last visible row nested in the previous sibling.
+    while self._tree_view.row_expanded(previous_tree_path):
+      num_children = self._tree_model.iter_n_children(
+        self._tree_model.get_iter(previous_tree_path))
+      if not num_children:
+        break
+      
+      previous_tree_path += (num_children - 1,)
+    
+    return previous_tree_path
+  
+  def _get_next_visible_tree_path(self, tree_path):
+    tree_iter = self._tree_model.get_iter(tree_path)
+    
+    if self._tree_view.row_expanded(tree_path) and self._tree_model.iter_has_child(tree_iter):
+      return tree_path + (0,)
+    
+    # Ascend until a row has a next sibling.
+    while tree_iter is not None:
+      next_tree_iter = self._tree_model.iter_next(tree_iter)
+      if next_tree_iter is not None:
+        return self._tree_model.get_path(next_tree_iter)
+      
+      tree_iter = self._tree_model.iter_parent(tree_iter)
+    
+    return None
+  
   def _get_key(self, item):
     if item.type != pg.itemtree.TYPE_FOLDER:
       return item.raw.ID
     else:
       return (item.raw.ID, pg.itemtree.FOLDER_KEY)
   
+  def _get_parent_key(self, item):
+    return self._get_key(item.parent) if item.parent is not None else None
+  
+  def _get_parent_key_from_tree_iter(self, tree_iter):
+    parent_tree_iter = self._tree_model.iter_parent(tree_iter)
+    return (
+      self._get_key_from_tree_iter(parent_tree_iter) if parent_tree_iter is not None else None)
+  
   def _get_key_from_tree_iter(self, tree_iter):
     item_id = self._tree_model.get_value(tree_iter, column=self._COLUMN_ITEM_ID[0])
     item_type = self._tree_model.get_value(tree_iter, column=self._COLUMN_ITEM_TYPE[0])
@@ -539,20 +598,19 @@ class NamePreview(preview_base_.Preview):
       return list(self._batcher.item_tree)
   
   def _process_items(self, reset_items=False):
-    if not reset_items:
-      if self._initial_item_tree is not None:
-        item_tree = self._initial_item_tree
-        self._initial_item_tree = None
-      else:
-        item_tree = self._batcher.item_tree
+    if self._initial_item_tree is not None:
+      item_tree = self._initial_item_tree
+      self._initial_item_tree = None
     else:
-      item_tree = None
+      item_tree = self._batcher.item_tree
     
     if item_tree is not None:
+      if reset_items:
+        item_tree.refresh()
+      
       # We need to reset item attributes explicitly before processing since
-      # existing item trees are not automatically refreshed.
-      for item in item_tree.iter_all():
-        item.reset()
+      # existing item trees preserve attributes modified by previous runs.
+      item_tree.reset_all()
     
     error = None
     
@@ -591,30 +649,140 @@ class NamePreview(preview_base_.Preview):
       self._update_parent_items(item, updated_parents)
       self._update_item(item)
   
-  def _insert_items(self, items):
-    inserted_parents = set()
+  def _update_tree_model(self, items):
+    """Updates rows in the tree view to display `items` and their parents.
+    
+    Only rows whose contents, parent or position changed are modified. Rows of
+    items no longer displayed are removed. The expanded state is set only for
+    rows that had no children before the update.
+    """
+    items_to_display = self._get_items_to_display(items)
+    
+    child_keys = collections.defaultdict(list)
+    for key, item in items_to_display.items():
+      child_keys[self._get_parent_key(item)].append(key)
+    
+    items_sensitive = self._get_items_sensitive(items_to_display)
+    
+    is_tree_model_empty = self._tree_model.get_iter_first() is None
+    
+    self._row_expand_collapse_interactive = False
+    self._clearing_preview = True
+    
+    self._remove_rows_not_displayed(items_to_display)
+    
+    parent_keys_to_expand = []
+    
+    for parent_key in [None] + [key for key in items_to_display if key in child_keys]:
+      parent_tree_iter = self._tree_iters[parent_key] if parent_key is not None else None
+      
+      if parent_tree_iter is not None and not self._tree_model.iter_has_child(parent_tree_iter):
+        parent_keys_to_expand.append(parent_key)
+      
+      next_tree_iter = self._tree_model.iter_children(parent_tree_iter)
+      
+      for key in child_keys[parent_key]:
+        row = self._get_row(items_to_display[key], items_sensitive[key])
+        tree_iter = self._tree_iters.get(key)
+        
+        if tree_iter is None:
+          self._tree_iters[key] = self._tree_model.insert_before(
+            parent_tree_iter, next_tree_iter, row)
+        else:
+          if next_tree_iter is not None and self._get_key_from_tree_iter(next_tree_iter) == key:
+            next_tree_iter = self._tree_model.iter_next(next_tree_iter)
+          else:
+            self._tree_model.move_before(tree_iter, next_tree_iter)
+          
+          self._update_row(tree_iter, row)
+    
+    self._clearing_preview = False
+    self._row_expand_collapse_interactive = True
+    
+    if is_tree_model_empty:
+      self._set_expanded_items()
+    else:
+      for parent_key in parent_keys_to_expand:
+        self._set_expanded_items(self._tree_model.get_path(self._tree_iters[parent_key]))
+  
+  def _get_items_to_display(self, items):
+    # Parents precede their children.
+    items_to_display = collections.OrderedDict()
+    
     for item in items:
-      self._insert_parent_items(item, inserted_parents)
-      self._insert_item(item)
+      for parent in item.parents:
+        parent_key = self._get_key(parent)
+        if parent_key not in items_to_display:
+          items_to_display[parent_key] = parent
+      
+      items_to_display[self._get_key(item)] = item
+    
+    return items_to_display
   
-  def _insert_item(self, item):
-    if item.parent:
-      parent_tree_iter = self._tree_iters[self._get_key(item.parent)]
-    else:
-      parent_tree_iter = None
+  def _get_items_sensitive(self, items_to_display):
+    if not self.is_filtering:
+      return {key: True for key in items_to_display}
+    
+    selected_items = set(self._selected_items)
+    items_sensitive = {key: key in selected_items for key in items_to_display}
+    
+    # Children are processed before their parents so that a parent is sensitive
+    # if any of its children is sensitive.
+    for key, item in reversed(list(items_to_display.items())):
+      if items_sensitive[key] and item.parent is not None:
+        items_sensitive[self._get_key(item.parent)] = True
+    
+    return items_sensitive
+  
+  def _remove_rows_not_displayed(self, items_to_display):
+    keys_to_remove = []
     
-    tree_iter = self._tree_model.append(
-      parent_tree_iter,
-      [self._get_icon_from_item(item),
-       bool(item.tags),
-       True,
-       pg.utils.safe_encode_gtk(item.name),
-       item.raw.ID,
-       item.type])
+    for key, tree_iter in list(self._tree_iters.items()):
+      if tree_iter is None:
+        del self._tree_iters[key]
+      elif (key not in items_to_display
+            or (self._get_parent_key_from_tree_iter(tree_iter)
+                != self._get_parent_key(items_to_display[key]))):
+        keys_to_remove.append(key)
     
-    self._tree_iters[self._get_key(item)] = tree_iter
+    for key in keys_to_remove:
+      # The row may have already been removed along with its parent.
+      tree_iter = self._tree_iters.get(key)
+      if tree_iter is not None:
+        self._remove_row(tree_iter)
+  
+  def _remove_row(self, tree_iter):
+    tree_iters_to_process = [tree_iter]
+    
+    while tree_iters_to_process:
+      current_tree_iter = tree_iters_to_process.pop()
+      self._tree_iters.pop(self._get_key_from_tree_iter(current_tree_iter), None)
+      
+      child_tree_iter = self._tree_model.iter_children(current_tree_iter)
+      while child_tree_iter is not None:
+        tree_iters_to_process.append(child_tree_iter)
+        child_tree_iter = self._tree_model.iter_next(child_tree_iter)
     
-    return tree_iter
+    self._tree_model.remove(tree_iter)
+  
+  def _get_row(self, item, sensitive):
+    return [
+      self._get_icon_from_item(item),
+      bool(item.tags),
+      sensitive,
+      pg.utils.safe_encode_gtk(item.name),
+      item.raw.ID,
+      item.type]
+  
+  def _update_row(self, tree_iter, row):
+    columns_and_values = []
+    
+    for column, value in zip(self._COLUMNS[:4], row):
+      if self._tree_model.get_value(tree_iter, column[0]) != value:
+        columns_and_values.extend([column[0], value])
+    
+    if columns_and_values:
+      self._tree_model.set(tree_iter, *columns_and_values)
   
   def _update_item(self, item):
     self._tree_model.set(
@@ -626,12 +794,6 @@ class NamePreview(preview_base_.Preview):
       self._COLUMN_ITEM_NAME[0],
       pg.utils.safe_encode_gtk(item.name))
   
-  def _insert_parent_items(self, item, inserted_parents):
-    for parent in item.parents:
-      if parent not in inserted_parents:
-        self._insert_item(parent)
-        inserted_parents.add(parent)
-  
   def _update_parent_items(self, item, updated_parents):
     for parent in item.parents:
       if parent not in updated_parents:
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 
-"""Class interconnecting preview widgets for item names and images."""
+"""Classes interconnecting preview widgets for item names and images and
+scheduling their updates.
+"""
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 from future.builtins import *
 
+import time
+
 from export_layers import pygimplib as pg
 
 from export_layers import builtin_constraints
@@ -12,11 +16,205 @@ from export_layers import builtin_procedures
 from export_layers import exceptions
 
 
+class PreviewUpdateScheduler(object):
+  """Class scheduling delayed updates of previews and merging update requests
+  for the same preview made before the pending update is executed.
+  
+  Each request specifies a kind of update - `UPDATE_NAMES`, `UPDATE_CONTENTS`
+  or `UPDATE_RESET`, from the least to the most thorough. A request for a
+  preview with a pending update is merged with the pending update into a single
+  update of the most thorough kind requested, and the update is postponed.
+  Superseded requests are thus never executed, e.g. when dragging a spin
+  button.
+  
+  The delay before an update is executed adapts to how long updates of the
+  preview take. The average duration of recent updates is used as the delay,
+  limited to the range given by `min_delay_milliseconds` and
+  `max_delay_milliseconds`. Previews taking long to update are hence updated
+  less often during bursts of requests.
+  
+  A preview may depend on the results of updating other previews. Before a
+  pending update of such a preview is executed, pending updates of the previews
+  it depends on are executed first, regardless of their delays.
+  
+  Attributes:
+  
+  * `num_requests` - Number of update requests received.
+  
+  * `num_merged_requests` - Number of requests merged with a pending update.
+  
+  * `num_executed_updates` - Number of updates executed.
+  """
+  
+  UPDATE_NAMES = 0
+  UPDATE_CONTENTS = 1
+  UPDATE_RESET = 2
+  
+  _UPDATE_KINDS = [UPDATE_NAMES, UPDATE_CONTENTS, UPDATE_RESET]
+  
+  # Weight of the duration of the most recent update in the average duration.
+  _DURATION_SMOOTHING_FACTOR = 0.5
+  
+  def __init__(self, min_delay_milliseconds, max_delay_milliseconds):
+    self._min_delay_milliseconds = min_delay_milliseconds
+    self._max_delay_milliseconds = max_delay_milliseconds
+    
+    self._update_funcs = {}
+    self._previews_to_update_first = {}
+    self._scheduled_funcs = {}
+    self._pending_update_kinds = {}
+    self._average_durations_seconds = {}
+    
+    self._num_requests = 0
+    self._num_merged_requests = 0
+    self._num_executed_updates = 0
+  
+  @property
+  def num_requests(self):
+    return self._num_requests
+  
+  @property
+  def num_merged_requests(self):
+    return self._num_merged_requests
+  
+  @property
+  def num_executed_updates(self):
+    return self._num_executed_updates
+  
+  def add_preview(self, preview, update_funcs, update_after=None):
+    """Allows scheduling updates of `preview`.
+    
+    `update_funcs` is a dictionary of (kind of update, function) pairs. The
+    functions are called without arguments. If no function is specified for a
+    kind of update, the function of the nearest more thorough kind is used.
+    
+    `update_after` is a list of previews whose pending updates are executed
+    before the pending update of `preview`.
+    """
+    self._update_funcs[preview] = dict(update_funcs)
+    self._previews_to_update_first[preview] = list(update_after) if update_after else []
+    
+    # `pygimplib.invocation.timeout_add_strict()` distinguishes scheduled
+    # functions by identity, hence each preview needs its own function.
+    self._scheduled_funcs[preview] = lambda: self._execute_pending_update(preview)
+  
+  def request(self, preview, update_kind, min_delay_milliseconds=None):
+    """Schedules an update of `preview` of the specified kind.
+    
+    If an update of `preview` is pending, the requests are merged and the update
+    is postponed. If `min_delay_milliseconds` is not `None`, the update is
+    delayed by at least the specified amount of time.
+    """
+    self._num_requests += 1
+    self._merge_with_pending_update(preview, update_kind)
+    
+    delay_milliseconds = self.get_delay_milliseconds(preview)
+    if min_delay_milliseconds is not None:
+      delay_milliseconds = max(delay_milliseconds, min_delay_milliseconds)
+    
+    pg.invocation.timeout_add_strict(delay_milliseconds, self._scheduled_funcs[preview])
+  
+  def update_now(self, preview, update_kind):
+    """Updates `preview` immediately, merging the update with the pending
+    update of `preview`, if any.
+    """
+    self._num_requests += 1
+    self._merge_with_pending_update(preview, update_kind)
+    
+    pg.invocation.timeout_remove_strict(self._scheduled_funcs[preview])
+    self._execute_pending_update(preview)
+  
+  def cancel(self, preview):
+    """Discards the pending update of `preview`, if any."""
+    pg.invocation.timeout_remove_strict(self._scheduled_funcs[preview])
+    self._pending_update_kinds.pop(preview, None)
+  
+  def is_pending(self, preview):
+    return preview in self._pending_update_kinds
+  
+  def get_delay_milliseconds(self, preview):
+    """Returns the delay before executing a newly requested update of
+    `preview`.
+    """
+    average_duration_seconds = self._average_durations_seconds.get(preview)
+    if average_duration_seconds is None:
+      return self._min_delay_milliseconds
+    
+    return int(round(
+      min(
+        max(average_duration_seconds * 1000, self._min_delay_milliseconds),
+        self._max_delay_milliseconds)))
+  
+  def get_average_duration_seconds(self, preview):
+    """Returns the average duration of recent updates of `preview` in seconds,
+    or `None` if `preview` has not been updated yet.
+    """
+    return self._average_durations_seconds.get(preview)
+  
+  def _merge_with_pending_update(self, preview, update_kind):
+    if preview in self._pending_update_kinds:
+      self._num_merged_requests += 1
+      update_kind = max(update_kind, self._pending_update_kinds[preview])
+    
+    self._pending_update_kinds[preview] = update_kind
+  
+  def _execute_pending_update(self, preview):
+    if preview not in self._pending_update_kinds:
+      return
+    
+    for preview_to_update_first in self._previews_to_update_first[preview]:
+      if preview_to_update_first in self._pending_update_kinds:
+        pg.invocation.timeout_remove_strict(self._scheduled_funcs[preview_to_update_first])
+        self._execute_pending_update(preview_to_update_first)
+    
+    # The update of another preview may have cancelled the pending update.
+    update_kind = self._pending_update_kinds.pop(preview, None)
+    if update_kind is None:
+      return
+    
+    update_func = self._get_update_func(preview, update_kind)
+    is_update_locked = preview.is_update_locked
+    
+    start_time = time.time()
+    update_func()
+    duration_seconds = time.time() - start_time
+    
+    self._num_executed_updates += 1
+    
+    # Updates of locked previews return immediately and would only skew the
+    # average duration.
+    if not is_update_locked:
+      self._add_duration(preview, duration_seconds)
+  
+  def _get_update_func(self, preview, update_kind):
+    for kind in self._UPDATE_KINDS[self._UPDATE_KINDS.index(update_kind):]:
+      if kind in self._update_funcs[preview]:
+        return self._update_funcs[preview][kind]
+    
+    raise ValueError('no function to perform update of kind {} of {}'.format(update_kind, preview))
+  
+  def _add_duration(self, preview, duration_seconds):
+    average_duration_seconds = self._average_durations_seconds.get(preview)
+    if average_duration_seconds is None:
+      self._average_durations_seconds[preview] = duration_seconds
+    else:
+      self._average_durations_seconds[preview] = (
+        self._DURATION_SMOOTHING_FACTOR * duration_seconds
+        + (1 - self._DURATION_SMOOTHING_FACTOR) * average_duration_seconds)
+
+
 class PreviewsController(object):
   
   _DELAY_PREVIEWS_SETTING_UPDATE_MILLISECONDS = 50
   _DELAY_PREVIEWS_PANE_DRAG_UPDATE_MILLISECONDS = 500
   
+  # Upper limit of the delay adapted to the duration of preview updates.
+  _MAX_DELAY_PREVIEWS_SETTING_UPDATE_MILLISECONDS = 500
+  
+  # Maximum total time spent rendering neighbouring items in the image preview
+  # in advance after each update of the image preview.
+  _PREFETCH_TIME_BUDGET_SECONDS = 0.5
+  
   _ACTION_ERROR_KEY = 'action_error'
   
   def __init__(self, name_preview, image_preview, settings, image):
@@ -31,10 +229,39 @@ class PreviewsController(object):
     
     self._last_name_preview_update_successful = True
     
+    self._items_to_prefetch = []
+    self._remaining_prefetch_seconds = 0.0
+    
     self._paned_outside_previews_previous_position = (
       self._settings['gui/size/paned_outside_previews_position'].value)
     self._paned_between_previews_previous_position = (
       self._settings['gui/size/paned_between_previews_position'].value)
+    
+    self._update_scheduler = PreviewUpdateScheduler(
+      self._DELAY_PREVIEWS_SETTING_UPDATE_MILLISECONDS,
+      self._MAX_DELAY_PREVIEWS_SETTING_UPDATE_MILLISECONDS)
+    
+    self._update_scheduler.add_preview(
+      self._name_preview,
+      {
+        PreviewUpdateScheduler.UPDATE_NAMES: self._update_names_in_name_preview,
+        PreviewUpdateScheduler.UPDATE_CONTENTS: self._name_preview.update,
+        PreviewUpdateScheduler.UPDATE_RESET: (
+          lambda: self._name_preview.update(reset_items=True)),
+      })
+    
+    self._update_scheduler.add_preview(
+      self._image_preview,
+      {
+        PreviewUpdateScheduler.UPDATE_CONTENTS: self._image_preview.update,
+        PreviewUpdateScheduler.UPDATE_RESET: self._reset_image_preview,
+      },
+      # The image preview displays item names produced by the name preview.
+      update_after=[self._name_preview])
+  
+  @property
+  def update_scheduler(self):
+    return self._update_scheduler
   
   def connect_setting_changes_to_previews(self):
     self._connect_actions_changed(self._settings['main/procedures'])
@@ -58,7 +285,12 @@ class PreviewsController(object):
     self._name_preview.connect(
       'preview-tags-changed', self._on_name_preview_tags_changed)
   
+  def connect_image_preview_events(self):
+    self._image_preview.connect('preview-updated', self._on_image_preview_updated)
+  
   def on_paned_outside_previews_notify_position(self, paned, property_spec):
+    self._stop_prefetch()
+    
     current_position = paned.get_position()
     max_position = paned.get_property('max-position')
     
@@ -84,16 +316,19 @@ class PreviewsController(object):
         'previews_sensitive')
     elif current_position != self._paned_outside_previews_previous_position:
       if self._image_preview.is_larger_than_image():
-        pg.invocation.timeout_add_strict(
-          self._DELAY_PREVIEWS_PANE_DRAG_UPDATE_MILLISECONDS,
-          self._image_preview.update)
+        self._update_scheduler.request(
+          self._image_preview,
+          PreviewUpdateScheduler.UPDATE_CONTENTS,
+          self._DELAY_PREVIEWS_PANE_DRAG_UPDATE_MILLISECONDS)
       else:
-        pg.invocation.timeout_remove_strict(self._image_preview.update)
+        self._update_scheduler.cancel(self._image_preview)
         self._image_preview.resize()
     
     self._paned_outside_previews_previous_position = current_position
   
   def on_paned_between_previews_notify_position(self, paned, property_spec):
+    self._stop_prefetch()
+    
     current_position = paned.get_position()
     max_position = paned.get_property('max-position')
     min_position = paned.get_property('min-position')
@@ -124,11 +359,12 @@ class PreviewsController(object):
         'vpaned_preview_sensitive')
     elif current_position != self._paned_between_previews_previous_position:
       if self._image_preview.is_larger_than_image():
-        pg.invocation.timeout_add_strict(
-          self._DELAY_PREVIEWS_PANE_DRAG_UPDATE_MILLISECONDS,
-          self._image_preview.update)
+        self._update_scheduler.request(
+          self._image_preview,
+          PreviewUpdateScheduler.UPDATE_CONTENTS,
+          self._DELAY_PREVIEWS_PANE_DRAG_UPDATE_MILLISECONDS)
       else:
-        pg.invocation.timeout_remove_strict(self._image_preview.update)
+        self._update_scheduler.cancel(self._image_preview)
         self._image_preview.resize()
     
     self._paned_between_previews_previous_position = current_position
@@ -155,13 +391,28 @@ class PreviewsController(object):
     actions_.connect_event('before-remove-action', _on_before_remove_action)
   
   def _update_previews_on_setting_change(self, setting):
+    self._stop_prefetch()
+    
     self._name_preview.lock_update(False, self._ACTION_ERROR_KEY)
-    pg.invocation.timeout_add_strict(
-      self._DELAY_PREVIEWS_SETTING_UPDATE_MILLISECONDS, self._name_preview.update)
+    self._update_scheduler.request(
+      self._name_preview, PreviewUpdateScheduler.UPDATE_CONTENTS)
     
     self._image_preview.lock_update(False, self._ACTION_ERROR_KEY)
-    pg.invocation.timeout_add_strict(
-      self._DELAY_PREVIEWS_SETTING_UPDATE_MILLISECONDS, self._image_preview.update)
+    self._update_scheduler.request(
+      self._image_preview, PreviewUpdateScheduler.UPDATE_CONTENTS)
+  
+  def _update_names_in_name_preview(self):
+    # Failed updates may leave the name preview empty, in which case there are
+    # no existing items whose names could be updated.
+    if self._last_name_preview_update_successful:
+      self._name_preview.update(update_existing_contents_only=True)
+    else:
+      self._name_preview.update()
+  
+  def _reset_image_preview(self):
+    # The image may have been modified outside the dialog.
+    self._image_preview.invalidate_cache()
+    self._image_preview.update()
   
   def _connect_setting_after_reset_collapsed_items_in_name_preview(self):
     self._settings['gui/name_preview_layers_collapsed_state'].connect_event(
@@ -273,10 +524,16 @@ class PreviewsController(object):
       toplevel.connect('notify::is-active', self._on_toplevel_notify_is_active)
    
   def _on_name_preview_selection_changed(self, preview):
+    self._stop_prefetch()
+    
     self._update_selected_items()
     self._update_image_preview()
   
   def _on_name_preview_updated(self, preview, error):
+    self._stop_prefetch()
+    
+    self._last_name_preview_update_successful = error is None
+    
     if isinstance(error, exceptions.ActionError):
       self._name_preview.lock_update(True, self._ACTION_ERROR_KEY)
       self._image_preview.lock_update(True, self._ACTION_ERROR_KEY)
@@ -284,19 +541,73 @@ class PreviewsController(object):
     self._image_preview.update_item()
   
   def _on_name_preview_tags_changed(self, preview):
+    self._stop_prefetch()
+    
+    # Tags determine e.g. background layers, which are not part of the keys of
+    # cached images.
+    self._image_preview.invalidate_cache()
     self._update_image_preview()
   
   def _on_toplevel_notify_is_active(self, toplevel, property_spec):
+    self._stop_prefetch()
+    
     if toplevel.is_active():
-      pg.invocation.timeout_remove_strict(self._name_preview.update)
-      pg.invocation.timeout_remove_strict(self._image_preview.update)
+      self._update_scheduler.cancel(self._image_preview)
       
-      self._name_preview.update(reset_items=True)
+      self._update_scheduler.update_now(
+        self._name_preview, PreviewUpdateScheduler.UPDATE_RESET)
       
       if not self._is_initial_selection_set:
         self._set_initial_selection_and_update_image_preview()
       else:
-        self._image_preview.update()
+        self._update_scheduler.update_now(
+          self._image_preview, PreviewUpdateScheduler.UPDATE_RESET)
+  
+  def _on_image_preview_updated(self, preview, error, update_duration_seconds):
+    self._stop_prefetch()
+    
+    if error is None and self._should_prefetch(update_duration_seconds):
+      self._items_to_prefetch = [
+        item for item in self._name_preview.get_items_around_cursor() if item is not None]
+      self._remaining_prefetch_seconds = self._PREFETCH_TIME_BUDGET_SECONDS
+      
+      if self._items_to_prefetch:
+        pg.invocation.idle_add_strict(self._prefetch_next_item)
+  
+  def _should_prefetch(self, update_duration_seconds):
+    if not self._settings['gui/image_preview_automatic_update'].value:
+      return False
+    
+    # If rendering a single item takes too long, prefetching would only make the
+    # dialog less responsive.
+    if (self._settings['gui/image_preview_automatic_update_if_below_maximum_duration'].value
+        and update_duration_seconds >= self._PREFETCH_TIME_BUDGET_SECONDS):
+      return False
+    
+    return True
+  
+  def _prefetch_next_item(self):
+    while self._items_to_prefetch:
+      item = self._items_to_prefetch.pop(0)
+      
+      prefetch_duration_seconds = self._image_preview.prefetch(item)
+      if prefetch_duration_seconds is None:
+        continue
+      
+      self._remaining_prefetch_seconds -= prefetch_duration_seconds
+      if self._remaining_prefetch_seconds <= 0:
+        self._items_to_prefetch = []
+        return False
+      
+      # Let pending events (e.g. user input) be processed before rendering the
+      # next item.
+      return bool(self._items_to_prefetch)
+    
+    return False
+  
+  def _stop_prefetch(self):
+    pg.invocation.idle_remove_strict(self._prefetch_next_item)
+    self._items_to_prefetch = []
   
   def _enable_preview_on_paned_drag(
         self, preview, preview_sensitive_setting, update_lock_key):
@@ -79,6 +79,13 @@ def create_gui_settings():
       'default_value': True,
       'gui_type': None,
     },
+    {
+      'type': 'integer',
+      'name': 'image_preview_cache_size_megabytes',
+      'default_value': 64,
+      'min_value': 0,
+      'gui_type': None,
+    },
     {
       'type': 'images_and_gimp_items',
       'name': 'name_preview_layers_collapsed_state',
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""Manifest of exported files allowing to skip exporting images that have not
+changed since the previous export.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import hashlib
+import io
+import json
+import os
+
+from gimp import pdb
+
+from export_layers import pygimplib as pg
+
+from export_layers import actions
+
+
+MANIFEST_FILENAME = '.export_layers_manifest.json'
+
+_MANIFEST_VERSION = 1
+
+
+class ExportManifest(object):
+  """Class storing fingerprints of exported images and of procedures applied
+  to the images in a file located in the output directory.
+  
+  An exported image is considered unchanged if both fingerprints are the same
+  as those recorded during the previous export and the output file still
+  exists.
+  
+  Files are recorded by their path relative to the output directory. The path
+  of the file actually written is stored as well if it differs from the
+  recorded path, e.g. if the image was exported with the default file extension
+  instead of the file extension in the item name.
+  """
+  
+  def __init__(self, output_directory):
+    self._output_directory = os.path.abspath(output_directory if output_directory else '')
+    self._filepath = os.path.join(self._output_directory, MANIFEST_FILENAME)
+    
+    self._entries = self._read_entries()
+    self._updated_entries = {}
+  
+  @property
+  def filepath(self):
+    return self._filepath
+  
+  def is_unchanged(self, filepath, fingerprint, procedures_hash):
+    """Returns `True` if an image with the same `fingerprint` and
+    `procedures_hash` was exported for `filepath` and the exported file still
+    exists, `False` otherwise.
+    """
+    entry = self._entries.get(self._get_key(filepath))
+    
+    return (
+      entry is not None
+      and entry.get('fingerprint') == fingerprint
+      and entry.get('procedures') == procedures_hash
+      and os.path.isfile(self._get_output_filepath(filepath, entry)))
+  
+  def update(self, filepath, fingerprint, procedures_hash, output_filepath=None):
+    """Records the fingerprints for the file specified by `filepath`.
+    
+    If the image was written to a different file than `filepath`, pass the path
+    of the written file as `output_filepath`.
+    
+    The changes are written to the manifest file on `save()`.
+    """
+    key = self._get_key(filepath)
+    entry = {'fingerprint': fingerprint, 'procedures': procedures_hash}
+    
+    if output_filepath is not None and output_filepath != filepath:
+      entry['output'] = self._get_key(output_filepath)
+    
+    self._entries[key] = entry
+    self._updated_entries[key] = entry
+  
+  def save(self):
+    """Writes entries recorded by `update()` to the manifest file.
+    
+    Entries written to the file by others (e.g. another GIMP instance exporting
+    to the same directory) since the file was read are preserved.
+    
+    If the manifest file could not be written, `IOError` or `OSError` is
+    raised.
+    """
+    if not self._updated_entries:
+      return
+    
+    entries = self._read_entries()
+    entries.update(self._updated_entries)
+    
+    pg.path.make_dirs(self._output_directory)
+    
+    with io.open(self._filepath, 'w', encoding=pg.TEXT_FILE_ENCODING) as f:
+      # Workaround for Python 2 code to properly handle Unicode strings
+      f.write(unicode(json.dumps({'version': _MANIFEST_VERSION, 'files': entries})))
+    
+    self._updated_entries = {}
+  
+  def _get_key(self, filepath):
+    return os.path.relpath(filepath, self._output_directory).replace(os.sep, '/')
+  
+  def _get_output_filepath(self, filepath, entry):
+    if 'output' in entry:
+      return os.path.join(self._output_directory, *entry['output'].split('/'))
+    else:
+      return filepath
+  
+  def _read_entries(self):
+    try:
+      with io.open(self._filepath, 'r', encoding=pg.TEXT_FILE_ENCODING) as f:
+        data = json.load(f)
+    except (IOError, OSError, ValueError):
+      return {}
+    
+    if not isinstance(data, dict) or data.get('version') != _MANIFEST_VERSION:
+      return {}
+    
+    entries = data.get('files')
+    
+    return dict(entries) if isinstance(entries, dict) else {}
+
+
+def get_image_fingerprint(image):
+  """Returns a string identifying the contents of the specified image to be
+  exported.
+  
+  The fingerprint includes pixels and attributes of all layers in the image and
+  image attributes affecting the exported file.
+  """
+  fingerprint = hashlib.sha1()
+  
+  _update_hash(fingerprint, [
+    image.width,
+    image.height,
+    image.base_type,
+    pdb.gimp_image_get_resolution(image),
+    pdb.gimp_image_get_colormap(image)[1],
+  ])
+  
+  for layer in image.layers:
+    _update_hash(fingerprint, [
+      layer.width,
+      layer.height,
+      layer.offsets,
+      layer.bpp,
+      layer.opacity,
+      layer.mode,
+      layer.visible,
+    ])
+    
+    pixel_region = layer.get_pixel_rgn(0, 0, layer.width, layer.height, False, False)
+    fingerprint.update(pixel_region[0:layer.width, 0:layer.height])
+  
+  return fingerprint.hexdigest()
+
+
+def get_procedures_hash(procedures, *additional_values):
+  """Returns a string identifying enabled procedures in `procedures` and their
+  arguments.
+  
+  `additional_values` are any other values affecting the exported files (e.g.
+  arguments of the export procedure). The values must be serializable to JSON.
+  """
+  values = []
+  
+  for procedure in actions.walk(procedures):
+    if procedure['enabled'].value:
+      values.append([
+        procedure['orig_name'].value,
+        procedure['origin'].value,
+        procedure['function'].value,
+        [argument.to_dict()['value'] for argument in procedure['arguments']],
+      ])
+  
+  values.extend(additional_values)
+  
+  procedures_hash = hashlib.sha1()
+  _update_hash(procedures_hash, values)
+  
+  return procedures_hash.hexdigest()
+
+
+def _update_hash(hash_, values):
+  hash_.update(json.dumps(values, sort_keys=True).encode(pg.TEXT_FILE_ENCODING))
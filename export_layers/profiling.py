@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+
+"""Measuring time spent in actions during batch processing."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import collections
+import contextlib
+import csv
+import inspect
+import io
+import json
+import os
+import timeit
+
+from export_layers import pygimplib as pg
+
+
+_CSV_FIELD_NAMES = ['group', 'action', 'item', 'num_calls', 'total_time']
+
+
+class ActionProfile(object):
+  """Class recording wall-clock time and the number of calls of actions.
+  
+  Time is recorded per action, per item and per action group (e.g.
+  `'before_process_item'` or `'default_procedures'`). In addition, the total
+  time spent in each action group is recorded.
+  
+  Items are identified by their original names. Actions invoked outside
+  processing of a particular item (e.g. in `'before_process_items'`) have the
+  item name set to `None`.
+  """
+  
+  def __init__(self):
+    # key: (group, action name, item name); value: [number of calls, total time]
+    self._entries = collections.OrderedDict()
+    # key: group; value: [number of calls, total time]
+    self._group_entries = collections.OrderedDict()
+  
+  @property
+  def entries(self):
+    """List of `ProfileEntry` instances, one for each distinct combination of
+    action group, action and item, in the order of the first invocation.
+    """
+    return [
+      ProfileEntry(group, action_name, item_name, num_calls, total_time)
+      for (group, action_name, item_name), (num_calls, total_time) in self._entries.items()]
+  
+  @property
+  def group_entries(self):
+    """List of `ProfileEntry` instances holding the time spent in each action
+    group as a whole. The action and item name of each entry is `None`.
+    """
+    return [
+      ProfileEntry(group, None, None, num_calls, total_time)
+      for group, (num_calls, total_time) in self._group_entries.items()]
+  
+  def add(self, group, action_name, item_name, elapsed_time):
+    """Records a single invocation of the specified action taking
+    `elapsed_time` seconds.
+    """
+    _add_to_entry(self._entries, (group, action_name, item_name), elapsed_time)
+  
+  def add_group(self, group, elapsed_time):
+    """Records a single invocation of actions in `group` taking `elapsed_time`
+    seconds.
+    """
+    _add_to_entry(self._group_entries, group, elapsed_time)
+  
+  @contextlib.contextmanager
+  def measure(self, group, action_name, item_name):
+    """Records the time spent in the `with` block as a single invocation of the
+    specified action. The time is recorded even if an exception is raised.
+    """
+    start_time = timeit.default_timer()
+    try:
+      yield
+    finally:
+      self.add(group, action_name, item_name, timeit.default_timer() - start_time)
+  
+  @contextlib.contextmanager
+  def measure_group(self, group):
+    """Records the time spent in the `with` block as a single invocation of
+    actions in `group`.
+    """
+    start_time = timeit.default_timer()
+    try:
+      yield
+    finally:
+      self.add_group(group, timeit.default_timer() - start_time)
+  
+  def get_action_totals(self):
+    """Returns a dictionary of (action name, `ProfileEntry`) pairs, each entry
+    summing the number of calls and time of the action over all groups and
+    items.
+    """
+    totals = collections.OrderedDict()
+    
+    for (unused_, action_name, unused_), (num_calls, total_time) in self._entries.items():
+      if action_name not in totals:
+        totals[action_name] = ProfileEntry(None, action_name, None, 0, 0.0)
+      
+      totals[action_name] = totals[action_name]._replace(
+        num_calls=totals[action_name].num_calls + num_calls,
+        total_time=totals[action_name].total_time + total_time)
+    
+    return totals
+  
+  def get_slowest_actions(self, num_actions=None):
+    """Returns a list of `ProfileEntry` instances from `get_action_totals()`
+    sorted by the total time in descending order.
+    
+    If `num_actions` is not `None`, at most `num_actions` entries are returned.
+    """
+    slowest_actions = sorted(
+      self.get_action_totals().values(), key=lambda entry: entry.total_time, reverse=True)
+    
+    if num_actions is not None:
+      return slowest_actions[:num_actions]
+    else:
+      return slowest_actions
+  
+  def clear(self):
+    self._entries.clear()
+    self._group_entries.clear()
+  
+  def to_dict(self):
+    return {
+      'actions': [entry._asdict() for entry in self.entries],
+      'groups': [
+        {'group': entry.group, 'num_calls': entry.num_calls, 'total_time': entry.total_time}
+        for entry in self.group_entries],
+    }
+  
+  def save(self, filepath):
+    """Saves the recorded data to the specified file.
+    
+    If the file extension is `'csv'`, the data are saved as CSV, with group
+    totals stored as rows having empty action and item names. Otherwise, the
+    data are saved as JSON.
+    """
+    pg.path.make_dirs(os.path.dirname(os.path.abspath(filepath)))
+    
+    if pg.path.get_file_extension(filepath).lower() == 'csv':
+      self._save_csv(filepath)
+    else:
+      self._save_json(filepath)
+  
+  def _save_json(self, filepath):
+    with io.open(filepath, 'w', encoding=pg.TEXT_FILE_ENCODING) as f:
+      # Workaround for Python 2 code to properly handle Unicode strings
+      f.write(unicode(json.dumps(self.to_dict(), indent=2)))
+  
+  def _save_csv(self, filepath):
+    # The `csv` module in Python 2 does not support Unicode, hence the file is
+    # opened in binary mode and rows are encoded manually.
+    with io.open(filepath, 'wb') as f:
+      writer = csv.writer(f)
+      writer.writerow([_encode_csv_value(name) for name in _CSV_FIELD_NAMES])
+      
+      for entry in self.entries + self.group_entries:
+        writer.writerow([_encode_csv_value(value) for value in entry])
+
+
+class ProfileEntry(
+    collections.namedtuple(
+      'ProfileEntry', ['group', 'action_name', 'item_name', 'num_calls', 'total_time'])):
+  
+  __slots__ = ()
+  
+  @property
+  def average_time(self):
+    return self.total_time / self.num_calls if self.num_calls else 0.0
+
+
+def get_profiled_function(function, profile, get_group, action_name, get_item_name):
+  """Returns a function wrapping `function` and recording each call to
+  `profile`.
+  
+  `get_group` and `get_item_name` are functions without arguments returning the
+  current action group and item name, respectively, at the time of the call.
+  
+  If `function` returns a generator, each step of the generator is recorded as
+  a separate call.
+  """
+  
+  def _profiled_function(*args, **kwargs):
+    group, item_name = get_group(), get_item_name()
+    start_time = timeit.default_timer()
+    result = None
+    
+    try:
+      result = function(*args, **kwargs)
+    finally:
+      # Creating a generator is not counted as a call since the generator body
+      # is not executed until the first step.
+      if not inspect.isgenerator(result):
+        profile.add(group, action_name, item_name, timeit.default_timer() - start_time)
+    
+    if inspect.isgenerator(result):
+      return _get_profiled_generator(result, profile, get_group, action_name, get_item_name)
+    else:
+      return result
+  
+  return _profiled_function
+
+
+def _get_profiled_generator(generator, profile, get_group, action_name, get_item_name):
+  with profile.measure(get_group(), action_name, get_item_name()):
+    value = next(generator)
+  
+  while True:
+    sent_value = yield value
+    
+    with profile.measure(get_group(), action_name, get_item_name()):
+      value = generator.send(sent_value)
+
+
+def get_function_tracking_action(function, action_name, action_names):
+  """Returns a function wrapping `function` and appending `action_name` to the
+  `action_names` list for the duration of each call.
+  
+  The last element of `action_names` is thus the name of the innermost action
+  currently being applied. If `function` returns a generator, `action_name` is
+  appended for the duration of each step of the generator.
+  
+  If `function` is a generator function, the returned function is a generator
+  function as well, so that objects distinguishing generator functions from
+  regular functions (e.g. `pygimplib.invoker.Invoker`) treat both the same.
+  """
+  
+  if inspect.isgeneratorfunction(function):
+    def _generator_function_tracking_action(*args, **kwargs):
+      generator = function(*args, **kwargs)
+      
+      with _track_action(action_name, action_names):
+        value = next(generator)
+      
+      while True:
+        sent_value = yield value
+        
+        with _track_action(action_name, action_names):
+          value = generator.send(sent_value)
+    
+    return _generator_function_tracking_action
+  
+  def _function_tracking_action(*args, **kwargs):
+    with _track_action(action_name, action_names):
+      result = function(*args, **kwargs)
+    
+    if inspect.isgenerator(result):
+      return _get_generator_tracking_action(result, action_name, action_names)
+    else:
+      return result
+  
+  return _function_tracking_action
+
+
+def _get_generator_tracking_action(generator, action_name, action_names):
+  with _track_action(action_name, action_names):
+    value = next(generator)
+  
+  while True:
+    sent_value = yield value
+    
+    with _track_action(action_name, action_names):
+      value = generator.send(sent_value)
+
+
+@contextlib.contextmanager
+def _track_action(action_name, action_names):
+  action_names.append(action_name)
+  try:
+    yield
+  finally:
+    action_names.pop()
+
+
+def _add_to_entry(entries, key, elapsed_time):
+  if key not in entries:
+    entries[key] = [0, 0.0]
+  
+  entries[key][0] += 1
+  entries[key][1] += elapsed_time
+
+
+def _encode_csv_value(value):
+  if value is None:
+    return b''
+  elif isinstance(value, float):
+    return repr(value).encode('ascii')
+  else:
+    return str(value).encode(pg.TEXT_FILE_ENCODING)
@@ -12,6 +12,7 @@ import gobject
 
 
 _timer_ids = {}
+_idle_ids = {}
 
 
 def timeout_add(interval, callback, *callback_args):
@@ -61,3 +62,40 @@ def timeout_remove_strict(callback):
   if callback in _timer_ids:
     gobject.source_remove(_timer_ids[callback])
     del _timer_ids[callback]
+
+
+def idle_add_strict(callback, *callback_args, **callback_kwargs):
+  """
+  This is a wrapper for `gobject.idle_add()`, which calls the specified callback
+  whenever there are no higher priority events pending. The callback is called
+  repeatedly as long as it returns `True`.
+  
+  If the same callback is added again before it finishes, the previous
+  invocation will be canceled, similar to `timeout_add_strict()`.
+  
+  This function also supports keyword arguments to the callback.
+  """
+  global _idle_ids
+  
+  def _callback_wrapper(callback_args, callback_kwargs):
+    retval = callback(*callback_args, **callback_kwargs)
+    if not retval and callback in _idle_ids:
+      del _idle_ids[callback]
+    
+    return retval
+  
+  idle_remove_strict(callback)
+  
+  _idle_ids[callback] = gobject.idle_add(_callback_wrapper, callback_args, callback_kwargs)
+  
+  return _idle_ids[callback]
+
+
+def idle_remove_strict(callback):
+  """
+  Remove a callback scheduled by `idle_add_strict()`. If no such callback
+  exists, do nothing.
+  """
+  if callback in _idle_ids:
+    gobject.source_remove(_idle_ids[callback])
+    del _idle_ids[callback]
@@ -8,6 +8,7 @@ from future.builtins import *
 import collections
 import inspect
 import itertools
+import types
 
 
 class Invoker(object):
@@ -46,6 +47,10 @@ class Invoker(object):
     
     # key: action ID; value: `_ActionItem` instance
     self._action_items = {}
+    
+    # key: (action group, `additional_args_position` from `invoke()`)
+    # value: `_DispatchPlan` instance
+    self._dispatch_plans = {}
   
   def add(
         self,
@@ -214,99 +219,36 @@ class Invoker(object):
     `additional_args`. `additional_args_position` also applies to nested
     `Invoker` instances.
     """
-    
-    def _invoke_action(item, group):
-      action, action_args, action_kwargs = item.action
-      args = _get_args(action_args)
-      kwargs = dict(action_kwargs, **additional_kwargs)
-      
-      result = action(*args, **kwargs)
-      
-      if inspect.isgenerator(result):
-        item.is_generator = True
-      
-      if not (item.is_generator and item.run_generator):
-        return result
-      else:
-        if group not in item.generators_per_group:
-          item.generators_per_group[group] = result
-          return next(item.generators_per_group[group])
-        else:
-          try:
-            return item.generators_per_group[group].send([args, kwargs])
-          except StopIteration:
-            item.should_be_removed_from_group = True
-    
-    def _prepare_foreach_action(action, action_args, action_kwargs):
-      args = _get_args(action_args)
-      kwargs = dict(action_kwargs, **additional_kwargs)
-      return action(*args, **kwargs)
-    
-    def _get_args(action_args):
-      if additional_args_position is None:
-        return tuple(action_args) + tuple(additional_args)
-      else:
-        args = list(action_args)
-        args[additional_args_position:additional_args_position] = additional_args
-        return tuple(args)
-    
-    def _invoke_action_with_foreach_actions(item, group):
-      action_generators = [
-        _prepare_foreach_action(*foreach_item.action)
-        for foreach_item in self._foreach_actions[group]]
-      
-      _invoke_foreach_actions_once(action_generators)
-      
-      while action_generators:
-        result_from_action = _invoke_action(item, group)
-        _invoke_foreach_actions_once(action_generators, result_from_action)
-        
-        if item.should_be_removed_from_group:
-          self.remove(item.action_id, [group])
-          item.should_be_removed_from_group = False
-          return
-    
-    def _invoke_foreach_actions_once(action_generators, result_from_action=None):
-      action_generators_to_remove = []
-      
-      for action_generator in action_generators:
-        try:
-          action_generator.send(result_from_action)
-        except StopIteration:
-          action_generators_to_remove.append(action_generator)
-      
-      for action_generator_to_remove in action_generators_to_remove:
-        action_generators.remove(action_generator_to_remove)
-    
-    def _invoke_invoker(invoker, group):
-      invoker.invoke([group], additional_args, additional_kwargs, additional_args_position)
-    
-    additional_args = additional_args if additional_args is not None else ()
+    additional_args = tuple(additional_args) if additional_args is not None else ()
     additional_kwargs = additional_kwargs if additional_kwargs is not None else {}
     
     for group in self._process_groups_arg(groups):
       if group not in self._actions:
         self._init_group(group)
       
-      # An action could be removed during invocation, hence create a list and
-      # later check for validity.
-      items = list(self._actions[group])
-      
-      for item in items:
-        if item not in self._actions[group]:
+      # An action could be removed during invocation, hence the action is checked
+      # for validity before being invoked. Likewise, for-each actions could be
+      # added or removed, hence they are obtained for each action separately.
+      for step in self._get_dispatch_plan(group, additional_args_position).steps:
+        item = step.item
+        
+        if group not in item.groups:
           continue
         
         if item.action_type != self._TYPE_INVOKER:
-          if self._foreach_actions[group]:
-            _invoke_action_with_foreach_actions(item, group)
+          foreach_steps = self._get_dispatch_plan(group, additional_args_position).foreach_steps
+          
+          if foreach_steps:
+            self._invoke_action_with_foreach_actions(
+              step, group, foreach_steps, additional_args, additional_kwargs)
           else:
-            _invoke_action(item, group)
+            self._invoke_action(step, group, additional_args, additional_kwargs)
             
             if item.should_be_removed_from_group:
               self.remove(item.action_id, [group])
               item.should_be_removed_from_group = False
         else:
-          _invoke_invoker(item.action, group)
+          item.action.invoke([group], additional_args, additional_kwargs, additional_args_position)
   
   def add_to_groups(self, action_id, groups=None, position=None):
     """
@@ -486,6 +428,8 @@ class Invoker(object):
       position = max(len(action_lists[group]) + position + 1, 0)
     
     action_lists[group].insert(position, action_item)
+    
+    self._invalidate_dispatch_plans()
   
   def remove(self, action_id, groups=None, ignore_if_not_exists=False):
     """
@@ -545,11 +489,117 @@ class Invoker(object):
       
       del self._actions[group]
       del self._foreach_actions[group]
+    
+    self._invalidate_dispatch_plans()
+  
+  def _invoke_action(self, step, group, additional_args, additional_kwargs):
+    item = step.item
+    args = step.args_before + additional_args + step.args_after
+    kwargs = dict(step.kwargs, **additional_kwargs) if additional_kwargs else step.kwargs
+    
+    result = item.action[0](*args, **kwargs)
+    
+    if not item.run_generator:
+      return result
+    
+    if not item.is_generator:
+      if not isinstance(result, types.GeneratorType):
+        return result
+      
+      item.is_generator = True
+    
+    if group not in item.generators_per_group:
+      item.generators_per_group[group] = result
+      return next(item.generators_per_group[group])
+    else:
+      try:
+        return item.generators_per_group[group].send([args, dict(kwargs)])
+      except StopIteration:
+        item.should_be_removed_from_group = True
+  
+  def _invoke_action_with_foreach_actions(
+        self, step, group, foreach_steps, additional_args, additional_kwargs):
+    item = step.item
+    
+    action_generators = [
+      self._prepare_foreach_action(foreach_step, additional_args, additional_kwargs)
+      for foreach_step in foreach_steps]
+    
+    self._invoke_foreach_actions_once(action_generators)
+    
+    while action_generators:
+      result_from_action = self._invoke_action(step, group, additional_args, additional_kwargs)
+      self._invoke_foreach_actions_once(action_generators, result_from_action)
+      
+      if item.should_be_removed_from_group:
+        self.remove(item.action_id, [group])
+        item.should_be_removed_from_group = False
+        return
+  
+  @staticmethod
+  def _prepare_foreach_action(foreach_step, additional_args, additional_kwargs):
+    args = foreach_step.args_before + additional_args + foreach_step.args_after
+    kwargs = dict(foreach_step.kwargs, **additional_kwargs)
+    return foreach_step.item.action[0](*args, **kwargs)
+  
+  @staticmethod
+  def _invoke_foreach_actions_once(action_generators, result_from_action=None):
+    action_generators_to_remove = []
+    
+    for action_generator in action_generators:
+      try:
+        action_generator.send(result_from_action)
+      except StopIteration:
+        action_generators_to_remove.append(action_generator)
+    
+    for action_generator_to_remove in action_generators_to_remove:
+      action_generators.remove(action_generator_to_remove)
+  
+  def _get_dispatch_plan(self, group, additional_args_position):
+    """Returns actions and for-each actions in `group` along with their
+    arguments prepared for `additional_args_position`.
+    
+    The plan is created on first use and reused until actions are added,
+    removed or reordered.
+    """
+    key = (group, additional_args_position)
+    
+    if key not in self._dispatch_plans:
+      self._dispatch_plans[key] = _DispatchPlan(
+        tuple(
+          self._get_dispatch_step(item, additional_args_position)
+          for item in self._actions[group]),
+        tuple(
+          self._get_dispatch_step(item, additional_args_position)
+          for item in self._foreach_actions[group]))
+    
+    return self._dispatch_plans[key]
+  
+  def _get_dispatch_step(self, item, additional_args_position):
+    if item.action_type == self._TYPE_INVOKER:
+      return _DispatchStep(item, (), (), {})
+    
+    unused_, action_args, action_kwargs = item.action
+    action_args = tuple(action_args)
+    
+    if additional_args_position is None:
+      return _DispatchStep(item, action_args, (), action_kwargs)
+    else:
+      return _DispatchStep(
+        item,
+        action_args[:additional_args_position],
+        action_args[additional_args_position:],
+        action_kwargs)
+  
+  def _invalidate_dispatch_plans(self):
+    self._dispatch_plans.clear()
   
   def _init_group(self, group):
     if group not in self._actions:
       self._actions[group] = []
       self._foreach_actions[group] = []
+      
+      self._invalidate_dispatch_plans()
   
   def _add_action_to_group(self, action_item, group, position):
     if action_item.action_type == self._TYPE_ACTION:
@@ -591,6 +641,8 @@ class Invoker(object):
       self._actions[group].insert(position, action_item)
     
     self._action_functions[group][action] += 1
+    
+    self._invalidate_dispatch_plans()
   
   def _add_foreach_action(
         self,
@@ -628,6 +680,8 @@ class Invoker(object):
       self._foreach_actions[group].insert(position, action_item)
     
     self._foreach_action_functions[group][foreach_action] += 1
+    
+    self._invalidate_dispatch_plans()
   
   def _add_invoker(self, action_id, invoker, group, position):
     self._init_group(group)
@@ -641,6 +695,8 @@ class Invoker(object):
       self._actions[group].insert(position, action_item)
     
     self._invokers[group][invoker] += 1
+    
+    self._invalidate_dispatch_plans()
   
   def _get_action_id(self):
     return self._action_id_counter.next()
@@ -670,6 +726,8 @@ class Invoker(object):
       del action_functions[group][action_item.action_function]
     
     self._remove_action_item(action_id, group)
+    
+    self._invalidate_dispatch_plans()
   
   def _remove_action_item(self, action_id, group):
     self._action_items[action_id].groups.remove(group)
@@ -734,3 +792,9 @@ class _ActionItem(object):
     self.is_generator = False
     self.generators_per_group = {}
     self.should_be_removed_from_group = False
+
+
+_DispatchPlan = collections.namedtuple('_DispatchPlan', ['steps', 'foreach_steps'])
+
+_DispatchStep = collections.namedtuple(
+  '_DispatchStep', ['item', 'args_before', 'args_after', 'kwargs'])
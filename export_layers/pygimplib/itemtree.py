@@ -7,6 +7,7 @@ from future.builtins import *
 import future.utils
 
 import abc
+import bisect
 import collections
 
 try:
@@ -53,8 +54,21 @@ class ItemTree(future.utils.with_metaclass(abc.ABCMeta, object)):
   
   `ItemTree` is a static data structure, i.e. it does not account for
   modifications, additions or removal of GIMP items by GIMP procedures outside
-  this class. To refresh the contents of the tree, create a new `ItemTree`
-  instance instead.
+  this class. This also applies to the number of children of item groups, which
+  determines whether an item group is empty. To refresh the contents of the
+  tree, call `refresh()`.
+  
+  Sequences of items obtained by `__len__()`, `prev()` and `next()` and item
+  counts obtained by `get_num_items_per_parent()` are computed once and reused
+  until rules are added to or removed from `filter`, `filter` is replaced or
+  `is_filtered` is changed. If the result of the filter for an item changes
+  otherwise (e.g. if a rule depends on item attributes that were modified),
+  call `invalidate_cache()`.
+  
+  The tree keeps track of items whose attributes were modified. This allows
+  resetting all items via `reset_all()` and saving and restoring the state of
+  all items via `snapshot()` and `restore()` in time proportional to the number
+  of modified items rather than the size of the tree.
   
   Attributes:
   
@@ -96,6 +110,26 @@ class ItemTree(future.utils.with_metaclass(abc.ABCMeta, object)):
     # value: `Item` instance
     self._itemtree_names = {}
     
+    # key: `Item.raw.ID` of an item group
+    # value: number of immediate children of the item group
+    self._num_children = {}
+    
+    # key: `Item` instance
+    # value: position of the item in `self._itemtree`
+    self._item_positions = {}
+    
+    # key: (`with_folders`, `with_empty_groups`, `filtered`) arguments
+    # value: `_ItemSequence` instance
+    self._item_sequences = {}
+    self._item_sequences_filter_state = None
+    
+    # key: `is_filtered` attribute
+    # value: dict of (`Item.parent`, number of items yielded by `__iter__()`
+    #  having the same parent) pairs
+    self._num_items_per_parent = {}
+    
+    self._item_state_tracker = _ItemStateTracker()
+    
     self._build_tree()
   
   @property
@@ -138,7 +172,7 @@ class ItemTree(future.utils.with_metaclass(abc.ABCMeta, object)):
     The returned number of items depends on whether `is_filtered` is `True` or
     `False`.
     """
-    return len([item for item in self])
+    return len(self._get_item_sequence(False, False, True).items)
   
   def __iter__(self):
     """Iterates over items, excluding folders and empty item groups.
@@ -172,22 +206,27 @@ class ItemTree(future.utils.with_metaclass(abc.ABCMeta, object)):
     * `item` - The current `Item` object.
     """
     for item in self._itemtree.values():
-      should_yield_item = True
-      
-      if not with_folders and item.type == TYPE_FOLDER:
-        should_yield_item = False
-      
-      if (not with_empty_groups
-          and (item.type == TYPE_GROUP and not pdb.gimp_item_get_children(item.raw)[1])):
-        should_yield_item = False
-      
-      if should_yield_item:
-        if (filtered and self.is_filtered) and not self.filter.is_match(item):
-          should_yield_item = False
-      
-      if should_yield_item:
+      if self.is_included(item, with_folders, with_empty_groups, filtered):
         yield item
   
+  def is_included(self, item, with_folders=True, with_empty_groups=False, filtered=True):
+    """Returns `True` if `item` would be yielded by `iter()` called with the
+    same parameters, `False` otherwise.
+    
+    Unlike `iter()`, this method does not evaluate the filter for other items in
+    the tree.
+    """
+    if not with_folders and item.type == TYPE_FOLDER:
+      return False
+    
+    if not with_empty_groups and self._is_empty_group(item):
+      return False
+    
+    if (filtered and self.is_filtered) and not self.filter.is_match(item):
+      return False
+    
+    return True
+  
   def iter_all(self):
     """Iterates over all items.
     
@@ -207,7 +246,13 @@ class ItemTree(future.utils.with_metaclass(abc.ABCMeta, object)):
     Depending on the values of parameters, some items may be skipped. For the
     description of the parameters, see `iter()`.
     """
-    return self._prev_next(item, with_folders, with_empty_groups, filtered, 'prev')
+    item_sequence = self._get_item_sequence(with_folders, with_empty_groups, filtered)
+    
+    index = item_sequence.indexes.get(item)
+    if index is None:
+      index = bisect.bisect_left(item_sequence.positions, self._item_positions[item])
+    
+    return item_sequence.items[index - 1] if index > 0 else None
   
   def next(self, item, with_folders=True, with_empty_groups=False, filtered=True):
     """Returns the next item in the tree.
@@ -215,97 +260,287 @@ class ItemTree(future.utils.with_metaclass(abc.ABCMeta, object)):
     Depending on the values of parameters, some items may be skipped. For the
     description of the parameters, see `iter()`.
     """
-    return self._prev_next(item, with_folders, with_empty_groups, filtered, 'next')
+    item_sequence = self._get_item_sequence(with_folders, with_empty_groups, filtered)
+    
+    index = item_sequence.indexes.get(item)
+    if index is None:
+      index = bisect.bisect_right(item_sequence.positions, self._item_positions[item])
+    else:
+      index += 1
+    
+    return item_sequence.items[index] if index < len(item_sequence.items) else None
   
-  def _prev_next(self, item, with_folders, with_empty_groups, filtered, adjacent_attr_name):
-    adjacent_item = item
+  def get_num_items_per_parent(self):
+    """Returns a dictionary of `(parent, number of items)` pairs.
     
-    while True:
-      adjacent_item = getattr(adjacent_item, adjacent_attr_name)
-      
-      if adjacent_item is None:
-        break
+    `parent` is an `Item` instance or `None` for top-level items. Only items
+    yielded by `__iter__()` are counted, i.e. filtered items excluding folders
+    and empty item groups. Parents without counted items are not present in the
+    dictionary.
+    
+    Items are grouped by their current `parent` attribute at the time of the
+    first call. The dictionary is cached until the filter is modified or
+    `invalidate_cache()` or `refresh()` is called.
+    """
+    self._update_filter_state()
+    
+    if self.is_filtered not in self._num_items_per_parent:
+      num_items_per_parent = {}
+      for item in self._get_item_sequence(False, False, True).items:
+        parent = item.parent
+        num_items_per_parent[parent] = num_items_per_parent.get(parent, 0) + 1
       
-      if with_folders:
-        if adjacent_item.type == TYPE_FOLDER:
-          break
-      else:
-        if adjacent_item.type == TYPE_FOLDER:
-          continue
+      self._num_items_per_parent[self.is_filtered] = num_items_per_parent
+    
+    return self._num_items_per_parent[self.is_filtered]
+  
+  def reset_all(self):
+    """Resets attributes of all items in the tree to their original values (see
+    `Item.reset()`).
+    
+    Only items modified since their creation or the last call to this method
+    are reset. Tags are not reset.
+    """
+    # `Item.reset()` adds the item to `modified_items` again, hence the copy.
+    for item in list(self._item_state_tracker.modified_items):
+      item.reset()
+    
+    self._item_state_tracker.modified_items = set()
+  
+  def snapshot(self):
+    """Saves the state of all items in the tree and returns a version number
+    identifying the snapshot.
+    
+    The state of an item is only saved once the item is modified after the
+    snapshot was taken. Taking and restoring a snapshot thus does not depend on
+    the size of the tree.
+    
+    Tags are saved as well, provided that they are modified via
+    `Item.add_tag()` and `Item.remove_tag()` rather than directly.
+    
+    Snapshots must be restored in the reverse order they were taken in, similar
+    to `Item.push_state()` and `Item.pop_state()`.
+    """
+    self._item_state_tracker.version += 1
+    self._item_state_tracker.snapshots.append((self._item_state_tracker.version, {}))
+    
+    return self._item_state_tracker.version
+  
+  def restore(self, version):
+    """Restores the state of all items saved by the `snapshot()` call that
+    returned `version`.
+    
+    Snapshots taken after the specified snapshot are discarded. If no snapshot
+    matches `version` (e.g. if it was already restored), raise `ValueError`.
+    """
+    snapshots = self._item_state_tracker.snapshots
+    
+    if not any(snapshot_version == version for snapshot_version, unused_ in snapshots):
+      raise ValueError('snapshot with version {} does not exist'.format(version))
+    
+    while True:
+      snapshot_version, item_states = snapshots.pop()
       
-      if with_empty_groups:
-        if (adjacent_item.type == TYPE_GROUP
-            and not pdb.gimp_item_get_children(adjacent_item.raw)[1]):
-          break
-      else:
-        if (adjacent_item.type == TYPE_GROUP
-            and not pdb.gimp_item_get_children(adjacent_item.raw)[1]):
-          continue
+      for item, state in item_states.items():
+        # We break the convention here and access private methods from `Item`.
+        item._set_state(state)
+        if item._is_modified():
+          self._item_state_tracker.modified_items.add(item)
       
-      if filtered and self.is_filtered:
-        if self.filter.is_match(adjacent_item):
-          break
-      else:
+      if snapshot_version == version:
         break
-    
-    return adjacent_item
   
   def reset_filter(self):
     """Resets the filter, creating a new empty `ObjectFilter`."""
     self.filter = pgobjectfilter.ObjectFilter(self._filter_match_type)
   
-  def _build_tree(self):
-    child_items = []
-    for raw_item in self._get_children_from_image(self._image):
-      if self._is_group(raw_item):
-        child_items.append(Item(raw_item, TYPE_FOLDER, [], [], None, None, self._name))
-        child_items.append(Item(raw_item, TYPE_GROUP, [], [], None, None, self._name))
-      else:
-        child_items.append(Item(raw_item, TYPE_ITEM, [], [], None, None, self._name))
+  def refresh(self):
+    """Updates the tree to match the current state of the image.
+    
+    Items added to or removed from the image, renamed, moved to a different
+    parent or reordered within their parent are reflected in the tree. `Item`
+    instances are preserved for GIMP items still present in the image,
+    including their tags and states saved by `Item.push_state()` and
+    `snapshot()`. Attributes of `Item` instances
+    modified since their creation (e.g. `name`) are preserved unless the
+    corresponding GIMP item was renamed or moved.
+    
+    Returns an `ItemTreeChanges` instance describing the changes made to the
+    tree. Item groups that changed are listed both as folders and as items.
+    """
+    old_items = list(self._itemtree.values())
+    old_orig_names = {item: item.orig_name for item in old_items}
+    old_parents = {item: _get_orig_parent(item) for item in old_items}
+    
+    existing_items = dict(self._itemtree)
+    
+    self._itemtree.clear()
+    self._itemtree_names.clear()
+    self._num_children.clear()
+    self._item_positions.clear()
+    self.invalidate_cache()
+    
+    self._build_tree(existing_items)
+    
+    new_items = list(self._itemtree.values())
+    new_parents = {item: _get_orig_parent(item) for item in new_items}
+    
+    added_items = [item for item in new_items if item not in old_parents]
+    removed_items = [item for item in old_items if item not in new_parents]
+    
+    self._item_state_tracker.modified_items.difference_update(removed_items)
+    renamed_items = [
+      item for item in new_items
+      if item in old_orig_names and item.orig_name != old_orig_names[item]]
+    reparented_items = [
+      item for item in new_items
+      if item in old_parents and new_parents[item] is not old_parents[item]]
+    
+    reparented_items_set = set(reparented_items)
+    old_sibling_indexes = _get_sibling_indexes(
+      [item for item in old_items
+       if item in new_parents and item not in reparented_items_set],
+      old_parents)
+    new_sibling_indexes = _get_sibling_indexes(
+      [item for item in new_items
+       if item in old_parents and item not in reparented_items_set],
+      new_parents)
+    reordered_items = [
+      item for item in new_items
+      if item in new_sibling_indexes and new_sibling_indexes[item] != old_sibling_indexes[item]]
+    
+    return ItemTreeChanges(
+      added_items, removed_items, renamed_items, reparented_items, reordered_items)
+  
+  def invalidate_cache(self):
+    """Discards sequences of items cached by `__len__()`, `prev()` and
+    `next()` and item counts cached by `get_num_items_per_parent()`.
+    """
+    self._item_sequences = {}
+    self._item_sequences_filter_state = None
+    self._num_items_per_parent = {}
+  
+  def _is_empty_group(self, item):
+    return item.type == TYPE_GROUP and not self._num_children[item.raw.ID]
+  
+  def _get_item_sequence(self, with_folders, with_empty_groups, filtered):
+    filtered = filtered and self.is_filtered
+    
+    self._update_filter_state()
+    
+    key = (with_folders, with_empty_groups, filtered)
+    
+    if key not in self._item_sequences:
+      items = tuple(self.iter(with_folders, with_empty_groups, filtered))
+      self._item_sequences[key] = _ItemSequence(
+        items,
+        {item: index for index, item in enumerate(items)},
+        tuple(self._item_positions[item] for item in items))
+    
+    return self._item_sequences[key]
+  
+  def _update_filter_state(self):
+    filter_state = (id(self.filter), self.filter.version)
+    if filter_state != self._item_sequences_filter_state:
+      self._item_sequences = {}
+      self._item_sequences_filter_state = filter_state
+      self._num_items_per_parent = {}
+  
+  def _build_tree(self, existing_items=None):
+    """Fills the tree with items of the image.
+    
+    `existing_items` is a dictionary of `self._itemtree`-like entries whose
+    `Item` instances are reused for GIMP items still present in the image.
+    """
+    if existing_items is None:
+      existing_items = {}
+    
+    # Items are processed depth-first via a stack whose top is at the end of the
+    # list, which keeps the construction linear in the number of items.
+    items_to_process = self._create_child_items(
+      self._get_children_from_image(self._image), [], existing_items)
+    items_to_process.reverse()
     
-    item_tree = child_items
-    item_list = []
+    prev_item = None
     
-    while item_tree:
-      item = item_tree.pop(0)
-      item_list.append(item)
+    while items_to_process:
+      item = items_to_process.pop()
       
       if item.type == TYPE_FOLDER:
         self._itemtree[(item.raw.ID, FOLDER_KEY)] = item
         self._itemtree_names[(item.orig_name, FOLDER_KEY)] = item
         
-        parents_for_child = list(item.parents)
+        # We break the convention here and access a private attribute from `Item`.
+        parents_for_child = list(item._orig_parents)
         parents_for_child.append(item)
         
-        child_items = []
-        for raw_item in self._get_children_from_raw_item(item.raw):
-          if self._is_group(raw_item):
-            child_items.append(
-              Item(raw_item, TYPE_FOLDER, parents_for_child, [], None, None, self._name))
-            child_items.append(
-              Item(raw_item, TYPE_GROUP, parents_for_child, [], None, None, self._name))
-          else:
-            child_items.append(
-              Item(raw_item, TYPE_ITEM, parents_for_child, [], None, None, self._name))
+        raw_child_items = self._get_children_from_raw_item(item.raw)
+        self._num_children[item.raw.ID] = len(raw_child_items)
+        
+        child_items = self._create_child_items(
+          raw_child_items, parents_for_child, existing_items)
         
         # We break the convention here and access a private attribute from `Item`.
-        item._orig_children = child_items
-        item.children = child_items
+        if item._orig_children != child_items:
+          item._orig_children = child_items
+          item._children = child_items
         
-        for child_item in reversed(child_items):
-          item_tree.insert(0, child_item)
+        items_to_process.extend(reversed(child_items))
       else:
         self._itemtree[item.raw.ID] = item
         self._itemtree_names[item.orig_name] = item
-    
-    for i in range(1, len(item_list) - 1):
+      
+      self._item_positions[item] = len(self._item_positions)
+      
       # We break the convention here and access private attributes from `Item`.
-      item_list[i]._prev_item = item_list[i - 1]
-      item_list[i]._next_item = item_list[i + 1]
+      item._prev_item = prev_item
+      if prev_item is not None:
+        prev_item._next_item = item
+      
+      prev_item = item
+    
+    if prev_item is not None:
+      prev_item._next_item = None
+  
+  def _create_child_items(self, raw_items, parents, existing_items):
+    child_items = []
+    
+    for raw_item in raw_items:
+      if self._is_group(raw_item):
+        child_items.append(self._get_item(raw_item, TYPE_FOLDER, parents, existing_items))
+        child_items.append(self._get_item(raw_item, TYPE_GROUP, parents, existing_items))
+      else:
+        child_items.append(self._get_item(raw_item, TYPE_ITEM, parents, existing_items))
+    
+    return child_items
+  
+  def _get_item(self, raw_item, item_type, parents, existing_items):
+    if item_type == TYPE_FOLDER:
+      item = existing_items.get((raw_item.ID, FOLDER_KEY))
+    else:
+      item = existing_items.get(raw_item.ID)
+    
+    if item is None or item.type != item_type:
+      item = Item(raw_item, item_type, parents, [], None, None, self._name)
+      # We break the convention here and access a private attribute from `Item`.
+      item._state_tracker = self._item_state_tracker
+      return item
+    
+    # We break the convention here and access private attributes from `Item`.
+    item._raw_item = raw_item
     
-    if len(item_list) > 1:
-      item_list[0]._next_item = item_list[1]
-      item_list[-1]._prev_item = item_list[-2]
+    # Updating original attributes is not a modification tracked by
+    # `_ItemStateTracker`, hence the attributes are set directly.
+    name = pgutils.safe_decode_gimp(raw_item.name)
+    if name != item.orig_name:
+      item._orig_name = name
+      item._name = name
+    
+    if item._orig_parents != parents:
+      item._orig_parents = parents
+      item._parents = parents
+    
+    return item
   
   @abc.abstractmethod
   def _get_children_from_image(self, image):
@@ -326,6 +561,72 @@ class ItemTree(future.utils.with_metaclass(abc.ABCMeta, object)):
     return pdb.gimp_item_is_group(raw_item)
 
 
+_ItemSequence = collections.namedtuple('_ItemSequence', ['items', 'indexes', 'positions'])
+
+
+class _ItemStateTracker(object):
+  """Class recording modifications of `Item` instances belonging to the same
+  `ItemTree`.
+  """
+  
+  __slots__ = ('modified_items', 'snapshots', 'version')
+  
+  def __init__(self):
+    # Items modified since their creation or the last `ItemTree.reset_all()`.
+    self.modified_items = set()
+    
+    # List of (version, dict of (`Item`, state) pairs) tuples. Each dictionary
+    # holds states of items before their first modification after the snapshot
+    # was taken.
+    self.snapshots = []
+    
+    self.version = 0
+  
+  def add_modified_item(self, item):
+    self.modified_items.add(item)
+    
+    if self.snapshots:
+      item_states = self.snapshots[-1][1]
+      if item not in item_states:
+        # We break the convention here and access a private method from `Item`.
+        item_states[item] = item._get_state()
+
+
+ItemTreeChanges = collections.namedtuple(
+  'ItemTreeChanges', ['added', 'removed', 'renamed', 'reparented', 'reordered'])
+"""Lists of `Item` instances changed by `ItemTree.refresh()`.
+
+* `added` - Items of GIMP items new in the image.
+
+* `removed` - Items of GIMP items no longer present in the image.
+
+* `renamed` - Items whose GIMP items were renamed.
+
+* `reparented` - Items whose GIMP items were moved to a different parent. Items
+  moved along with their parent are not included.
+
+* `reordered` - Items whose position among their siblings changed, excluding
+  the effects of adding, removing or moving other items to a different parent.
+"""
+
+
+def _get_orig_parent(item):
+  # We break the convention here and access a private attribute from `Item`.
+  return item._orig_parents[-1] if item._orig_parents else None
+
+
+def _get_sibling_indexes(items, parents):
+  sibling_indexes = {}
+  num_siblings = {}
+  
+  for item in items:
+    parent = parents[item]
+    sibling_indexes[item] = num_siblings.get(parent, 0)
+    num_siblings[parent] = sibling_indexes[item] + 1
+  
+  return sibling_indexes
+
+
 class LayerTree(ItemTree):
   
   def _get_children_from_image(self, image):
@@ -392,7 +693,8 @@ class Item(object):
     a variety of purposes, such as special handling of items with specific tags.
     Tags are stored persistently in the `gimp.Item` object (`item` attribute) as
     parasites. The name of the parasite source is given by the
-    `tags_source_name` attribute.
+    `tags_source_name` attribute. Tags are loaded from the `gimp.Item` object
+    on first access.
   
   * `orig_name` (read-only) - Original `gimp.Item.name` as a string. This
     attribute may be used to access `Item`s in `ItemTree`.
@@ -401,13 +703,35 @@ class Item(object):
   
   * `orig_children` (read-only) - Initial `children` of this item.
   
-  * `orig_tags` (read-only) - Initial `tags` of this item.
+  * `orig_tags` (read-only) - `tags` of this item as loaded on first access.
   
   * `tags_source_name` - Name of the persistent source for the `tags` attribute.
     Defaults to `'tags'` if `None`. If `type` is `FOLDER`, `'_folder'` is
     appended to `tags_source_name`.
   """
   
+  # Images may contain tens of thousands of items, hence `__slots__` to avoid
+  # a per-instance dictionary.
+  __slots__ = (
+    '_raw_item',
+    '_type',
+    '_parents',
+    '_children',
+    '_prev_item',
+    '_next_item',
+    '_name',
+    '_tags_source_name',
+    '_tags',
+    '_orig_name',
+    '_orig_parents',
+    '_orig_children',
+    '_orig_tags',
+    '_saved_states',
+    '_state_tracker',
+  )
+  
+  _item_attributes = ('name', '_parents', '_children', '_tags')
+  
   def __init__(
         self, raw_item, item_type, parents=None, children=None, prev_item=None, next_item=None,
         tags_source_name=None):
@@ -421,21 +745,23 @@ class Item(object):
     self._prev_item = prev_item
     self._next_item = next_item
     
-    self.name = pgutils.safe_decode_gimp(raw_item.name)
+    self._name = pgutils.safe_decode_gimp(raw_item.name)
     
     self._tags_source_name = _get_effective_tags_source_name(
       tags_source_name if tags_source_name else 'tags', self._type)
     
-    self._tags = self._load_tags()
+    # Tags are loaded on first access as most items never need them.
+    self._tags = None
     
-    self._orig_name = self.name
+    self._orig_name = self._name
     self._orig_parents = self._parents
     self._orig_children = self._children
-    self._orig_tags = set(self._tags)
+    self._orig_tags = None
     
-    self._item_attributes = ['name', '_parents', '_children', '_tags']
+    self._saved_states = None
     
-    self._saved_states = []
+    # `_ItemStateTracker` instance of the `ItemTree` this item belongs to, if any.
+    self._state_tracker = None
   
   @property
   def raw(self):
@@ -445,12 +771,22 @@ class Item(object):
   def type(self):
     return self._type
   
+  @property
+  def name(self):
+    return self._name
+  
+  @name.setter
+  def name(self, name):
+    self._before_modify()
+    self._name = name
+  
   @property
   def parents(self):
     return self._parents
   
   @parents.setter
   def parents(self, parents):
+    self._before_modify()
     self._parents = parents
   
   @property
@@ -459,6 +795,7 @@ class Item(object):
   
   @children.setter
   def children(self, children):
+    self._before_modify()
     self._children = children
   
   @property
@@ -479,6 +816,9 @@ class Item(object):
   
   @property
   def tags(self):
+    if self._tags is None:
+      self._init_tags()
+    
     return self._tags
   
   @property
@@ -499,6 +839,9 @@ class Item(object):
   
   @property
   def orig_tags(self):
+    if self._orig_tags is None:
+      self._init_tags()
+    
     return iter(self._orig_tags)
   
   def __str__(self):
@@ -513,6 +856,9 @@ class Item(object):
     
     To restore the last saved values, call `pop_state()`.
     """
+    if self._saved_states is None:
+      self._saved_states = []
+    
     self._saved_states.append({
       attr_name: getattr(self, attr_name) for attr_name in self._item_attributes})
   
@@ -523,23 +869,32 @@ class Item(object):
     Calling `pop_state()` without any saved state (e.g. when `push_state()` has
     never been called before) does nothing.
     """
-    try:
-      saved_states = self._saved_states.pop()
-    except IndexError:
+    if not self._saved_states:
       return
     
+    self._before_modify()
+    
+    saved_states = self._saved_states.pop()
+    
     for attr_name, attr_value in saved_states.items():
       setattr(self, attr_name, attr_value)
+    
+    if self._tags is None and self._orig_tags is not None:
+      # Tags were not loaded when the state was saved and thus could not have
+      # been modified at that point.
+      self._tags = set(self._orig_tags)
   
   def reset(self, tags=False):
     """Resets the item's attributes to the values upon its instantiation.
     
     Is `tags` is `True`, also reset tags.
     """
-    self.name = self._orig_name
+    self._before_modify()
+    
+    self._name = self._orig_name
     self._parents = list(self._orig_parents)
     self._children = list(self._orig_children)
-    if tags:
+    if tags and self._orig_tags is not None:
       self._tags = set(self._orig_tags)
   
   def add_tag(self, tag):
@@ -548,9 +903,10 @@ class Item(object):
     If the tag already exists, do nothing. The tag is saved to the item
     persistently.
     """
-    if tag in self._tags:
+    if tag in self.tags:
       return
     
+    self._before_modify()
     self._tags.add(tag)
     
     self._save_tags()
@@ -560,19 +916,48 @@ class Item(object):
     
     If the tag does not exist, raise `ValueError`.
     """
-    if tag not in self._tags:
+    if tag not in self.tags:
       raise ValueError('tag "{}" not found in {}'.format(tag, self))
     
+    self._before_modify()
     self._tags.remove(tag)
     
     self._save_tags()
   
+  def _before_modify(self):
+    if self._state_tracker is not None:
+      self._state_tracker.add_modified_item(self)
+  
+  def _get_state(self):
+    return (
+      self._name,
+      self._parents,
+      self._children,
+      set(self._tags) if self._tags is not None else None)
+  
+  def _is_modified(self):
+    return (
+      self._name != self._orig_name
+      or self._parents != self._orig_parents
+      or self._children != self._orig_children)
+  
+  def _set_state(self, state):
+    self._name, self._parents, self._children, tags = state
+    
+    if tags is not None:
+      self._tags = tags
+    elif self._orig_tags is not None:
+      # Tags were not loaded when the state was saved and thus could not have
+      # been modified at that point.
+      self._tags = set(self._orig_tags)
+  
   def _save_tags(self):
     """Saves tags persistently to the item."""
     set_tags_for_raw_item(self._raw_item, self._tags, self._tags_source_name)
   
-  def _load_tags(self):
-    return get_tags_from_raw_item(self._raw_item, self._tags_source_name)
+  def _init_tags(self):
+    self._tags = get_tags_from_raw_item(self._raw_item, self._tags_source_name)
+    self._orig_tags = set(self._tags)
 
 
 def get_tags_from_raw_item(raw_item, source_name, item_type=None):
@@ -8,6 +8,7 @@ from future.builtins import *
 import collections
 import contextlib
 import itertools
+import timeit
 
 
 class ObjectFilter(object):
@@ -28,21 +29,52 @@ class ObjectFilter(object):
     and can be used to manipulate multiple rules (functions or nested filters)
     with the same name at once (e.g. by removing them with `remove()`).
   
+  * `version` (read-only) - Integer that changes each time rules are added to or
+    removed from this filter or any nested filter. This can be used to
+    invalidate results of `is_match()` cached by clients.
+  
+  * `record_stats` - If `True`, `is_match()` records the time spent in each
+    rule and the number of objects matched by each rule. See `stats()`.
+  
+  * `reorder_rules` - If `True`, `is_match()` periodically reorders rules based
+    on the recorded statistics so that cheap rules that are likely to determine
+    the result are evaluated first. This implies `record_stats`. Enable this
+    only if the rules are independent of each other and have no side effects,
+    since the order in which rules are evaluated is no longer the order in
+    which they were added. The order of rules as returned by `list_rules()` is
+    not affected.
+  
   A rule can be a callable (function) or a nested `ObjectFilter` instance (with
   its own rules and different matching type if needed).
   """
   
   _MATCH_TYPES = MATCH_ALL, MATCH_ANY = (0, 1)
   
+  _NUM_EVALUATIONS_BETWEEN_REORDERS = 100
+  
   _rule_id_counter = itertools.count(start=1)
+  _version_counter = itertools.count(start=1)
   
-  def __init__(self, match_type=MATCH_ALL, name=''):
+  def __init__(self, match_type=MATCH_ALL, name='', record_stats=False, reorder_rules=False):
     self._match_type = match_type
     self._name = name
+    self.record_stats = record_stats
+    self.reorder_rules = reorder_rules
     
     # Key: rule/nested filter ID
     # Value: `_Rule` or `ObjectFilter` instance
     self._rules = collections.OrderedDict()
+    
+    # Key: rule/nested filter ID
+    # Value: [number of calls, number of matches, total time]
+    self._rule_stats = {}
+    
+    # List of (rule/nested filter ID, `_Rule` or `ObjectFilter` instance) pairs
+    # in the order of evaluation if `reorder_rules` is `True`
+    self._rules_in_evaluation_order = None
+    self._num_evaluations_until_reorder = 0
+    
+    self._version = self._version_counter.next()
   
   @property
   def match_type(self):
@@ -52,6 +84,14 @@ class ObjectFilter(object):
   def name(self):
     return self._name
   
+  @property
+  def version(self):
+    # Versions are obtained from a counter shared by all filters, hence the
+    # maximum changes whenever this or any nested filter is modified.
+    return max(
+      [self._version]
+      + [value.version for value in self._rules.values() if isinstance(value, ObjectFilter)])
+  
   def __bool__(self):
     """Returns `True` if the filter is not empty, `False` otherwise."""
     return bool(self._rules)
@@ -123,6 +163,7 @@ class ObjectFilter(object):
     
     if isinstance(func_or_filter, ObjectFilter):
       self._rules[rule_id] = func_or_filter
+      self._update_version()
       
       return rule_id
     elif callable(func_or_filter):
@@ -134,6 +175,7 @@ class ObjectFilter(object):
         self._get_rule_name_for_func(func, name),
         rule_id)
       self._rules[rule_id] = rule
+      self._update_version()
       
       return rule
     else:
@@ -183,6 +225,9 @@ class ObjectFilter(object):
     
     matching_rules = [self._rules.pop(id_) for id_ in matching_ids]
     
+    if matching_rules:
+      self._update_version()
+    
     return matching_rules, matching_ids
   
   @contextlib.contextmanager
@@ -233,6 +278,9 @@ class ObjectFilter(object):
     finally:
       for rule_id, rule in zip(matching_ids, matching_rules):
         self._rules[rule_id] = rule
+      
+      if matching_rules:
+        self._update_version()
   
   def is_match(self, obj):
     """Returns `True` if the specified object matches the rules, `False`
@@ -251,6 +299,9 @@ class ObjectFilter(object):
     if not self._rules:
       return True
     
+    if self.record_stats or self.reorder_rules:
+      return self._is_match_with_stats(obj)
+    
     if self._match_type == self.MATCH_ALL:
       return self._is_match_all(obj)
     elif self._match_type == self.MATCH_ANY:
@@ -284,6 +335,84 @@ class ObjectFilter(object):
     
     return is_match
   
+  def _is_match_with_stats(self, obj):
+    # A single rule determines the result if it does not match in `MATCH_ALL`
+    # or if it matches in `MATCH_ANY`.
+    deciding_result = self._match_type != self.MATCH_ALL
+    
+    for rule_id, value in self._get_rules_in_evaluation_order():
+      start_time = timeit.default_timer()
+      
+      if isinstance(value, ObjectFilter):
+        result = bool(value.is_match(obj))
+      else:
+        result = bool(value.function(obj, *value.args, **value.kwargs))
+      
+      rule_stats = self._rule_stats.setdefault(rule_id, [0, 0, 0.0])
+      rule_stats[0] += 1
+      rule_stats[1] += result
+      rule_stats[2] += timeit.default_timer() - start_time
+      
+      if result == deciding_result:
+        return deciding_result
+    
+    return not deciding_result
+  
+  def _get_rules_in_evaluation_order(self):
+    if not self.reorder_rules:
+      return self._rules.items()
+    
+    if self._rules_in_evaluation_order is None or self._num_evaluations_until_reorder <= 0:
+      self._rules_in_evaluation_order = sorted(
+        self._rules.items(), key=lambda item: self._get_rule_rank(item[0]))
+      self._num_evaluations_until_reorder = self._NUM_EVALUATIONS_BETWEEN_REORDERS
+    
+    self._num_evaluations_until_reorder -= 1
+    
+    return self._rules_in_evaluation_order
+  
+  def _get_rule_rank(self, rule_id):
+    """Returns the average time spent in the rule per object for which the
+    rule decides the result. Rules with lower ranks are evaluated first.
+    
+    Rules without statistics are evaluated first so that their statistics can be
+    recorded.
+    """
+    num_calls, num_matches, total_time = self._rule_stats.get(rule_id, [0, 0, 0.0])
+    
+    if num_calls == 0:
+      return 0.0
+    
+    if self._match_type == self.MATCH_ALL:
+      num_deciding_results = num_calls - num_matches
+    else:
+      num_deciding_results = num_matches
+    
+    if num_deciding_results == 0:
+      return float('inf')
+    
+    return total_time / num_deciding_results
+  
+  def stats(self):
+    """Returns a list of `RuleStats` instances for rules in this filter, sorted
+    by the total time spent in the rule in descending order.
+    
+    Statistics are only recorded if `record_stats` or `reorder_rules` is `True`.
+    Time spent in nested filters includes the time spent in their rules. To
+    obtain statistics for rules within a nested filter, call `stats()` on the
+    nested filter.
+    """
+    rule_stats = [
+      RuleStats(rule_id, rule_or_filter.name, *self._rule_stats.get(rule_id, [0, 0, 0.0]))
+      for rule_id, rule_or_filter in self._rules.items()]
+    
+    return sorted(rule_stats, key=lambda stats: stats.total_time, reverse=True)
+  
+  def reset_stats(self):
+    """Discards statistics recorded for all rules in this filter."""
+    self._rule_stats.clear()
+    self._rules_in_evaluation_order = None
+  
   def find(self, name=None, func_or_filter=None, count=0):
     """Finds rule IDs matching the specified name or object (callable or nested
     filter).
@@ -347,6 +476,30 @@ class ObjectFilter(object):
   def reset(self):
     """Resets the filter, removing all rules. The match type is preserved."""
     self._rules.clear()
+    self._update_version()
+  
+  def _update_version(self):
+    self._version = self._version_counter.next()
+    self._rules_in_evaluation_order = None
 
 
 _Rule = collections.namedtuple('_Rule', ['function', 'args', 'kwargs', 'name', 'id'])
+
+
+class RuleStats(
+    collections.namedtuple(
+      'RuleStats', ['rule_id', 'name', 'num_calls', 'num_matches', 'total_time'])):
+  """Statistics of a single rule in `ObjectFilter` as returned by
+  `ObjectFilter.stats()`.
+  """
+  
+  __slots__ = ()
+  
+  @property
+  def average_time(self):
+    return self.total_time / self.num_calls if self.num_calls else 0.0
+  
+  @property
+  def rejection_rate(self):
+    """Fraction of calls in which the rule did not match the object."""
+    return (self.num_calls - self.num_matches) / self.num_calls if self.num_calls else 0.0
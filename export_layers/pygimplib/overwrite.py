@@ -126,7 +126,7 @@ class InteractiveOverwriteChooser(
     pass
 
 
-def handle_overwrite(filepath, overwrite_chooser, position=None):
+def handle_overwrite(filepath, overwrite_chooser, position=None, dir_snapshot=None):
   """
   If a file with the specified file path exists, handle the file path conflict
   via `overwrite_chooser` (an `OverwriteChooser` instance).
@@ -141,6 +141,10 @@ def handle_overwrite(filepath, overwrite_chooser, position=None):
   insert a unique substring (`' (number)'`). By default, the substring is
   inserted at the end of the file path to be renamed.
   
+  If `dir_snapshot` (a `pygimplib.path.DirectorySnapshot` instance) is not
+  `None`, the existence of files is determined from `dir_snapshot` and renaming
+  the existing file is recorded in `dir_snapshot`.
+  
   Returns:
   
     * the overwrite mode as returned by `overwrite_chooser`, which the caller
@@ -149,16 +153,24 @@ def handle_overwrite(filepath, overwrite_chooser, position=None):
     * the file path passed as the argument, modified if `RENAME_NEW` mode is
       returned.
   """
-  if os.path.exists(filepath):
+  if dir_snapshot is not None:
+    file_exists = dir_snapshot.exists(filepath)
+  else:
+    file_exists = os.path.exists(filepath)
+  
+  if file_exists:
     overwrite_chooser.choose(filepath=os.path.abspath(filepath))
     
     if overwrite_chooser.overwrite_mode in (
          OverwriteModes.RENAME_NEW, OverwriteModes.RENAME_EXISTING):
-      uniq_filepath = pgpath.uniquify_filepath(filepath, position)
+      uniq_filepath = pgpath.uniquify_filepath(filepath, position, dir_snapshot=dir_snapshot)
       if overwrite_chooser.overwrite_mode == OverwriteModes.RENAME_NEW:
         filepath = uniq_filepath
       else:
-        os.rename(filepath, uniq_filepath)
+        if dir_snapshot is not None:
+          dir_snapshot.rename(filepath, uniq_filepath)
+        else:
+          os.rename(filepath, uniq_filepath)
   
     return overwrite_chooser.overwrite_mode, filepath
   else:
@@ -5,6 +5,7 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 from future.builtins import *
 
+from .dirsnapshot import *
 from .fileext import *
 from .pattern import *
 from .uniquify import *
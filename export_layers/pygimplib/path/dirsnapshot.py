@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""Class caching directory listings to answer file existence queries without
+accessing the file system for each query.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import os
+
+from .. import _path_dirs
+
+__all__ = [
+  'DirectorySnapshot',
+]
+
+
+class DirectorySnapshot(object):
+  """Class answering whether files exist based on a one-time listing of each
+  directory.
+  
+  The contents of a directory are listed on the first query for a file inside
+  that directory. Subsequent queries for the same directory are answered from
+  memory. Changes made to the file system by this process should be recorded
+  via `add()`, `rename()` and `make_dirs()`. Changes made by other processes
+  after a directory was listed are not reflected.
+  
+  This is useful when the file system access is slow (e.g. network drives) and
+  many files are written to the same directories.
+  """
+  
+  def __init__(self):
+    # key: normalized directory path
+    # value: set of normalized names of files and subdirectories
+    self._dir_contents = {}
+    
+    # Normalized paths of directories passed to `make_dirs()` and their parent
+    # directories.
+    self._existing_dirpaths = set()
+  
+  def exists(self, path):
+    """Returns `True` if a file or directory at `path` exists, `False`
+    otherwise.
+    """
+    dirpath, name = self._split_path(path)
+    
+    if not name:
+      return os.path.exists(path)
+    
+    return name in self._get_dir_contents(dirpath)
+  
+  def add(self, path):
+    """Records that a file or directory at `path` was created."""
+    dirpath, name = self._split_path(path)
+    
+    if name and dirpath in self._dir_contents:
+      self._dir_contents[dirpath].add(name)
+  
+  def remove(self, path):
+    """Records that a file or directory at `path` was removed."""
+    dirpath, name = self._split_path(path)
+    
+    if name and dirpath in self._dir_contents:
+      self._dir_contents[dirpath].discard(name)
+  
+  def rename(self, src_path, dest_path):
+    """Renames `src_path` to `dest_path` via `os.rename()` and records the
+    change.
+    """
+    os.rename(src_path, dest_path)
+    
+    self.remove(src_path)
+    self.add(dest_path)
+  
+  def make_dirs(self, dirpath):
+    """Recursively creates directories from the specified directory path via
+    `make_dirs()` from the `path` package, unless the directory path was
+    already passed to this method.
+    
+    `OSError` is raised if the directories could not be created.
+    """
+    normalized_dirpath = self._normalize(dirpath)
+    
+    if normalized_dirpath in self._existing_dirpaths:
+      return
+    
+    _path_dirs.make_dirs(dirpath)
+    
+    self._existing_dirpaths.add(normalized_dirpath)
+    
+    path = normalized_dirpath
+    while True:
+      parent_dirpath, name = os.path.split(path)
+      if not name:
+        break
+      
+      if parent_dirpath in self._dir_contents:
+        self._dir_contents[parent_dirpath].add(name)
+      
+      if parent_dirpath in self._existing_dirpaths:
+        break
+      
+      self._existing_dirpaths.add(parent_dirpath)
+      path = parent_dirpath
+  
+  def clear(self):
+    """Discards all directory listings and directories recorded by
+    `make_dirs()`.
+    """
+    self._dir_contents = {}
+    self._existing_dirpaths = set()
+  
+  def _get_dir_contents(self, normalized_dirpath):
+    if normalized_dirpath not in self._dir_contents:
+      try:
+        names = os.listdir(normalized_dirpath)
+      except OSError:
+        names = []
+      
+      self._dir_contents[normalized_dirpath] = set(os.path.normcase(name) for name in names)
+    
+    return self._dir_contents[normalized_dirpath]
+  
+  def _split_path(self, path):
+    return os.path.split(self._normalize(path))
+  
+  @staticmethod
+  def _normalize(path):
+    return os.path.normcase(os.path.abspath(path))
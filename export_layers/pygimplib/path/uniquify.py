@@ -38,7 +38,7 @@ def uniquify_string(str_, existing_strings, position=None, generator=None):
     generator)
   
 
-def uniquify_filepath(filepath, position=None, generator=None):
+def uniquify_filepath(filepath, position=None, generator=None, dir_snapshot=None):
   """
   If a file at the specified path already exists, return a unique file path.
   
@@ -50,10 +50,18 @@ def uniquify_filepath(filepath, position=None, generator=None):
     more information.
   
   * `generator` - See the `generator` parameter in `uniquify_string_generic()`.
+  
+  * `dir_snapshot` - `DirectorySnapshot` instance. If not `None`, the existence
+    of files is determined from `dir_snapshot` rather than the file system.
   """
+  if dir_snapshot is not None:
+    exists_func = dir_snapshot.exists
+  else:
+    exists_func = os.path.exists
+  
   return uniquify_string_generic(
     filepath,
-    lambda filepath_param: not os.path.exists(filepath_param),
+    lambda filepath_param: not exists_func(filepath_param),
     position,
     generator)
 
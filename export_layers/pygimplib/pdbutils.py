@@ -7,8 +7,11 @@ defined in the GIMP procedural database (PDB) or the GIMP Python API.
 from __future__ import absolute_import, division, print_function, unicode_literals
 from future.builtins import *
 
+import bisect
+import collections
 import os
 import contextlib
+import timeit
 
 import gimp
 from gimp import pdb
@@ -291,6 +294,172 @@ def try_delete_image(image):
     pdb.gimp_image_delete(image)
 
 
+_ScratchImageSourceState = collections.namedtuple(
+  '_ScratchImageSourceState',
+  ['dirty', 'width', 'height', 'base_type', 'filename', 'parasite_names'])
+
+_ScratchImageState = collections.namedtuple(
+  '_ScratchImageState',
+  ['base_type', 'precision', 'resolution', 'unit', 'parasite_names'])
+
+
+class ScratchImagePool(object):
+  """Pool of scratch images, i.e. images without items and with metadata
+  copied from a source image, reused across multiple batch runs.
+  
+  Creating an image via `create_image_from_metadata()` takes many PDB calls,
+  particularly if the source image has many parasites or large metadata.
+  `acquire()` returns an image previously returned to the pool via `release()`
+  if the source image did not change since the image was created. Otherwise, a
+  new image is created.
+  
+  A source image is considered changed if its dirty state, dimensions, base
+  type, file name or the list of its parasites changed. Other changes (e.g. a
+  changed resolution of an image that already contains unsaved changes) are
+  not detected. Call `discard()` in such cases.
+  
+  On `release()`, all items, guides, sample points and the selection are removed
+  from the image and the image is resized to the dimensions of the source image. Images whose base
+  type, precision, resolution, unit or parasites were modified while acquired
+  are deleted instead of being reused.
+  
+  Images in the pool remain open in GIMP until deleted. Call `clear()` once the
+  pool is no longer needed.
+  """
+  
+  def __init__(self, max_images_per_source=4, pdb_=None):
+    self._max_images_per_source = max_images_per_source
+    self._pdb = pdb_ if pdb_ is not None else pdb
+    
+    # key: `gimp.Image.ID` of an acquired image
+    # value: (source image ID, `_ScratchImageSourceState`, `_ScratchImageState`)
+    self._acquired_images = {}
+    
+    # key: source image ID
+    # value: list of (`gimp.Image`, `_ScratchImageSourceState`, `_ScratchImageState`)
+    self._released_images = collections.defaultdict(list)
+  
+  def acquire(self, src_image):
+    """Returns an image without items and with metadata copied from
+    `src_image`.
+    
+    The image is taken from the pool if possible, otherwise the image is created
+    via `create_image_from_metadata()`. Return the image via `release()` once it
+    is no longer needed.
+    """
+    src_state = self._get_source_state(src_image)
+    
+    released_images = self._released_images[src_image.ID]
+    
+    for index, (image, image_src_state, image_state) in enumerate(released_images):
+      if image_src_state == src_state:
+        del released_images[index]
+        break
+    else:
+      # Images created from an outdated source image cannot be reused.
+      self.discard(src_image)
+      
+      image = create_image_from_metadata(src_image)
+      image_state = self._get_image_state(image)
+    
+    self._acquired_images[image.ID] = (src_image.ID, src_state, image_state)
+    
+    return image
+  
+  def release(self, image):
+    """Returns `image` obtained from `acquire()` to the pool.
+    
+    If `image` was not obtained from `acquire()`, `image` is deleted.
+    """
+    if not self._pdb.gimp_image_is_valid(image):
+      self._acquired_images.pop(image.ID, None)
+      return
+    
+    src_image_id, src_state, image_state = self._acquired_images.pop(image.ID, (None, None, None))
+    
+    if (src_image_id is None
+        or len(self._released_images[src_image_id]) >= self._max_images_per_source
+        or self._get_image_state(image) != image_state):
+      self._pdb.gimp_image_delete(image)
+      return
+    
+    self._reset_image(image, src_state)
+    
+    self._released_images[src_image_id].append((image, src_state, image_state))
+  
+  def discard(self, src_image=None):
+    """Deletes pooled images created from `src_image`, or all pooled images if
+    `src_image` is `None`.
+    
+    Acquired images are not affected.
+    """
+    if src_image is None:
+      src_image_ids = list(self._released_images)
+    else:
+      src_image_ids = [src_image.ID]
+    
+    for src_image_id in src_image_ids:
+      for image, unused_, unused_ in self._released_images.pop(src_image_id, []):
+        if self._pdb.gimp_image_is_valid(image):
+          self._pdb.gimp_image_delete(image)
+  
+  def clear(self):
+    """Deletes all pooled images."""
+    self.discard()
+  
+  def _get_source_state(self, src_image):
+    unused_, parasite_names = self._pdb.gimp_image_get_parasite_list(src_image)
+    
+    return _ScratchImageSourceState(
+      self._pdb.gimp_image_is_dirty(src_image),
+      src_image.width,
+      src_image.height,
+      src_image.base_type,
+      src_image.filename,
+      tuple(parasite_names))
+  
+  def _get_image_state(self, image):
+    unused_, parasite_names = self._pdb.gimp_image_get_parasite_list(image)
+    
+    if gimp.version >= (2, 10):
+      precision = self._pdb.gimp_image_get_precision(image)
+    else:
+      precision = None
+    
+    return _ScratchImageState(
+      image.base_type,
+      precision,
+      tuple(self._pdb.gimp_image_get_resolution(image)),
+      self._pdb.gimp_image_get_unit(image),
+      tuple(parasite_names))
+  
+  def _reset_image(self, image, src_state):
+    for layer in image.layers:
+      self._pdb.gimp_image_remove_layer(image, layer)
+    
+    for channel in image.channels:
+      self._pdb.gimp_image_remove_channel(image, channel)
+    
+    for path in image.vectors:
+      self._pdb.gimp_image_remove_vectors(image, path)
+    
+    guide = self._pdb.gimp_image_find_next_guide(image, 0)
+    while guide:
+      self._pdb.gimp_image_delete_guide(image, guide)
+      guide = self._pdb.gimp_image_find_next_guide(image, 0)
+    
+    if gimp.version >= (2, 10):
+      sample_point = self._pdb.gimp_image_find_next_sample_point(image, 0)
+      while sample_point:
+        self._pdb.gimp_image_delete_sample_point(image, sample_point)
+        sample_point = self._pdb.gimp_image_find_next_sample_point(image, 0)
+    
+    self._pdb.gimp_selection_none(image)
+    
+    if image.width != src_state.width or image.height != src_state.height:
+      self._pdb.gimp_image_resize(image, src_state.width, src_state.height, 0, 0)
+
+
 #===============================================================================
 
 
@@ -576,6 +745,114 @@ def merge_layer_group(layer_group):
   return merged_layer_group
 
 
+class LayerStager(object):
+  """Class copying layers into an image and removing them from the image with
+  as few PDB calls as possible.
+  
+  Each PDB call in GIMP 2 is a round-trip between the plug-in and GIMP.
+  Compared to `copy_and_paste_layer()` and removing layers one by one, this
+  class saves PDB calls by:
+  * determining whether a layer is a group from its type rather than via
+    `gimp-item-is-group`,
+  * keeping track of the number of top-level layers in the image so that the
+    insertion position need not be queried for each layer,
+  * merging a layer group copied into an empty image directly rather than via
+    `merge_layer_group()`, which hides and restores other layers.
+  
+  The number of top-level layers is updated by `stage()` and `clear()`. If
+  layers are inserted or removed in the image other than via this object, call
+  `invalidate()` so that the number of layers is queried again when needed.
+  """
+  
+  def __init__(self, image, pdb_=None, num_layers=None):
+    """Creates a layer stager for `image`.
+    
+    `pdb_` is the GIMP procedural database to call procedures from (e.g. a
+    `CachedPdb` instance). If `None`, `gimp.pdb` is used.
+    
+    `num_layers` is the number of top-level layers in `image`, e.g. 0 for a
+    newly created image. If `None`, the number is queried on the first
+    `stage()`.
+    """
+    self._image = image
+    self._pdb = pdb_ if pdb_ is not None else pdb
+    self._num_layers = num_layers
+  
+  @property
+  def image(self):
+    return self._image
+  
+  def stage(
+        self, layer, parent=None, position=None, remove_lock_attributes=True,
+        set_visible=True, merge_group=True):
+    """Copies `layer` into the image, inserts the copy into `parent` at
+    `position` and returns the copy.
+    
+    If `parent` is `None`, the copy is inserted in the main stack (outside of
+    any layer group). If `position` is `None`, the copy is inserted at the end
+    of `parent` or the main stack.
+    
+    `remove_lock_attributes`, `set_visible` and `merge_group` have the same
+    meaning as in `copy_and_paste_layer()`.
+    """
+    if position is None:
+      if parent is None:
+        position = self._get_num_layers()
+      else:
+        position = len(parent.children)
+    
+    is_image_empty = parent is None and self._num_layers == 0
+    is_group = isinstance(layer, gimp.GroupLayer)
+    
+    layer_copy = self._pdb.gimp_layer_new_from_drawable(layer, self._image)
+    self._pdb.gimp_image_insert_layer(self._image, layer_copy, parent, position)
+    
+    if parent is None and self._num_layers is not None:
+      self._num_layers += 1
+    
+    if remove_lock_attributes:
+      self._pdb.gimp_item_set_lock_content(layer_copy, False)
+      if not is_group:
+        if gimp.version >= (2, 10):
+          self._pdb.gimp_item_set_lock_position(layer_copy, False)
+        self._pdb.gimp_layer_set_lock_alpha(layer_copy, False)
+    
+    if set_visible:
+      self._pdb.gimp_item_set_visible(layer_copy, True)
+    
+    if merge_group and is_group:
+      if is_image_empty and set_visible:
+        # The copy is the only layer in the image and is visible, hence there
+        # are no other layers to hide before merging.
+        layer_copy = self._pdb.gimp_image_merge_visible_layers(
+          self._image, gimpenums.EXPAND_AS_NECESSARY)
+      else:
+        layer_copy = merge_layer_group(layer_copy)
+    
+    return layer_copy
+  
+  def clear(self):
+    """Removes all layers from the image.
+    
+    Only top-level layers are removed explicitly as removing a layer group
+    removes its children as well.
+    """
+    for layer in self._image.layers:
+      self._pdb.gimp_image_remove_layer(self._image, layer)
+    
+    self._num_layers = 0
+  
+  def invalidate(self):
+    """Discards the number of top-level layers in the image."""
+    self._num_layers = None
+  
+  def _get_num_layers(self):
+    if self._num_layers is None:
+      self._num_layers = len(self._image.layers)
+    
+    return self._num_layers
+
+
 #===============================================================================
 
 
@@ -705,3 +982,394 @@ def is_pdb_procedure(function):
     hasattr(function, 'proc_name')
     and hasattr(function, 'params')
     and callable(function))
+
+
+#===============================================================================
+
+
+PdbQueryStats = collections.namedtuple('PdbQueryStats', ['hits', 'misses'])
+
+
+class CachedPdb(object):
+  """Wrapper of the GIMP procedural database (PDB) memoizing the results of
+  read-only queries on items.
+  
+  Procedures are obtained the same way as from `gimp.pdb`, i.e. as attributes
+  or via `[]`. Results of procedures in `QUERY_PROCEDURE_NAMES` are cached per
+  procedure and item. Calling any other procedure through this object discards
+  cached results for items passed as arguments. If a layer group or an image
+  without any item is passed, all cached results are discarded as the procedure
+  may modify other items.
+  
+  Modifications made outside this object (e.g. calling `gimp.pdb` directly,
+  setting item attributes or procedures modifying items other than those
+  passed) are not tracked. Call `invalidate()` in such cases.
+  
+  The number of cache hits and misses is recorded for each query procedure and
+  available via `stats()`.
+  """
+  
+  QUERY_PROCEDURE_NAMES = frozenset([
+    'gimp-item-is-valid',
+    'gimp-item-is-group',
+    'gimp-item-get-visible',
+    'gimp-item-get-lock-content',
+    'gimp-item-get-lock-position',
+    'gimp-layer-get-lock-alpha',
+    'gimp-drawable-width',
+    'gimp-drawable-height',
+    'gimp-drawable-offsets',
+  ])
+  
+  def __init__(self, pdb_=None):
+    self._pdb = pdb_ if pdb_ is not None else pdb
+    
+    # key: (procedure name, `gimp.Item.ID`)
+    # value: return value of the procedure
+    self._cached_results = {}
+    
+    # key: procedure name
+    # value: `_CachedPdbProcedure` instance
+    self._procedures = {}
+    
+    # key: procedure name
+    # value: number of cache hits or misses
+    self._num_hits = {}
+    self._num_misses = {}
+  
+  def __getattr__(self, name):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    
+    return self[name.replace('_', '-')]
+  
+  def __getitem__(self, name):
+    try:
+      return self._procedures[name]
+    except KeyError:
+      procedure = _CachedPdbProcedure(self, self._pdb[name], name.replace('_', '-'))
+      self._procedures[name] = procedure
+      return procedure
+  
+  def invalidate(self, item=None):
+    """Discards cached results for the specified `gimp.Item` instance. If
+    `item` is `None`, all cached results are discarded.
+    """
+    if item is None:
+      self._cached_results = {}
+    else:
+      for procedure_name in self.QUERY_PROCEDURE_NAMES:
+        self._cached_results.pop((procedure_name, item.ID), None)
+  
+  def stats(self):
+    """Returns a dictionary of `(procedure name, PdbQueryStats)` pairs for
+    query procedures called through this object.
+    """
+    return {
+      procedure_name: PdbQueryStats(
+        self._num_hits.get(procedure_name, 0), self._num_misses.get(procedure_name, 0))
+      for procedure_name in set(self._num_hits) | set(self._num_misses)}
+  
+  def reset_stats(self):
+    """Clears the number of cache hits and misses."""
+    self._num_hits = {}
+    self._num_misses = {}
+  
+  def _call_query(self, procedure_name, procedure, args, kwargs):
+    if len(args) != 1 or kwargs or not isinstance(args[0], gimp.Item):
+      return procedure(*args, **kwargs)
+    
+    key = (procedure_name, args[0].ID)
+    
+    try:
+      result = self._cached_results[key]
+    except KeyError:
+      self._num_misses[procedure_name] = self._num_misses.get(procedure_name, 0) + 1
+      
+      result = procedure(*args)
+      self._cached_results[key] = result
+    else:
+      self._num_hits[procedure_name] = self._num_hits.get(procedure_name, 0) + 1
+    
+    return result
+  
+  def _call_modifying_procedure(self, procedure, args, kwargs):
+    if self._cached_results:
+      self._invalidate_for_args(args + tuple(kwargs.values()))
+    
+    return procedure(*args, **kwargs)
+  
+  def _invalidate_for_args(self, args):
+    items = [arg for arg in args if isinstance(arg, gimp.Item)]
+    
+    if any(isinstance(item, gimp.GroupLayer) for item in items):
+      self.invalidate()
+    elif items:
+      for item in items:
+        self.invalidate(item)
+    elif any(isinstance(arg, gimp.Image) for arg in args):
+      self.invalidate()
+
+
+class _CachedPdbProcedure(object):
+  """Wrapper of a PDB procedure passing calls to `CachedPdb`.
+  
+  Attributes of the PDB procedure (e.g. `proc_name` or `params`) are
+  accessible via this object.
+  """
+  
+  def __init__(self, cached_pdb, procedure, procedure_name):
+    self._cached_pdb = cached_pdb
+    self._procedure = procedure
+    self._procedure_name = procedure_name
+    self._is_query = procedure_name in CachedPdb.QUERY_PROCEDURE_NAMES
+  
+  def __getattr__(self, name):
+    return getattr(self._procedure, name)
+  
+  def __call__(self, *args, **kwargs):
+    if self._is_query:
+      return self._cached_pdb._call_query(self._procedure_name, self._procedure, args, kwargs)
+    else:
+      return self._cached_pdb._call_modifying_procedure(self._procedure, args, kwargs)
+
+
+#===============================================================================
+
+
+PdbCallEntry = collections.namedtuple(
+  'PdbCallEntry', ['group', 'procedure_name', 'num_calls', 'total_time', 'latency_histogram'])
+
+
+class InstrumentedPdb(object):
+  """Wrapper of the GIMP procedural database (PDB) recording the number of calls
+  and the time spent in each procedure.
+  
+  Procedures are obtained the same way as from `gimp.pdb`, i.e. as attributes
+  or via `[]`. Calls are recorded per procedure and per group returned by
+  `get_group`, a function without arguments called before each call (e.g.
+  returning the name of the action being applied). If `get_group` is `None`,
+  the group of each call is `None`.
+  
+  Besides the number of calls and the total time, a histogram of latencies is
+  recorded for each procedure and group. The i-th bucket of the histogram
+  holds the number of calls taking at most `LATENCY_HISTOGRAM_BOUNDS[i]`
+  seconds (and more than the previous bound). The last bucket holds calls
+  exceeding the last bound.
+  
+  In GIMP 2, each PDB call is a round-trip between the plug-in and GIMP. The
+  recorded data thus indicate how much time is spent communicating with GIMP.
+  """
+  
+  LATENCY_HISTOGRAM_BOUNDS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+  
+  def __init__(self, pdb_=None, get_group=None):
+    self._pdb = pdb_ if pdb_ is not None else pdb
+    self._get_group = get_group if get_group is not None else lambda: None
+    
+    # key: (group, procedure name)
+    # value: [number of calls, total time, latency histogram]
+    self._entries = collections.OrderedDict()
+    
+    # key: procedure name
+    # value: `_InstrumentedPdbProcedure` instance
+    self._procedures = {}
+  
+  def __getattr__(self, name):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    
+    return self[name.replace('_', '-')]
+  
+  def __getitem__(self, name):
+    try:
+      return self._procedures[name]
+    except KeyError:
+      procedure = _InstrumentedPdbProcedure(self, self._pdb[name], name.replace('_', '-'))
+      self._procedures[name] = procedure
+      return procedure
+  
+  @property
+  def entries(self):
+    """List of `PdbCallEntry` instances, one for each distinct combination of
+    group and procedure, in the order of the first call.
+    """
+    return [
+      PdbCallEntry(group, procedure_name, num_calls, total_time, list(latency_histogram))
+      for (group, procedure_name), (num_calls, total_time, latency_histogram)
+      in self._entries.items()]
+  
+  @property
+  def num_calls(self):
+    """Total number of recorded calls."""
+    return sum(entry[0] for entry in self._entries.values())
+  
+  @property
+  def total_time(self):
+    """Total time in seconds spent in recorded calls."""
+    return sum(entry[1] for entry in self._entries.values())
+  
+  def add(self, group, procedure_name, elapsed_time):
+    """Records a single call of the specified procedure taking `elapsed_time`
+    seconds.
+    """
+    key = (group, procedure_name)
+    
+    if key not in self._entries:
+      self._entries[key] = [0, 0.0, [0] * (len(self.LATENCY_HISTOGRAM_BOUNDS) + 1)]
+    
+    entry = self._entries[key]
+    entry[0] += 1
+    entry[1] += elapsed_time
+    entry[2][bisect.bisect_left(self.LATENCY_HISTOGRAM_BOUNDS, elapsed_time)] += 1
+  
+  @contextlib.contextmanager
+  def measure(self, procedure_name):
+    """Records the time spent in the `with` block as a single call of the
+    specified procedure in the current group.
+    
+    This is useful to record procedures not called through this object (e.g.
+    file save procedures wrapped in other functions).
+    """
+    group = self._get_group()
+    start_time = timeit.default_timer()
+    try:
+      yield
+    finally:
+      self.add(group, procedure_name, timeit.default_timer() - start_time)
+  
+  def get_procedure_totals(self):
+    """Returns a dictionary of (procedure name, `PdbCallEntry`) pairs, each
+    entry summing the calls of the procedure over all groups. The group of each
+    entry is `None`.
+    """
+    totals = collections.OrderedDict()
+    
+    for (unused_, procedure_name), (num_calls, total_time, latency_histogram) in (
+          self._entries.items()):
+      if procedure_name not in totals:
+        totals[procedure_name] = PdbCallEntry(
+          None, procedure_name, 0, 0.0, [0] * len(latency_histogram))
+      
+      total = totals[procedure_name]
+      totals[procedure_name] = total._replace(
+        num_calls=total.num_calls + num_calls,
+        total_time=total.total_time + total_time,
+        latency_histogram=[
+          count + other_count
+          for count, other_count in zip(total.latency_histogram, latency_histogram)])
+    
+    return totals
+  
+  def get_slowest_procedures(self, num_procedures=None):
+    """Returns a list of `PdbCallEntry` instances from `get_procedure_totals()`
+    sorted by the total time in descending order.
+    
+    If `num_procedures` is not `None`, at most `num_procedures` entries are
+    returned.
+    """
+    slowest_procedures = sorted(
+      self.get_procedure_totals().values(), key=lambda entry: entry.total_time, reverse=True)
+    
+    if num_procedures is not None:
+      return slowest_procedures[:num_procedures]
+    else:
+      return slowest_procedures
+  
+  def get_report(self, num_items=None, num_procedures=10):
+    """Returns a human-readable summary of the recorded calls as a string.
+    
+    The summary contains the total number of calls, `num_procedures`
+    procedures with the highest total time (all procedures if `None`), their
+    latency histograms and the number of calls per group.
+    
+    If `num_items` is not `None`, the number of calls per item (e.g. per
+    exported layer) is included as well.
+    """
+    
+    def _get_calls_per_item(num_calls):
+      if num_items:
+        return '{:.1f}'.format(num_calls / num_items)
+      else:
+        return '-'
+    
+    lines = []
+    
+    lines.append('PDB calls: {}, total time: {:.3f} s'.format(self.num_calls, self.total_time))
+    if num_items is not None:
+      lines.append('Items: {}, calls per item: {}'.format(
+        num_items, _get_calls_per_item(self.num_calls)))
+    
+    lines.append('')
+    lines.append('Slowest procedures:')
+    lines.append('{:<40} {:>10} {:>12} {:>12} {:>10}'.format(
+      'procedure', 'calls', 'total [s]', 'average [ms]', 'per item'))
+    
+    slowest_procedures = self.get_slowest_procedures(num_procedures)
+    
+    for entry in slowest_procedures:
+      lines.append('{:<40} {:>10} {:>12.3f} {:>12.3f} {:>10}'.format(
+        entry.procedure_name,
+        entry.num_calls,
+        entry.total_time,
+        entry.total_time / entry.num_calls * 1000,
+        _get_calls_per_item(entry.num_calls)))
+    
+    lines.append('')
+    lines.append('Latency histograms:')
+    lines.append('{:<40} {}'.format(
+      'procedure',
+      ' '.join(
+        '{:>8}'.format(label) for label in self._get_latency_histogram_labels())))
+    
+    for entry in slowest_procedures:
+      lines.append('{:<40} {}'.format(
+        entry.procedure_name,
+        ' '.join('{:>8}'.format(count) for count in entry.latency_histogram)))
+    
+    lines.append('')
+    lines.append('Calls per group:')
+    
+    for entry in sorted(self.entries, key=lambda entry: entry.total_time, reverse=True):
+      lines.append('{:<30} {:<40} {:>10} {:>12.3f}'.format(
+        entry.group if entry.group is not None else '-',
+        entry.procedure_name,
+        entry.num_calls,
+        entry.total_time))
+    
+    return '\n'.join(lines) + '\n'
+  
+  def clear(self):
+    self._entries.clear()
+  
+  def _call(self, procedure_name, procedure, args, kwargs):
+    group = self._get_group()
+    start_time = timeit.default_timer()
+    try:
+      return procedure(*args, **kwargs)
+    finally:
+      self.add(group, procedure_name, timeit.default_timer() - start_time)
+  
+  def _get_latency_histogram_labels(self):
+    labels = ['<={:g}ms'.format(bound * 1000) for bound in self.LATENCY_HISTOGRAM_BOUNDS]
+    labels.append('>{:g}ms'.format(self.LATENCY_HISTOGRAM_BOUNDS[-1] * 1000))
+    return labels
+
+
+class _InstrumentedPdbProcedure(object):
+  """Wrapper of a PDB procedure passing calls to `InstrumentedPdb`.
+  
+  Attributes of the PDB procedure (e.g. `proc_name` or `params`) are
+  accessible via this object.
+  """
+  
+  def __init__(self, instrumented_pdb, procedure, procedure_name):
+    self._instrumented_pdb = instrumented_pdb
+    self._procedure = procedure
+    self._procedure_name = procedure_name
+  
+  def __getattr__(self, name):
+    return getattr(self._procedure, name)
+  
+  def __call__(self, *args, **kwargs):
+    return self._instrumented_pdb._call(self._procedure_name, self._procedure, args, kwargs)
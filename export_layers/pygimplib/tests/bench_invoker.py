@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks measuring the throughput of `invoker.Invoker.invoke()`.
+
+To run the benchmarks in GIMP, pass `'bench_'` as the prefix of test modules
+to `runtests.plug_in_run_tests`.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import timeit
+import unittest
+
+import parameterized
+
+from .. import invoker as pginvoker
+
+
+def _do_nothing(*args, **kwargs):
+  pass
+
+
+def _do_nothing_around_action(*args, **kwargs):
+  yield
+
+
+class BenchmarkInvokerInvoke(unittest.TestCase):
+  
+  NUM_INVOCATIONS = 10000
+  NUM_ACTIONS = 8
+  NUM_REPEATS = 3
+  
+  @parameterized.parameterized.expand([
+    ('without_foreach_actions', 0, None),
+    ('without_foreach_actions_args_at_beginning', 0, 0),
+    ('with_foreach_actions', 2, None),
+  ])
+  def test_invoke(self, test_case_name_suffix, num_foreach_actions, additional_args_position):
+    invoker = pginvoker.Invoker()
+    
+    for unused_ in range(self.NUM_ACTIONS):
+      invoker.add(_do_nothing, args=[1, 2], kwargs={'three': 3})
+    
+    for unused_ in range(num_foreach_actions):
+      invoker.add(_do_nothing_around_action, foreach=True)
+    
+    additional_args = [object()]
+    
+    def _invoke():
+      for unused_ in range(self.NUM_INVOCATIONS):
+        invoker.invoke(
+          additional_args=additional_args, additional_args_position=additional_args_position)
+    
+    invoke_time = min(timeit.repeat(_invoke, number=1, repeat=self.NUM_REPEATS))
+    
+    print(
+      '\n{} ({}): {} actions: {:.0f} invocations per second, {:.2f} us per invocation'.format(
+        type(self).__name__,
+        test_case_name_suffix,
+        self.NUM_ACTIONS,
+        self.NUM_INVOCATIONS / invoke_time,
+        invoke_time / self.NUM_INVOCATIONS * 1e6))
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks measuring the construction and refresh time, memory usage and
+traversal time of `itemtree.ItemTree` for large images.
+
+To run the benchmarks in GIMP, pass `'bench_'` as the prefix of test modules
+to `runtests.plug_in_run_tests`.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import sys
+import timeit
+import unittest
+
+import mock
+
+import parameterized
+
+from . import stubs_gimp
+from .. import itemtree as pgitemtree
+from .. import utils as pgutils
+
+
+def _create_image(num_layers, num_layers_per_group, max_depth):
+  """Creates an image stub with `num_layers` layers (excluding groups).
+  
+  Layers are placed in groups of `num_layers_per_group`. Each group is nested in
+  the previous group until `max_depth` is reached, after which the nesting
+  starts again from the top level.
+  """
+  image = stubs_gimp.ImageStub()
+  
+  parent = None
+  depth = 0
+  
+  for i in range(num_layers):
+    if num_layers_per_group and i % num_layers_per_group == 0:
+      group = stubs_gimp.LayerGroupStub('group {}'.format(i), image=image, parent=parent)
+      
+      if parent is None:
+        image.layers.append(group)
+      else:
+        parent.layers.append(group)
+      
+      if depth < max_depth:
+        parent = group
+        depth += 1
+      else:
+        parent = None
+        depth = 0
+    
+    layer = stubs_gimp.LayerStub('layer {}'.format(i), image=image, parent=parent)
+    
+    if parent is None:
+      image.layers.append(layer)
+    else:
+      parent.layers.append(layer)
+  
+  return image
+
+
+@mock.patch(
+  pgutils.get_pygimplib_module_path() + '.itemtree.pdb',
+  new=stubs_gimp.PdbStub())
+@mock.patch(
+  pgutils.get_pygimplib_module_path() + '.itemtree.gimp.GroupLayer',
+  new=stubs_gimp.LayerGroupStub)
+class BenchmarkItemTreeConstruction(unittest.TestCase):
+  
+  NUM_REPEATS = 3
+  
+  @parameterized.parameterized.expand([
+    ('1k_flat', 1000, 0, 0),
+    ('1k_nested', 1000, 10, 20),
+    ('10k_flat', 10000, 0, 0),
+    ('10k_nested', 10000, 10, 20),
+    ('10k_deep', 10000, 2, 1000),
+    ('20k_nested', 20000, 10, 20),
+    ('50k_flat', 50000, 0, 0),
+    ('50k_nested', 50000, 10, 20),
+  ])
+  def test_construction(
+        self, test_case_name_suffix, num_layers, num_layers_per_group, max_depth):
+    image = _create_image(num_layers, num_layers_per_group, max_depth)
+    
+    construction_time = min(
+      timeit.repeat(lambda: pgitemtree.LayerTree(image), number=1, repeat=self.NUM_REPEATS))
+    
+    print(
+      '\n{} ({}): {} layers: {:.3f} s'.format(
+        type(self).__name__, test_case_name_suffix, num_layers, construction_time))
+  
+  @parameterized.parameterized.expand([
+    ('10k_nested', 10000, 10, 20),
+    ('50k_nested', 50000, 10, 20),
+  ])
+  def test_refresh(self, test_case_name_suffix, num_layers, num_layers_per_group, max_depth):
+    image = _create_image(num_layers, num_layers_per_group, max_depth)
+    item_tree = pgitemtree.LayerTree(image)
+    
+    refresh_time = min(
+      timeit.repeat(item_tree.refresh, number=1, repeat=self.NUM_REPEATS))
+    
+    print(
+      '\n{} ({}): {} layers: refresh: {:.3f} s'.format(
+        type(self).__name__, test_case_name_suffix, num_layers, refresh_time))
+  
+  def test_memory_per_item(self):
+    num_layers = 20000
+    
+    item_tree = pgitemtree.LayerTree(_create_image(num_layers, 10, 20))
+    items = list(item_tree.iter_all())
+    
+    total_size = sum(_get_approximate_item_size(item) for item in items)
+    
+    print(
+      '\n{}: {} layers: {:.1f} bytes per item'.format(
+        type(self).__name__, num_layers, total_size / len(items)))
+
+
+
+@mock.patch(
+  pgutils.get_pygimplib_module_path() + '.itemtree.pdb',
+  new=stubs_gimp.PdbStub())
+@mock.patch(
+  pgutils.get_pygimplib_module_path() + '.itemtree.gimp.GroupLayer',
+  new=stubs_gimp.LayerGroupStub)
+class BenchmarkItemTreeTraversal(unittest.TestCase):
+  
+  NUM_REPEATS = 3
+  
+  @parameterized.parameterized.expand([
+    ('10k_nested', 10000, 10, 20),
+    ('10k_nested_filtered', 10000, 10, 20, True),
+  ])
+  def test_len_and_next(
+        self, test_case_name_suffix, num_layers, num_layers_per_group, max_depth,
+        is_filtered=False):
+    item_tree = pgitemtree.LayerTree(_create_image(num_layers, num_layers_per_group, max_depth))
+    if is_filtered:
+      item_tree.filter.add(lambda item: not item.orig_name.endswith('5'))
+    
+    def _traverse():
+      len(item_tree)
+      for item in item_tree:
+        item_tree.next(item, with_folders=False)
+    
+    traversal_time = min(timeit.repeat(_traverse, number=1, repeat=self.NUM_REPEATS))
+    
+    print(
+      '\n{} ({}): {} layers: {:.3f} s'.format(
+        type(self).__name__, test_case_name_suffix, num_layers, traversal_time))
+
+
+@mock.patch(
+  pgutils.get_pygimplib_module_path() + '.itemtree.pdb',
+  new=stubs_gimp.PdbStub())
+@mock.patch(
+  pgutils.get_pygimplib_module_path() + '.itemtree.gimp.GroupLayer',
+  new=stubs_gimp.LayerGroupStub)
+class BenchmarkItemTreeStates(unittest.TestCase):
+  
+  NUM_REPEATS = 3
+  NUM_MODIFIED_ITEMS = 10
+  
+  @parameterized.parameterized.expand([
+    ('10k_nested', 10000, 10, 20),
+    ('50k_nested', 50000, 10, 20),
+  ])
+  def test_reset_and_restore(
+        self, test_case_name_suffix, num_layers, num_layers_per_group, max_depth):
+    image = _create_image(num_layers, num_layers_per_group, max_depth)
+    
+    def _modify_items(item_tree):
+      for item in list(item_tree)[:self.NUM_MODIFIED_ITEMS]:
+        item.name = 'modified'
+    
+    def _push_reset_and_pop_per_item():
+      item_tree = pgitemtree.LayerTree(image)
+      _modify_items(item_tree)
+      
+      start_time = timeit.default_timer()
+      
+      items = list(item_tree.iter_all())
+      for item in items:
+        item.push_state()
+        item.reset()
+      
+      for item in items:
+        item.pop_state()
+      
+      return timeit.default_timer() - start_time
+    
+    def _snapshot_reset_and_restore():
+      item_tree = pgitemtree.LayerTree(image)
+      _modify_items(item_tree)
+      
+      start_time = timeit.default_timer()
+      
+      version = item_tree.snapshot()
+      item_tree.reset_all()
+      item_tree.restore(version)
+      
+      return timeit.default_timer() - start_time
+    
+    per_item_time = min(_push_reset_and_pop_per_item() for unused_ in range(self.NUM_REPEATS))
+    snapshot_time = min(_snapshot_reset_and_restore() for unused_ in range(self.NUM_REPEATS))
+    
+    print(
+      ('\n{} ({}): {} layers, {} modified: per-item push/reset/pop: {:.4f} s,'
+       ' snapshot/reset_all/restore: {:.6f} s').format(
+        type(self).__name__,
+        test_case_name_suffix,
+        num_layers,
+        self.NUM_MODIFIED_ITEMS,
+        per_item_time,
+        snapshot_time))
+
+
+def _get_approximate_item_size(item):
+  """Returns the size of `item` in bytes, including containers owned by the
+  item (but not parents or children shared with other items).
+  """
+  size = sys.getsizeof(item)
+  
+  instance_dict = getattr(item, '__dict__', None)
+  if instance_dict is not None:
+    size += sys.getsizeof(instance_dict)
+    attribute_values = list(instance_dict.values())
+  else:
+    attribute_values = [
+      getattr(item, attribute_name, None) for attribute_name in type(item).__slots__]
+  
+  for value in attribute_values:
+    if isinstance(value, (set, dict)) or (isinstance(value, list) and not value):
+      size += sys.getsizeof(value)
+  
+  return size
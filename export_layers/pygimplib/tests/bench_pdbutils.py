@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks measuring the number of PDB calls needed to copy a layer into an
+image and to remove it afterwards, as done by the batcher for each layer.
+
+To run the benchmarks in GIMP, pass `'bench_'` as the prefix of test modules
+to `runtests.plug_in_run_tests`.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import unittest
+
+import mock
+
+import parameterized
+
+from . import stubs_gimp
+from .. import pdbutils as pgpdbutils
+from .. import utils as pgutils
+
+
+class _RecordingItemStubMixin(object):
+  """Mixin recording reading and setting the `visible` attribute as PDB calls
+  since the attribute is obtained and set via the PDB in GIMP.
+  """
+  
+  instrumented_pdb = None
+  
+  @property
+  def visible(self):
+    self.instrumented_pdb.add(None, 'gimp-item-get-visible', 0.0)
+    return self._visible
+  
+  @visible.setter
+  def visible(self, value):
+    # Setting the attribute in `__init__()` is not a PDB call.
+    if self.instrumented_pdb is not None and hasattr(self, '_visible'):
+      self.instrumented_pdb.add(None, 'gimp-item-set-visible', 0.0)
+    self._visible = value
+
+
+class _LayerStub(_RecordingItemStubMixin, stubs_gimp.LayerStub):
+  pass
+
+
+class _LayerGroupStub(_RecordingItemStubMixin, stubs_gimp.LayerGroupStub):
+  pass
+
+
+class _ImageStub(stubs_gimp.ImageStub):
+  """Image stub recording reading the `layers` attribute as a PDB call since
+  the layers are obtained via the PDB in GIMP.
+  """
+  
+  instrumented_pdb = None
+  
+  @property
+  def layers(self):
+    self.instrumented_pdb.add(None, 'gimp-image-get-layers', 0.0)
+    return list(self._layers)
+  
+  @layers.setter
+  def layers(self, value):
+    self._layers = value
+
+
+class _PdbStub(stubs_gimp.PdbStub):
+  
+  @staticmethod
+  def gimp_layer_new_from_drawable(layer, image):
+    return type(layer)(layer.name, image=image)
+  
+  @staticmethod
+  def gimp_image_insert_layer(image, layer, parent, position):
+    if parent is None:
+      image._layers.insert(position, layer)
+    else:
+      parent.children.insert(position, layer)
+    
+    layer.parent = parent
+  
+  @staticmethod
+  def gimp_image_remove_layer(image, layer):
+    image._layers.remove(layer)
+  
+  @staticmethod
+  def gimp_item_set_visible(item, visible):
+    item._visible = visible
+  
+  @staticmethod
+  def gimp_image_merge_visible_layers(image, merge_type):
+    visible_layers = [layer for layer in image._layers if layer._visible]
+    merged_layer = _LayerStub('merged', image=image)
+    
+    image._layers[image._layers.index(visible_layers[0])] = merged_layer
+    for layer in visible_layers[1:]:
+      image._layers.remove(layer)
+    
+    return merged_layer
+
+
+@mock.patch(
+  pgutils.get_pygimplib_module_path() + '.pdbutils.gimp.GroupLayer', new=stubs_gimp.LayerGroupStub)
+class BenchmarkLayerStaging(unittest.TestCase):
+  
+  NUM_LAYERS = 1000
+  
+  def setUp(self):
+    self.instrumented_pdb = pgpdbutils.InstrumentedPdb(_PdbStub())
+    
+    _ImageStub.instrumented_pdb = self.instrumented_pdb
+    _RecordingItemStubMixin.instrumented_pdb = None
+    
+    self.src_image = _ImageStub()
+    self.dest_image = _ImageStub()
+  
+  def tearDown(self):
+    _ImageStub.instrumented_pdb = None
+    _RecordingItemStubMixin.instrumented_pdb = None
+  
+  @parameterized.parameterized.expand([
+    ('layers', 0),
+    ('layers_and_groups', 5),
+  ])
+  def test_stage_and_clear(self, test_case_name_suffix, group_frequency):
+    layers = self._create_layers(group_frequency)
+    
+    calls_per_layer_with_copy_and_paste = self._get_calls_per_layer(
+      layers, self._copy_and_paste_and_remove_layers)
+    
+    layer_stager = pgpdbutils.LayerStager(self.dest_image, self.instrumented_pdb)
+    calls_per_layer_with_layer_stager = self._get_calls_per_layer(
+      layers, lambda layer: self._stage_and_clear(layer_stager, layer))
+    
+    print(
+      ('\n{} ({}): {} layers: PDB calls per layer:'
+       ' copy_and_paste_layer() + per-layer removal: {:.2f}, LayerStager: {:.2f}').format(
+        type(self).__name__,
+        test_case_name_suffix,
+        len(layers),
+        calls_per_layer_with_copy_and_paste,
+        calls_per_layer_with_layer_stager))
+    
+    self.assertLess(calls_per_layer_with_layer_stager, calls_per_layer_with_copy_and_paste)
+  
+  def _create_layers(self, group_frequency):
+    layers = []
+    
+    for i in range(self.NUM_LAYERS):
+      if group_frequency and i % group_frequency == 0:
+        layers.append(_LayerGroupStub('group {}'.format(i), image=self.src_image))
+      else:
+        layers.append(_LayerStub('layer {}'.format(i), image=self.src_image))
+    
+    return layers
+  
+  def _get_calls_per_layer(self, layers, process_layer):
+    self.instrumented_pdb.clear()
+    _RecordingItemStubMixin.instrumented_pdb = self.instrumented_pdb
+    
+    with mock.patch(
+          pgutils.get_pygimplib_module_path() + '.pdbutils.pdb', new=self.instrumented_pdb):
+      for layer in layers:
+        process_layer(layer)
+    
+    _RecordingItemStubMixin.instrumented_pdb = None
+    
+    return self.instrumented_pdb.num_calls / len(layers)
+  
+  def _copy_and_paste_and_remove_layers(self, layer):
+    pgpdbutils.copy_and_paste_layer(
+      layer, self.dest_image, None, len(self.dest_image.layers), True, True, True)
+    
+    for layer_copy in self.dest_image.layers:
+      self.instrumented_pdb.gimp_image_remove_layer(self.dest_image, layer_copy)
+  
+  @staticmethod
+  def _stage_and_clear(layer_stager, layer):
+    layer_stager.stage(layer)
+    layer_stager.clear()
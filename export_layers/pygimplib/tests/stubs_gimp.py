@@ -22,6 +22,9 @@ class PdbStub(object):
     self._attr_name = name
     return self._call
   
+  def __getitem__(self, name):
+    return getattr(self, name.replace('-', '_'))
+  
   def _call(self, *args):
     return self._attr_name
   
@@ -50,10 +53,33 @@ class PdbStub(object):
   def gimp_item_is_group(item):
     return isinstance(item, LayerGroupStub)
   
+  @staticmethod
+  def gimp_item_is_valid(item):
+    if item is not None:
+      return item.valid
+    else:
+      return False
+  
+  @staticmethod
+  def gimp_item_get_visible(item):
+    return item.visible
+  
   @staticmethod
   def gimp_item_set_visible(item, visible):
     item.visible = visible
   
+  @staticmethod
+  def gimp_drawable_width(drawable):
+    return drawable.width
+  
+  @staticmethod
+  def gimp_drawable_height(drawable):
+    return drawable.height
+  
+  @staticmethod
+  def gimp_drawable_offsets(drawable):
+    return drawable.offsets
+  
   @staticmethod
   def gimp_item_get_children(item):
     return len(item.children), item.children
@@ -747,6 +747,34 @@ class TestInvokerInvokeActions(InvokerTestCase):
     
     self.assertEqual(test_list, ['one', 'two', 'four'])
   
+  def test_invoke_after_adding_reordering_and_removing_actions(self):
+    test_list = []
+    action_1_id = self.invoker.add(append_to_list, args=[test_list, 1])
+    self.invoker.add(append_to_list, args=[test_list, 2])
+    
+    self.invoker.invoke()
+    
+    action_3_id = self.invoker.add(append_to_list, args=[test_list, 3])
+    self.invoker.invoke()
+    
+    self.invoker.reorder(action_3_id, 0)
+    self.invoker.invoke()
+    
+    self.invoker.remove(action_1_id)
+    self.invoker.invoke()
+    
+    self.assertEqual(test_list, [1, 2, 1, 2, 3, 3, 1, 2, 3, 2])
+  
+  def test_invoke_with_different_additional_args_positions(self):
+    test_list = []
+    self.invoker.add(extend_list, args=[test_list, 1, 2])
+    
+    self.invoker.invoke(additional_args=[3])
+    self.invoker.invoke(additional_args=[3], additional_args_position=2)
+    self.invoker.invoke(additional_args=[4])
+    
+    self.assertEqual(test_list, [1, 2, 3, 1, 3, 2, 1, 2, 4])
+  
   def test_invoke_with_generator(self):
     test_list = []
     
@@ -928,6 +956,20 @@ class TestInvokerInvokeForeachActions(InvokerTestCase):
     self.invoker.invoke()
     
     self.assertListEqual(test_list, [3, 4, 1, 3, 4, 2])
+  
+  def test_invoke_foreach_added_during_invocation(self):
+    test_list = []
+    
+    def append_to_list_and_add_foreach_action(list_, arg):
+      list_.append(arg)
+      self.invoker.add(append_to_list, args=[test_list, 'foreach'], foreach=True)
+    
+    self.invoker.add(append_to_list_and_add_foreach_action, args=[test_list, 1])
+    self.invoker.add(append_to_list, args=[test_list, 2])
+    
+    self.invoker.invoke()
+    
+    self.assertListEqual(test_list, [1, 2, 'foreach'])
 
 
 class TestInvokerInvokeWithInvoker(InvokerTestCase):
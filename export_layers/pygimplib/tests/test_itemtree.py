@@ -59,8 +59,8 @@ class TestLayerTree(unittest.TestCase):
       }
     """
     
-    image = utils_itemtree.parse_layers(items_string)
-    self.item_tree = pgitemtree.LayerTree(image)
+    self.image = utils_itemtree.parse_layers(items_string)
+    self.item_tree = pgitemtree.LayerTree(self.image)
     
     self.ITEM = pgitemtree.TYPE_ITEM
     self.GROUP = pgitemtree.TYPE_GROUP
@@ -245,6 +245,325 @@ class TestLayerTree(unittest.TestCase):
     self.assertEqual(
       self.item_tree.next(self.item_tree[('Corners', self.FOLDER_KEY)], filtered=False),
       self.item_tree['top-left-corner'])
+  
+  def test_is_included(self):
+    self.assertTrue(self.item_tree.is_included(self.item_tree['top-frame']))
+    self.assertTrue(self.item_tree.is_included(self.item_tree[('Frames', self.FOLDER_KEY)]))
+    self.assertFalse(
+      self.item_tree.is_included(
+        self.item_tree[('Frames', self.FOLDER_KEY)], with_folders=False))
+    
+    self.assertFalse(self.item_tree.is_included(self.item_tree['Overlay']))
+    self.assertTrue(
+      self.item_tree.is_included(self.item_tree['Overlay'], with_empty_groups=True))
+    
+    self.item_tree.filter.add(lambda item: item.type != self.ITEM)
+    self.assertFalse(self.item_tree.is_included(self.item_tree['top-frame']))
+    self.assertTrue(self.item_tree.is_included(self.item_tree['top-frame'], filtered=False))
+  
+  def test_is_included_matches_iter(self):
+    self.item_tree.filter.add(lambda item: 'corner' not in item.name)
+    
+    for with_folders in [True, False]:
+      for with_empty_groups in [True, False]:
+        for filtered in [True, False]:
+          self.assertListEqual(
+            list(self.item_tree.iter(with_folders, with_empty_groups, filtered)),
+            [item for item in self.item_tree.iter_all()
+             if self.item_tree.is_included(item, with_folders, with_empty_groups, filtered)])
+  
+  def test_iteration_does_not_query_children_of_groups(self):
+    with mock.patch.object(pgitemtree.pdb, 'gimp_item_get_children') as get_children_mock:
+      list(self.item_tree.iter())
+      len(self.item_tree)
+      self.item_tree.next(self.item_tree['Corners'])
+      self.item_tree.prev(self.item_tree['Overlay'])
+    
+    self.assertFalse(get_children_mock.called)
+  
+  def test_next_and_len_reflect_filter_changes(self):
+    self.assertEqual(
+      self.item_tree.next(self.item_tree['top-left-corner'], with_folders=False),
+      self.item_tree['top-right-corner'])
+    
+    rule = self.item_tree.filter.add(lambda item: item.orig_name != 'top-right-corner')
+    
+    self.assertEqual(
+      self.item_tree.next(self.item_tree['top-left-corner'], with_folders=False),
+      self.item_tree['bottom-right-corner'])
+    self.assertEqual(len(self.item_tree), 8)
+    
+    self.item_tree.is_filtered = False
+    
+    self.assertEqual(
+      self.item_tree.next(self.item_tree['top-left-corner'], with_folders=False),
+      self.item_tree['top-right-corner'])
+    self.assertEqual(len(self.item_tree), 9)
+    
+    self.item_tree.is_filtered = True
+    self.item_tree.filter.remove(rule.id)
+    
+    self.assertEqual(
+      self.item_tree.next(self.item_tree['top-left-corner'], with_folders=False),
+      self.item_tree['top-right-corner'])
+    self.assertEqual(len(self.item_tree), 9)
+  
+  def test_refresh_without_changes(self):
+    items = list(self.item_tree.iter_all())
+    self.item_tree['top-frame'].name = 'renamed-top-frame'
+    
+    changes = self.item_tree.refresh()
+    
+    self.assertEqual(changes, pgitemtree.ItemTreeChanges([], [], [], [], []))
+    self.assertListEqual(list(self.item_tree.iter_all()), items)
+    self.assertEqual(self.item_tree['top-frame'].name, 'renamed-top-frame')
+    self.assertEqual(
+      self.item_tree.next(self.item_tree['top-left-corner']), self.item_tree['top-right-corner'])
+  
+  def test_refresh_with_added_and_removed_items(self):
+    top_frame = self.item_tree['top-frame']
+    frames_group = self.item_tree['Frames']
+    
+    self.item_tree['Frames'].raw.layers.remove(top_frame.raw)
+    new_layer = stubs_gimp.LayerStub('new-layer', image=self.image)
+    self.image.layers.insert(0, new_layer)
+    
+    changes = self.item_tree.refresh()
+    
+    self.assertListEqual(changes.added, [self.item_tree['new-layer']])
+    self.assertListEqual(changes.removed, [top_frame])
+    self.assertListEqual(changes.renamed, [])
+    self.assertListEqual(changes.reparented, [])
+    self.assertListEqual(changes.reordered, [])
+    
+    self.assertNotIn('top-frame', self.item_tree)
+    self.assertIs(self.item_tree['Frames'], frames_group)
+    self.assertListEqual(list(self.item_tree['Frames', self.FOLDER_KEY].children), [])
+    self.assertNotIn(frames_group, list(self.item_tree))
+    
+    self.assertIsNone(self.item_tree['new-layer'].prev)
+    self.assertEqual(
+      self.item_tree['new-layer'].next, self.item_tree[('Corners', self.FOLDER_KEY)])
+    self.assertEqual(
+      self.item_tree.next(self.item_tree['Corners'], with_folders=False),
+      self.item_tree['main-background.jpg'])
+  
+  def test_refresh_with_renamed_reparented_and_reordered_items(self):
+    top_left_corner = self.item_tree['top-left-corner']
+    top_right_corner = self.item_tree['top-right-corner']
+    main_background = self.item_tree['main-background.jpg']
+    
+    top_right_corner.raw.name = b'top-right'
+    
+    corners_layers = self.item_tree['Corners'].raw.layers
+    corners_layers[0], corners_layers[1] = corners_layers[1], corners_layers[0]
+    
+    self.image.layers.remove(main_background.raw)
+    self.item_tree['Frames'].raw.layers.append(main_background.raw)
+    
+    changes = self.item_tree.refresh()
+    
+    self.assertListEqual(changes.added, [])
+    self.assertListEqual(changes.removed, [])
+    self.assertListEqual(changes.renamed, [top_right_corner])
+    self.assertListEqual(changes.reparented, [main_background])
+    self.assertListEqual(changes.reordered, [top_right_corner, top_left_corner])
+    
+    self.assertIs(self.item_tree['top-right'], top_right_corner)
+    self.assertEqual(top_right_corner.name, 'top-right')
+    self.assertNotIn('top-right-corner', self.item_tree)
+    
+    self.assertListEqual(
+      main_background.parents, [self.item_tree[('Frames', self.FOLDER_KEY)]])
+    self.assertEqual(
+      self.item_tree.next(self.item_tree['top-frame']), main_background)
+  
+  def test_invalidate_cache(self):
+    excluded_item_names = set()
+    self.item_tree.filter.add(lambda item: item.orig_name not in excluded_item_names)
+    
+    self.assertEqual(len(self.item_tree), 9)
+    
+    excluded_item_names.add('top-right-corner')
+    
+    self.assertEqual(len(self.item_tree), 9)
+    
+    self.item_tree.invalidate_cache()
+    
+    self.assertEqual(len(self.item_tree), 8)
+    self.assertEqual(
+      self.item_tree.prev(self.item_tree['bottom-right-corner'], with_folders=False),
+      self.item_tree['top-left-corner'])
+  
+  def test_get_num_items_per_parent(self):
+    corners_folder = self.item_tree[('Corners', self.FOLDER_KEY)]
+    
+    self.assertDictEqual(
+      self.item_tree.get_num_items_per_parent(),
+      {
+        None: 3,
+        corners_folder: 3,
+        self.item_tree[('top-left-corner::', self.FOLDER_KEY)]: 2,
+        self.item_tree[('Frames', self.FOLDER_KEY)]: 1,
+      })
+    
+    self.item_tree.filter.add(lambda item: item.orig_name != 'top-right-corner')
+    
+    self.assertEqual(self.item_tree.get_num_items_per_parent()[corners_folder], 2)
+    
+    self.item_tree.is_filtered = False
+    
+    self.assertEqual(self.item_tree.get_num_items_per_parent()[corners_folder], 3)
+  
+  def test_get_num_items_per_parent_is_cached_until_cache_is_invalidated(self):
+    corners_folder = self.item_tree[('Corners', self.FOLDER_KEY)]
+    top_frame = self.item_tree['top-frame']
+    
+    self.assertEqual(self.item_tree.get_num_items_per_parent()[corners_folder], 3)
+    
+    top_frame.parents = [corners_folder]
+    
+    self.assertEqual(self.item_tree.get_num_items_per_parent()[corners_folder], 3)
+    
+    self.item_tree.invalidate_cache()
+    
+    self.assertEqual(self.item_tree.get_num_items_per_parent()[corners_folder], 4)
+  
+  def test_reset_all(self):
+    top_frame = self.item_tree['top-frame']
+    corners_folder = self.item_tree[('Corners', self.FOLDER_KEY)]
+    
+    top_frame.name = 'renamed-top-frame'
+    top_frame.parents = []
+    corners_folder.children = []
+    
+    self.item_tree.reset_all()
+    
+    self.assertEqual(top_frame.name, 'top-frame')
+    self.assertListEqual(top_frame.parents, [self.item_tree[('Frames', self.FOLDER_KEY)]])
+    self.assertEqual(len(corners_folder.children), 6)
+  
+  def test_reset_all_resets_only_modified_items(self):
+    top_frame = self.item_tree['top-frame']
+    main_background = self.item_tree['main-background.jpg']
+    
+    top_frame.name = 'renamed-top-frame'
+    main_background.parents = []
+    
+    with mock.patch.object(
+          pgitemtree.Item, 'reset', autospec=True, side_effect=pgitemtree.Item.reset) as reset:
+      self.item_tree.reset_all()
+      
+      self.assertSetEqual(
+        set(call[0][0] for call in reset.call_args_list), set([top_frame, main_background]))
+      
+      reset.reset_mock()
+      self.item_tree.reset_all()
+      
+      self.assertFalse(reset.called)
+  
+  def test_reset_all_with_items_modified_during_reset(self):
+    top_frame = self.item_tree['top-frame']
+    main_background = self.item_tree['main-background.jpg']
+    
+    top_frame.name = 'renamed-top-frame'
+    
+    def _reset_and_modify_other_item(item):
+      orig_reset(item)
+      main_background.name = 'background'
+    
+    orig_reset = pgitemtree.Item.reset
+    
+    with mock.patch.object(
+          pgitemtree.Item, 'reset', autospec=True, side_effect=_reset_and_modify_other_item):
+      self.item_tree.reset_all()
+    
+    self.assertEqual(top_frame.name, 'top-frame')
+  
+  def test_snapshot_and_restore(self):
+    top_frame = self.item_tree['top-frame']
+    main_background = self.item_tree['main-background.jpg']
+    
+    top_frame.name = 'renamed-top-frame'
+    
+    version = self.item_tree.snapshot()
+    
+    self.item_tree.reset_all()
+    main_background.name = 'background'
+    main_background.parents = [self.item_tree[('Frames', self.FOLDER_KEY)]]
+    
+    self.item_tree.restore(version)
+    
+    self.assertEqual(top_frame.name, 'renamed-top-frame')
+    self.assertEqual(main_background.name, 'main-background.jpg')
+    self.assertListEqual(main_background.parents, [])
+    
+    self.item_tree.reset_all()
+    
+    self.assertEqual(top_frame.name, 'top-frame')
+  
+  def test_restore_discards_snapshots_taken_afterwards(self):
+    top_frame = self.item_tree['top-frame']
+    
+    first_version = self.item_tree.snapshot()
+    top_frame.name = 'first'
+    
+    second_version = self.item_tree.snapshot()
+    top_frame.name = 'second'
+    
+    self.item_tree.restore(first_version)
+    
+    self.assertEqual(top_frame.name, 'top-frame')
+    
+    with self.assertRaises(ValueError):
+      self.item_tree.restore(second_version)
+  
+  def test_restore_nested_snapshots(self):
+    top_frame = self.item_tree['top-frame']
+    main_background = self.item_tree['main-background.jpg']
+    
+    first_version = self.item_tree.snapshot()
+    top_frame.name = 'first'
+    
+    second_version = self.item_tree.snapshot()
+    top_frame.name = 'second'
+    main_background.name = 'second'
+    
+    self.item_tree.restore(second_version)
+    
+    self.assertEqual(top_frame.name, 'first')
+    self.assertEqual(main_background.name, 'main-background.jpg')
+    
+    self.item_tree.restore(first_version)
+    
+    self.assertEqual(top_frame.name, 'top-frame')
+  
+  @mock.patch(
+    pgutils.get_pygimplib_module_path() + '.itemtree.gimp',
+    new=stubs_gimp.GimpModuleStub())
+  def test_snapshot_and_restore_with_tags(self):
+    top_frame = self.item_tree['top-frame']
+    top_frame.add_tag('background')
+    
+    version = self.item_tree.snapshot()
+    
+    top_frame.add_tag('foreground')
+    top_frame.remove_tag('background')
+    
+    self.item_tree.restore(version)
+    
+    self.assertSetEqual(top_frame.tags, set(['background']))
+  
+  def test_refresh_discards_removed_items_from_modified_items(self):
+    top_frame = self.item_tree['top-frame']
+    top_frame.name = 'renamed-top-frame'
+    
+    self.item_tree['Frames'].raw.layers.remove(top_frame.raw)
+    self.item_tree.refresh()
+    
+    self.item_tree.reset_all()
+    
+    self.assertEqual(top_frame.name, 'renamed-top-frame')
 
 
 @mock.patch(
@@ -373,6 +692,37 @@ class TestItem(unittest.TestCase):
     item = pgitemtree.Item(layer, self.ITEM, tags_source_name=item_tags_source_name)
     self.assertIn('background', item.tags)
   
+  def test_tags_are_loaded_on_first_access(self):
+    item_tags_source_name = 'test'
+    
+    layer = stubs_gimp.LayerStub('layer')
+    layer.parasite_attach(
+      stubs_gimp.ParasiteStub(item_tags_source_name, 0, pickle.dumps(set(['background']))))
+    
+    with mock.patch.object(layer, 'parasite_find', wraps=layer.parasite_find) as parasite_find_mock:
+      item = pgitemtree.Item(layer, self.ITEM, tags_source_name=item_tags_source_name)
+      
+      self.assertFalse(parasite_find_mock.called)
+      
+      self.assertEqual(item.tags, set(['background']))
+      self.assertEqual(set(item.orig_tags), set(['background']))
+      self.assertEqual(parasite_find_mock.call_count, 1)
+  
+  def test_push_and_pop_state_with_tags_loaded_after_push(self):
+    item_tags_source_name = 'test'
+    
+    layer = stubs_gimp.LayerStub('layer')
+    layer.parasite_attach(
+      stubs_gimp.ParasiteStub(item_tags_source_name, 0, pickle.dumps(set(['background']))))
+    
+    item = pgitemtree.Item(layer, self.ITEM, tags_source_name=item_tags_source_name)
+    
+    item.push_state()
+    item.tags.add('foreground')
+    item.pop_state()
+    
+    self.assertEqual(item.tags, set(['background']))
+  
   @mock.patch(
     pgutils.get_pygimplib_module_path() + '.itemtree.gimp',
     new=stubs_gimp.GimpModuleStub())
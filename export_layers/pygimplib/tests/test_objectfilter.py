@@ -3,8 +3,14 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 from future.builtins import *
 
+import collections
+import itertools
 import unittest
 
+import mock
+
+import parameterized
+
 from .. import objectfilter as pgobjectfilter
 
 
@@ -238,6 +244,39 @@ class TestObjectFilter(unittest.TestCase):
       self.assertIn(rule_id, self.filter)
       self.assertEqual(self.filter[rule_id], rule)
   
+  def test_version_changes_on_modification(self):
+    versions = [self.filter.version]
+    
+    rule = self.filter.add(FilterRules.has_uppercase_letters)
+    versions.append(self.filter.version)
+    
+    nested_filter = pgobjectfilter.ObjectFilter()
+    nested_filter_id = self.filter.add(nested_filter)
+    versions.append(self.filter.version)
+    
+    nested_filter.add(FilterRules.is_empty)
+    versions.append(self.filter.version)
+    
+    with self.filter.remove_temp(rule.id):
+      versions.append(self.filter.version)
+    versions.append(self.filter.version)
+    
+    self.filter.remove(nested_filter_id)
+    versions.append(self.filter.version)
+    
+    self.filter.reset()
+    versions.append(self.filter.version)
+    
+    self.assertEqual(len(set(versions)), len(versions))
+  
+  def test_version_does_not_change_if_nothing_is_removed(self):
+    self.filter.add(FilterRules.has_uppercase_letters)
+    version = self.filter.version
+    
+    self.filter.remove(name='nonexistent')
+    
+    self.assertEqual(self.filter.version, version)
+  
   def test_match_all(self):
     self.filter.add(FilterRules.has_uppercase_letters)
     self.filter.add(FilterRules.is_object_id_even)
@@ -447,3 +486,84 @@ class TestObjectFilter(unittest.TestCase):
     self.filter.add(FilterRules.has_uppercase_letters)
     self.filter.reset()
     self.assertFalse(bool(self.filter))
+
+
+class TestObjectFilterStats(unittest.TestCase):
+  
+  def setUp(self):
+    self.objects = [
+      FilterableObject(object_id, name, is_empty=object_id % 10 == 0)
+      for object_id, name in enumerate(['Foo', 'foo', 'BAR', 'bar'] * 50)]
+    
+    self.num_calls = collections.defaultdict(int)
+  
+  def _count_calls(self, func):
+    
+    def _func_wrapper(obj):
+      self.num_calls[func.__name__] += 1
+      return func(obj)
+    
+    _func_wrapper.__name__ = func.__name__
+    
+    return _func_wrapper
+  
+  def test_stats(self):
+    filter_ = pgobjectfilter.ObjectFilter(record_stats=True)
+    has_uppercase_letters_rule = filter_.add(FilterRules.has_uppercase_letters)
+    is_empty_rule = filter_.add(FilterRules.is_empty)
+    
+    for obj in self.objects:
+      filter_.is_match(obj)
+    
+    stats = {rule_stats.rule_id: rule_stats for rule_stats in filter_.stats()}
+    
+    self.assertEqual(stats[has_uppercase_letters_rule.id].name, 'has_uppercase_letters')
+    self.assertEqual(stats[has_uppercase_letters_rule.id].num_calls, 200)
+    self.assertEqual(stats[has_uppercase_letters_rule.id].num_matches, 100)
+    self.assertEqual(stats[has_uppercase_letters_rule.id].rejection_rate, 0.5)
+    self.assertEqual(stats[is_empty_rule.id].num_calls, 100)
+    self.assertEqual(stats[is_empty_rule.id].num_matches, 20)
+    
+    filter_.reset_stats()
+    
+    self.assertTrue(all(rule_stats.num_calls == 0 for rule_stats in filter_.stats()))
+  
+  def test_stats_are_not_recorded_by_default(self):
+    filter_ = pgobjectfilter.ObjectFilter()
+    filter_.add(FilterRules.has_uppercase_letters)
+    
+    filter_.is_match(self.objects[0])
+    
+    self.assertEqual(filter_.stats()[0].num_calls, 0)
+  
+  @parameterized.parameterized.expand([
+    ('match_all', pgobjectfilter.ObjectFilter.MATCH_ALL),
+    ('match_any', pgobjectfilter.ObjectFilter.MATCH_ANY),
+  ])
+  def test_reorder_rules_preserves_results(self, test_case_name_suffix, match_type):
+    filter_ = pgobjectfilter.ObjectFilter(match_type)
+    filter_.add(FilterRules.has_uppercase_letters)
+    filter_.add(FilterRules.is_empty)
+    filter_.add(FilterRules.is_object_id_even)
+    
+    expected_results = [filter_.is_match(obj) for obj in self.objects]
+    
+    filter_.reorder_rules = True
+    
+    self.assertListEqual([filter_.is_match(obj) for obj in self.objects], expected_results)
+  
+  def test_reorder_rules_evaluates_selective_rules_first(self):
+    filter_ = pgobjectfilter.ObjectFilter(reorder_rules=True)
+    filter_.add(self._count_calls(FilterRules.has_uppercase_letters))
+    filter_.add(self._count_calls(FilterRules.is_empty))
+    
+    # Make each rule take the same amount of time.
+    with mock.patch.object(
+          pgobjectfilter.timeit, 'default_timer', side_effect=itertools.count()):
+      for obj in self.objects * 5:
+        filter_.is_match(obj)
+    
+    self.assertLess(self.num_calls['has_uppercase_letters'], self.num_calls['is_empty'] * 0.5)
+    self.assertListEqual(
+      [rule.name for rule in filter_.list_rules().values()],
+      ['has_uppercase_letters', 'is_empty'])
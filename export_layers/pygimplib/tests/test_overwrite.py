@@ -80,3 +80,33 @@ class TestHandleOverwrite(unittest.TestCase):
     self.assertEqual(
       pgoverwrite.handle_overwrite(self.filepath, self.overwrite_chooser),
       (pgoverwrite.OverwriteModes.DO_NOTHING, self.filepath))
+  
+  @mock.patch(pgutils.get_pygimplib_module_path() + '.overwrite.os.path.exists')
+  def test_handle_overwrite_with_dir_snapshot(self, mock_os_path_exists):
+    dir_snapshot = mock.Mock()
+    dir_snapshot.exists.side_effect = lambda path: path in [
+      '/test/image.png', '/test/image (1).png']
+    
+    self.assertEqual(
+      pgoverwrite.handle_overwrite(
+        self.filepath,
+        pgoverwrite.NoninteractiveOverwriteChooser(pgoverwrite.OverwriteModes.RENAME_NEW),
+        len('/test/image'),
+        dir_snapshot=dir_snapshot),
+      (pgoverwrite.OverwriteModes.RENAME_NEW, '/test/image (2).png'))
+    
+    self.assertFalse(mock_os_path_exists.called)
+  
+  def test_handle_overwrite_rename_existing_with_dir_snapshot(self):
+    dir_snapshot = mock.Mock()
+    dir_snapshot.exists.side_effect = lambda path: path == '/test/image.png'
+    
+    self.assertEqual(
+      pgoverwrite.handle_overwrite(
+        self.filepath,
+        pgoverwrite.NoninteractiveOverwriteChooser(pgoverwrite.OverwriteModes.RENAME_EXISTING),
+        len('/test/image'),
+        dir_snapshot=dir_snapshot),
+      (pgoverwrite.OverwriteModes.RENAME_EXISTING, self.filepath))
+    
+    dir_snapshot.rename.assert_called_once_with('/test/image.png', '/test/image (1).png')
@@ -4,8 +4,11 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 from future.builtins import *
 
 import os
+import shutil
+import tempfile
 import unittest
 
+import mock
 import parameterized
 
 from .. import path as pgpath
@@ -48,6 +51,84 @@ class TestUniquifyString(unittest.TestCase):
       expected_str)
 
 
+class TestDirectorySnapshot(unittest.TestCase):
+  
+  def setUp(self):
+    self.temp_dirpath = tempfile.mkdtemp()
+    
+    for filename in ['one.png', 'one (1).png', 'two.png']:
+      with open(os.path.join(self.temp_dirpath, filename), 'w'):
+        pass
+    
+    self.dir_snapshot = pgpath.DirectorySnapshot()
+  
+  def tearDown(self):
+    shutil.rmtree(self.temp_dirpath)
+  
+  def test_exists(self):
+    self.assertTrue(self.dir_snapshot.exists(os.path.join(self.temp_dirpath, 'one.png')))
+    self.assertFalse(self.dir_snapshot.exists(os.path.join(self.temp_dirpath, 'three.png')))
+    self.assertFalse(
+      self.dir_snapshot.exists(os.path.join(self.temp_dirpath, 'subdir', 'one.png')))
+  
+  def test_exists_lists_directory_only_once(self):
+    with mock.patch(
+           'export_layers.pygimplib.path.dirsnapshot.os.listdir', wraps=os.listdir) as (
+           mock_listdir):
+      for filename in ['one.png', 'two.png', 'three.png']:
+        self.dir_snapshot.exists(os.path.join(self.temp_dirpath, filename))
+      
+      self.assertEqual(mock_listdir.call_count, 1)
+  
+  def test_add_and_remove(self):
+    filepath = os.path.join(self.temp_dirpath, 'three.png')
+    
+    self.assertFalse(self.dir_snapshot.exists(filepath))
+    
+    self.dir_snapshot.add(filepath)
+    self.assertTrue(self.dir_snapshot.exists(filepath))
+    
+    self.dir_snapshot.remove(filepath)
+    self.assertFalse(self.dir_snapshot.exists(filepath))
+  
+  def test_rename(self):
+    src_filepath = os.path.join(self.temp_dirpath, 'two.png')
+    dest_filepath = os.path.join(self.temp_dirpath, 'two (1).png')
+    
+    self.assertTrue(self.dir_snapshot.exists(src_filepath))
+    
+    self.dir_snapshot.rename(src_filepath, dest_filepath)
+    
+    self.assertFalse(self.dir_snapshot.exists(src_filepath))
+    self.assertTrue(self.dir_snapshot.exists(dest_filepath))
+    self.assertTrue(os.path.exists(dest_filepath))
+  
+  def test_make_dirs(self):
+    dirpath = os.path.join(self.temp_dirpath, 'subdir', 'subsubdir')
+    
+    self.assertFalse(self.dir_snapshot.exists(os.path.join(self.temp_dirpath, 'subdir')))
+    
+    with mock.patch(
+           'export_layers.pygimplib.path.dirsnapshot._path_dirs.make_dirs',
+           wraps=pgpath.make_dirs) as mock_make_dirs:
+      self.dir_snapshot.make_dirs(dirpath)
+      self.dir_snapshot.make_dirs(dirpath)
+      
+      self.assertEqual(mock_make_dirs.call_count, 1)
+    
+    self.assertTrue(os.path.isdir(dirpath))
+    self.assertTrue(self.dir_snapshot.exists(os.path.join(self.temp_dirpath, 'subdir')))
+    self.assertTrue(self.dir_snapshot.exists(dirpath))
+  
+  def test_uniquify_filepath(self):
+    self.assertEqual(
+      pgpath.uniquify_filepath(
+        os.path.join(self.temp_dirpath, 'one.png'),
+        len(os.path.join(self.temp_dirpath, 'one')),
+        dir_snapshot=self.dir_snapshot),
+      os.path.join(self.temp_dirpath, 'one (2).png'))
+
+
 def _get_field_value(field, arg1=1, arg2=2):
   return '{}{}'.format(arg1, arg2)
 
@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import collections
+import unittest
+
+import mock
+
+from . import stubs_gimp
+from .. import pdbutils as pgpdbutils
+from .. import utils as pgutils
+
+
+@mock.patch(
+  pgutils.get_pygimplib_module_path() + '.pdbutils.gimp.Item', new=stubs_gimp.ItemStub)
+@mock.patch(
+  pgutils.get_pygimplib_module_path() + '.pdbutils.gimp.GroupLayer', new=stubs_gimp.LayerGroupStub)
+@mock.patch(
+  pgutils.get_pygimplib_module_path() + '.pdbutils.gimp.Image', new=stubs_gimp.ImageStub)
+class TestCachedPdb(unittest.TestCase):
+  
+  def setUp(self):
+    self.procedures = collections.defaultdict(mock.Mock)
+    
+    self.pdb = mock.MagicMock()
+    self.pdb.__getitem__.side_effect = lambda name: self.procedures[name]
+    
+    self.cached_pdb = pgpdbutils.CachedPdb(self.pdb)
+    
+    self.image = stubs_gimp.ImageStub()
+    self.layer = stubs_gimp.LayerStub('layer', image=self.image)
+    self.layer2 = stubs_gimp.LayerStub('layer2', image=self.image)
+    self.group = stubs_gimp.LayerGroupStub('group', image=self.image)
+  
+  def test_query_is_cached(self):
+    self.procedures['gimp-drawable-width'].return_value = 10
+    
+    self.assertEqual(self.cached_pdb.gimp_drawable_width(self.layer), 10)
+    self.assertEqual(self.cached_pdb['gimp-drawable-width'](self.layer), 10)
+    self.assertEqual(self.cached_pdb.gimp_drawable_width(self.layer2), 10)
+    
+    self.assertEqual(self.procedures['gimp-drawable-width'].call_count, 2)
+    self.assertDictEqual(
+      self.cached_pdb.stats(),
+      {'gimp-drawable-width': pgpdbutils.PdbQueryStats(hits=1, misses=2)})
+  
+  def test_query_without_item_argument_is_not_cached(self):
+    self.cached_pdb.gimp_item_is_valid(None)
+    self.cached_pdb.gimp_item_is_valid(None)
+    
+    self.assertEqual(self.procedures['gimp-item-is-valid'].call_count, 2)
+    self.assertDictEqual(self.cached_pdb.stats(), {})
+  
+  def test_modifying_procedure_invalidates_passed_items(self):
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    self.cached_pdb.gimp_item_get_visible(self.layer2)
+    
+    self.cached_pdb.gimp_item_set_visible(self.layer, False)
+    
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    self.cached_pdb.gimp_item_get_visible(self.layer2)
+    
+    self.assertEqual(self.procedures['gimp-item-get-visible'].call_count, 3)
+    self.procedures['gimp-item-set-visible'].assert_called_once_with(self.layer, False)
+  
+  def test_modifying_procedure_with_image_and_items_invalidates_passed_items(self):
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    self.cached_pdb.gimp_item_get_visible(self.layer2)
+    
+    self.cached_pdb['plug-in-autocrop-layer'](0, self.image, self.layer)
+    
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    self.cached_pdb.gimp_item_get_visible(self.layer2)
+    
+    self.assertEqual(self.procedures['gimp-item-get-visible'].call_count, 3)
+  
+  def test_modifying_procedure_with_image_only_invalidates_all_items(self):
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    self.cached_pdb.gimp_item_get_visible(self.layer2)
+    
+    self.cached_pdb.gimp_image_resize_to_layers(self.image)
+    
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    self.cached_pdb.gimp_item_get_visible(self.layer2)
+    
+    self.assertEqual(self.procedures['gimp-item-get-visible'].call_count, 4)
+  
+  def test_modifying_procedure_with_group_invalidates_all_items(self):
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    
+    self.cached_pdb.gimp_item_set_visible(self.group, False)
+    
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    
+    self.assertEqual(self.procedures['gimp-item-get-visible'].call_count, 2)
+  
+  def test_invalidate(self):
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    self.cached_pdb.gimp_item_get_visible(self.layer2)
+    
+    self.cached_pdb.invalidate(self.layer)
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    self.cached_pdb.gimp_item_get_visible(self.layer2)
+    
+    self.assertEqual(self.procedures['gimp-item-get-visible'].call_count, 3)
+    
+    self.cached_pdb.invalidate()
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    self.cached_pdb.gimp_item_get_visible(self.layer2)
+    
+    self.assertEqual(self.procedures['gimp-item-get-visible'].call_count, 5)
+  
+  def test_reset_stats(self):
+    self.cached_pdb.gimp_item_get_visible(self.layer)
+    
+    self.cached_pdb.reset_stats()
+    
+    self.assertDictEqual(self.cached_pdb.stats(), {})
+  
+  def test_procedure_attributes_are_accessible(self):
+    self.procedures['gimp-item-is-valid'].proc_name = 'gimp-item-is-valid'
+    
+    self.assertEqual(self.cached_pdb.gimp_item_is_valid.proc_name, 'gimp-item-is-valid')
+
+
+
+
+def _create_image(width=100, height=50, base_type=0):
+  image = stubs_gimp.ImageStub()
+  image.width = width
+  image.height = height
+  image.base_type = base_type
+  image.channels = []
+  image.vectors = []
+  
+  return image
+
+
+@mock.patch(pgutils.get_pygimplib_module_path() + '.pdbutils.create_image_from_metadata')
+class TestScratchImagePool(unittest.TestCase):
+  
+  def setUp(self):
+    self.procedures = collections.defaultdict(mock.Mock)
+    
+    self.pdb = mock.MagicMock()
+    self.pdb.__getitem__.side_effect = lambda name: self.procedures[name]
+    
+    self.procedures['gimp-image-is-valid'].side_effect = lambda image: image.valid
+    self.procedures['gimp-image-delete'].side_effect = (
+      lambda image: setattr(image, 'valid', False))
+    self.procedures['gimp-image-is-dirty'].return_value = False
+    self.procedures['gimp-image-get-parasite-list'].return_value = (0, [])
+    self.procedures['gimp-image-get-precision'].return_value = 150
+    self.procedures['gimp-image-get-resolution'].return_value = (72.0, 72.0)
+    self.procedures['gimp-image-get-unit'].return_value = 0
+    self.procedures['gimp-image-find-next-guide'].return_value = 0
+    self.procedures['gimp-image-find-next-sample-point'].return_value = 0
+    
+    self.src_image = _create_image()
+    
+    self.pool = pgpdbutils.ScratchImagePool(
+      max_images_per_source=2, pdb_=pgpdbutils.InstrumentedPdb(self.pdb))
+  
+  def _set_up_create_image(self, create_image_from_metadata_mock):
+    create_image_from_metadata_mock.side_effect = (
+      lambda src_image: _create_image(src_image.width, src_image.height, src_image.base_type))
+  
+  def test_acquire_creates_image(self, create_image_from_metadata_mock):
+    self._set_up_create_image(create_image_from_metadata_mock)
+    
+    image = self.pool.acquire(self.src_image)
+    
+    create_image_from_metadata_mock.assert_called_once_with(self.src_image)
+    self.assertNotEqual(image, self.pool.acquire(self.src_image))
+  
+  def test_acquire_reuses_released_image(self, create_image_from_metadata_mock):
+    self._set_up_create_image(create_image_from_metadata_mock)
+    
+    image = self.pool.acquire(self.src_image)
+    image.layers = [stubs_gimp.LayerStub('layer')]
+    layer = image.layers[0]
+    
+    self.pool.release(image)
+    
+    self.assertEqual(self.pool.acquire(self.src_image), image)
+    self.assertEqual(create_image_from_metadata_mock.call_count, 1)
+    self.procedures['gimp-image-remove-layer'].assert_called_once_with(image, layer)
+    self.procedures['gimp-selection-none'].assert_called_once_with(image)
+    self.assertFalse(self.procedures['gimp-image-delete'].called)
+  
+  def test_release_removes_guides(self, create_image_from_metadata_mock):
+    self._set_up_create_image(create_image_from_metadata_mock)
+    
+    image = self.pool.acquire(self.src_image)
+    
+    self.procedures['gimp-image-find-next-guide'].side_effect = [2, 5, 0]
+    
+    self.pool.release(image)
+    
+    self.assertListEqual(
+      self.procedures['gimp-image-delete-guide'].call_args_list,
+      [mock.call(image, 2), mock.call(image, 5)])
+    self.assertEqual(self.pool.acquire(self.src_image), image)
+  
+  def test_release_resizes_image_to_source_dimensions(self, create_image_from_metadata_mock):
+    self._set_up_create_image(create_image_from_metadata_mock)
+    
+    image = self.pool.acquire(self.src_image)
+    image.width = 20
+    
+    self.pool.release(image)
+    
+    self.procedures['gimp-image-resize'].assert_called_once_with(image, 100, 50, 0, 0)
+  
+  def test_acquire_after_source_image_changed_creates_new_image(
+        self, create_image_from_metadata_mock):
+    self._set_up_create_image(create_image_from_metadata_mock)
+    
+    image = self.pool.acquire(self.src_image)
+    self.pool.release(image)
+    
+    self.procedures['gimp-image-is-dirty'].return_value = True
+    
+    self.assertNotEqual(self.pool.acquire(self.src_image), image)
+    self.assertEqual(create_image_from_metadata_mock.call_count, 2)
+    self.assertFalse(image.valid)
+  
+  def test_release_deletes_image_modified_while_acquired(self, create_image_from_metadata_mock):
+    self._set_up_create_image(create_image_from_metadata_mock)
+    
+    image = self.pool.acquire(self.src_image)
+    image.base_type = 1
+    
+    self.pool.release(image)
+    
+    self.assertFalse(image.valid)
+    self.assertNotEqual(self.pool.acquire(self.src_image), image)
+  
+  def test_release_deletes_image_not_obtained_from_pool(self, create_image_from_metadata_mock):
+    image = _create_image()
+    
+    self.pool.release(image)
+    
+    self.assertFalse(image.valid)
+  
+  def test_release_deletes_images_exceeding_max_images_per_source(
+        self, create_image_from_metadata_mock):
+    self._set_up_create_image(create_image_from_metadata_mock)
+    
+    images = [self.pool.acquire(self.src_image) for unused_ in range(3)]
+    
+    for image in images:
+      self.pool.release(image)
+    
+    self.assertListEqual([image.valid for image in images], [True, True, False])
+  
+  def test_release_invalid_image(self, create_image_from_metadata_mock):
+    self._set_up_create_image(create_image_from_metadata_mock)
+    
+    image = self.pool.acquire(self.src_image)
+    image.valid = False
+    
+    self.pool.release(image)
+    
+    self.assertFalse(self.procedures['gimp-image-delete'].called)
+    self.assertNotEqual(self.pool.acquire(self.src_image), image)
+  
+  def test_clear(self, create_image_from_metadata_mock):
+    self._set_up_create_image(create_image_from_metadata_mock)
+    
+    images = [self.pool.acquire(self.src_image) for unused_ in range(2)]
+    acquired_image = self.pool.acquire(self.src_image)
+    
+    for image in images:
+      self.pool.release(image)
+    
+    self.pool.clear()
+    
+    self.assertListEqual([image.valid for image in images], [False, False])
+    self.assertTrue(acquired_image.valid)
+
+
+@mock.patch(
+  pgutils.get_pygimplib_module_path() + '.pdbutils.gimp.GroupLayer', new=stubs_gimp.LayerGroupStub)
+class TestLayerStager(unittest.TestCase):
+  
+  def setUp(self):
+    self.procedures = collections.defaultdict(mock.Mock)
+    
+    self.pdb = mock.MagicMock()
+    self.pdb.__getitem__.side_effect = lambda name: self.procedures[name]
+    
+    self.image = stubs_gimp.ImageStub()
+    self.image.layers = [stubs_gimp.LayerStub('top'), stubs_gimp.LayerStub('bottom')]
+    
+    self.layer = stubs_gimp.LayerStub('layer')
+    self.layer_copy = stubs_gimp.LayerStub('layer copy')
+    self.procedures['gimp-layer-new-from-drawable'].return_value = self.layer_copy
+    
+    self.layer_stager = pgpdbutils.LayerStager(self.image, pgpdbutils.InstrumentedPdb(self.pdb))
+  
+  def _get_insert_positions(self):
+    return [
+      call_args[0][3] for call_args in self.procedures['gimp-image-insert-layer'].call_args_list]
+  
+  def test_stage(self):
+    self.assertEqual(self.layer_stager.stage(self.layer), self.layer_copy)
+    
+    self.procedures['gimp-layer-new-from-drawable'].assert_called_once_with(
+      self.layer, self.image)
+    self.procedures['gimp-image-insert-layer'].assert_called_once_with(
+      self.image, self.layer_copy, None, 2)
+    self.procedures['gimp-item-set-lock-content'].assert_called_once_with(self.layer_copy, False)
+    self.procedures['gimp-layer-set-lock-alpha'].assert_called_once_with(self.layer_copy, False)
+    self.procedures['gimp-item-set-visible'].assert_called_once_with(self.layer_copy, True)
+    self.assertFalse(self.procedures['gimp-item-is-group'].called)
+  
+  def test_stage_without_removing_locks_and_setting_visible(self):
+    self.layer_stager.stage(self.layer, remove_lock_attributes=False, set_visible=False)
+    
+    self.assertFalse(self.procedures['gimp-item-set-lock-content'].called)
+    self.assertFalse(self.procedures['gimp-layer-set-lock-alpha'].called)
+    self.assertFalse(self.procedures['gimp-item-set-visible'].called)
+  
+  def test_stage_multiple_layers_keeps_track_of_number_of_layers(self):
+    self.layer_stager.stage(self.layer)
+    self.layer_stager.stage(self.layer)
+    
+    self.assertListEqual(self._get_insert_positions(), [2, 3])
+  
+  def test_stage_with_explicit_number_of_layers(self):
+    layer_stager = pgpdbutils.LayerStager(
+      self.image, pgpdbutils.InstrumentedPdb(self.pdb), num_layers=0)
+    
+    layer_stager.stage(self.layer)
+    
+    self.assertListEqual(self._get_insert_positions(), [0])
+  
+  def test_stage_into_parent(self):
+    parent = stubs_gimp.LayerGroupStub('group')
+    parent.children = [stubs_gimp.LayerStub('child')]
+    
+    self.layer_stager.stage(self.layer, parent)
+    self.layer_stager.stage(self.layer, parent, 0)
+    self.layer_stager.stage(self.layer)
+    
+    self.assertListEqual(self._get_insert_positions(), [1, 0, 2])
+  
+  def test_stage_group_into_empty_image_merges_group_directly(self):
+    group = stubs_gimp.LayerGroupStub('group')
+    merged_layer = stubs_gimp.LayerStub('merged')
+    self.procedures['gimp-image-merge-visible-layers'].return_value = merged_layer
+    
+    self.layer_stager.clear()
+    
+    with mock.patch(
+          pgutils.get_pygimplib_module_path() + '.pdbutils.merge_layer_group'
+         ) as merge_layer_group_mock:
+      self.assertEqual(self.layer_stager.stage(group), merged_layer)
+    
+    self.assertFalse(merge_layer_group_mock.called)
+    self.assertFalse(self.procedures['gimp-layer-set-lock-alpha'].called)
+  
+  def test_stage_group_into_non_empty_image_uses_merge_layer_group(self):
+    group = stubs_gimp.LayerGroupStub('group')
+    merged_layer = stubs_gimp.LayerStub('merged')
+    
+    with mock.patch(
+          pgutils.get_pygimplib_module_path() + '.pdbutils.merge_layer_group',
+          return_value=merged_layer) as merge_layer_group_mock:
+      self.assertEqual(self.layer_stager.stage(group), merged_layer)
+    
+    merge_layer_group_mock.assert_called_once_with(self.layer_copy)
+    self.assertFalse(self.procedures['gimp-image-merge-visible-layers'].called)
+  
+  def test_clear(self):
+    layers = list(self.image.layers)
+    
+    self.layer_stager.clear()
+    self.layer_stager.stage(self.layer)
+    
+    self.assertListEqual(
+      self.procedures['gimp-image-remove-layer'].call_args_list,
+      [mock.call(self.image, layer) for layer in layers])
+    self.assertListEqual(self._get_insert_positions(), [0])
+  
+  def test_invalidate(self):
+    self.layer_stager.stage(self.layer)
+    
+    self.image.layers.append(stubs_gimp.LayerStub('inserted'))
+    self.image.layers.append(stubs_gimp.LayerStub('inserted'))
+    self.layer_stager.invalidate()
+    
+    self.layer_stager.stage(self.layer)
+    
+    self.assertListEqual(self._get_insert_positions(), [2, 4])
+
+
+class TestInstrumentedPdb(unittest.TestCase):
+  
+  def setUp(self):
+    self.procedures = collections.defaultdict(mock.Mock)
+    
+    self.pdb = mock.MagicMock()
+    self.pdb.__getitem__.side_effect = lambda name: self.procedures[name]
+    
+    self.group = 'resize'
+    
+    self.instrumented_pdb = pgpdbutils.InstrumentedPdb(self.pdb, lambda: self.group)
+  
+  def test_calls_are_recorded_per_group_and_procedure(self):
+    self.procedures['gimp-drawable-width'].return_value = 10
+    
+    self.assertEqual(self.instrumented_pdb.gimp_drawable_width('layer'), 10)
+    self.instrumented_pdb['gimp-drawable-width']('layer')
+    self.instrumented_pdb.gimp_item_set_visible('layer', False)
+    
+    self.group = 'export'
+    self.instrumented_pdb.gimp_drawable_width('layer')
+    
+    self.procedures['gimp-drawable-width'].assert_called_with('layer')
+    self.assertEqual(
+      [(entry.group, entry.procedure_name, entry.num_calls)
+       for entry in self.instrumented_pdb.entries],
+      [('resize', 'gimp-drawable-width', 2),
+       ('resize', 'gimp-item-set-visible', 1),
+       ('export', 'gimp-drawable-width', 1)])
+    self.assertEqual(self.instrumented_pdb.num_calls, 4)
+  
+  def test_call_is_recorded_if_exception_is_raised(self):
+    self.procedures['gimp-item-set-visible'].side_effect = RuntimeError
+    
+    with self.assertRaises(RuntimeError):
+      self.instrumented_pdb.gimp_item_set_visible('layer', False)
+    
+    self.assertEqual(self.instrumented_pdb.num_calls, 1)
+  
+  def test_add_fills_latency_histogram(self):
+    self.instrumented_pdb.add('resize', 'gimp-layer-scale', 5e-6)
+    self.instrumented_pdb.add('resize', 'gimp-layer-scale', 5e-3)
+    self.instrumented_pdb.add('resize', 'gimp-layer-scale', 2.0)
+    
+    self.assertListEqual(
+      self.instrumented_pdb.entries,
+      [pgpdbutils.PdbCallEntry(
+        'resize', 'gimp-layer-scale', 3, 5e-6 + 5e-3 + 2.0, [1, 0, 0, 1, 0, 0, 1])])
+  
+  def test_get_slowest_procedures(self):
+    self.instrumented_pdb.add('resize', 'gimp-layer-scale', 1.0)
+    self.instrumented_pdb.add('export', 'gimp-layer-scale', 1.0)
+    self.instrumented_pdb.add('export', 'gimp-file-save', 1.5)
+    self.instrumented_pdb.add('export', 'gimp-item-is-valid', 0.25)
+    
+    slowest_procedures = self.instrumented_pdb.get_slowest_procedures(2)
+    
+    self.assertListEqual(
+      [(entry.group, entry.procedure_name, entry.num_calls, entry.total_time)
+       for entry in slowest_procedures],
+      [(None, 'gimp-layer-scale', 2, 2.0), (None, 'gimp-file-save', 1, 1.5)])
+  
+  def test_measure(self):
+    with self.instrumented_pdb.measure('file-save'):
+      pass
+    
+    self.assertEqual(
+      [(entry.group, entry.procedure_name, entry.num_calls)
+       for entry in self.instrumented_pdb.entries],
+      [('resize', 'file-save', 1)])
+  
+  def test_get_report(self):
+    self.instrumented_pdb.add('resize', 'gimp-layer-scale', 1.0)
+    self.instrumented_pdb.add(None, 'gimp-layer-scale', 1.0)
+    
+    report = self.instrumented_pdb.get_report(num_items=4)
+    
+    self.assertIn('PDB calls: 2', report)
+    self.assertIn('calls per item: 0.5', report)
+    self.assertIn('gimp-layer-scale', report)
+  
+  def test_get_report_without_items(self):
+    self.instrumented_pdb.add('resize', 'gimp-layer-scale', 1.0)
+    
+    report = self.instrumented_pdb.get_report(num_items=0)
+    
+    self.assertIn('Items: 0, calls per item: -', report)
+  
+  def test_clear(self):
+    self.instrumented_pdb.gimp_drawable_width('layer')
+    
+    self.instrumented_pdb.clear()
+    
+    self.assertListEqual(self.instrumented_pdb.entries, [])
+    self.assertEqual(self.instrumented_pdb.num_calls, 0)
+  
+  def test_procedure_attributes_are_accessible(self):
+    self.procedures['gimp-item-is-valid'].proc_name = 'gimp-item-is-valid'
+    
+    self.assertEqual(self.instrumented_pdb.gimp_item_is_valid.proc_name, 'gimp-item-is-valid')
+  
+  def test_cached_pdb_on_top_of_instrumented_pdb_records_cache_misses_only(self):
+    with mock.patch(
+          pgutils.get_pygimplib_module_path() + '.pdbutils.gimp.Item', new=stubs_gimp.ItemStub):
+      cached_pdb = pgpdbutils.CachedPdb(self.instrumented_pdb)
+      layer = stubs_gimp.LayerStub('layer')
+      
+      cached_pdb.gimp_drawable_width(layer)
+      cached_pdb.gimp_drawable_width(layer)
+    
+    self.assertEqual(self.instrumented_pdb.num_calls, 1)
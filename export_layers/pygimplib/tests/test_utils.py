@@ -86,3 +86,85 @@ class TestGetCurrentModuleFilepath(unittest.TestCase):
     self.assertEqual(
       pgutils.get_current_module_filepath(),
       inspect.getfile(inspect.currentframe()))
+
+
+class TestLruCache(unittest.TestCase):
+  
+  def setUp(self):
+    self.cache = pgutils.LruCache(10, get_size=len)
+  
+  def test_get(self):
+    self.cache.add('a', 'aaa')
+    
+    self.assertEqual(self.cache.get('a'), 'aaa')
+    self.assertEqual(self.cache.get('b'), None)
+    self.assertEqual(self.cache.get('b', 'default'), 'default')
+    
+    self.assertEqual(self.cache.num_hits, 1)
+    self.assertEqual(self.cache.num_misses, 2)
+  
+  def test_add_replaces_existing_value(self):
+    self.cache.add('a', 'aaa')
+    self.cache.add('a', 'aaaaa')
+    
+    self.assertEqual(self.cache.get('a'), 'aaaaa')
+    self.assertEqual(len(self.cache), 1)
+    self.assertEqual(self.cache.size, 5)
+  
+  def test_add_discards_least_recently_used_entries(self):
+    self.cache.add('a', 'aaa')
+    self.cache.add('b', 'bbb')
+    self.cache.add('c', 'ccc')
+    
+    self.cache.get('a')
+    
+    self.cache.add('d', 'dddd')
+    
+    self.assertIn('a', self.cache)
+    self.assertNotIn('b', self.cache)
+    self.assertIn('c', self.cache)
+    self.assertIn('d', self.cache)
+    self.assertEqual(self.cache.size, 10)
+  
+  def test_add_value_larger_than_max_size(self):
+    self.cache.add('a', 'aaa')
+    self.cache.add('b', 'b' * 11)
+    
+    self.assertIn('a', self.cache)
+    self.assertNotIn('b', self.cache)
+    self.assertEqual(self.cache.size, 3)
+  
+  def test_default_size_limits_number_of_entries(self):
+    cache = pgutils.LruCache(2)
+    
+    cache.add('a', 'aaa')
+    cache.add('b', 'bbb')
+    cache.add('c', 'ccc')
+    
+    self.assertNotIn('a', cache)
+    self.assertEqual(len(cache), 2)
+  
+  def test_set_max_size(self):
+    self.cache.add('a', 'aaa')
+    self.cache.add('b', 'bbb')
+    
+    self.cache.max_size = 4
+    
+    self.assertNotIn('a', self.cache)
+    self.assertIn('b', self.cache)
+    self.assertEqual(self.cache.size, 3)
+  
+  def test_remove_and_clear(self):
+    self.cache.add('a', 'aaa')
+    self.cache.add('b', 'bbb')
+    
+    self.cache.remove('a')
+    self.cache.remove('nonexistent')
+    
+    self.assertNotIn('a', self.cache)
+    self.assertEqual(self.cache.size, 3)
+    
+    self.cache.clear()
+    
+    self.assertEqual(len(self.cache), 0)
+    self.assertEqual(self.cache.size, 0)
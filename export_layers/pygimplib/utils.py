@@ -5,6 +5,7 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 from future.builtins import *
 
+import collections
 import inspect
 
 from . import constants as pgconstants
@@ -40,6 +41,118 @@ class EmptyContext(object):
 empty_context = EmptyContext()
 
 
+class LruCache(object):
+  """Cache discarding the least recently used entries once the total size of
+  entries exceeds `max_size`.
+  
+  The size of each entry is obtained by calling `get_size` with the cached
+  value as its only argument. If `get_size` is `None`, each entry has a size of
+  1, i.e. `max_size` limits the number of entries.
+  
+  The number of successful and unsuccessful lookups via `get()` is recorded in
+  `num_hits` and `num_misses`, respectively.
+  """
+  
+  def __init__(self, max_size, get_size=None):
+    self._max_size = max_size
+    self._get_size = get_size if get_size is not None else create_empty_func(return_value=1)
+    
+    # key: cache key
+    # value: (cached value, size)
+    # Entries are ordered from the least recently used to the most recently used.
+    self._entries = collections.OrderedDict()
+    self._size = 0
+    
+    self._num_hits = 0
+    self._num_misses = 0
+  
+  @property
+  def max_size(self):
+    """Maximum total size of cached entries. Assigning a smaller value discards
+    least recently used entries exceeding the new maximum size.
+    """
+    return self._max_size
+  
+  @max_size.setter
+  def max_size(self, value):
+    self._max_size = value
+    self._discard_least_recently_used_entries()
+  
+  @property
+  def size(self):
+    """Total size of cached entries."""
+    return self._size
+  
+  @property
+  def num_hits(self):
+    return self._num_hits
+  
+  @property
+  def num_misses(self):
+    return self._num_misses
+  
+  def __len__(self):
+    return len(self._entries)
+  
+  def __contains__(self, key):
+    """Returns `True` if `key` is cached, `False` otherwise.
+    
+    Unlike `get()`, this method does not mark the entry as recently used and
+    does not affect `num_hits` and `num_misses`.
+    """
+    return key in self._entries
+  
+  def get(self, key, default=None):
+    """Returns the value cached for `key`, or `default` if `key` is not cached.
+    
+    The entry for `key` becomes the most recently used one.
+    """
+    try:
+      entry = self._entries.pop(key)
+    except KeyError:
+      self._num_misses += 1
+      return default
+    
+    self._entries[key] = entry
+    self._num_hits += 1
+    
+    return entry[0]
+  
+  def add(self, key, value):
+    """Caches `value` for `key`, replacing the existing value for `key`.
+    
+    Least recently used entries are discarded if the total size would exceed
+    `max_size`. If the size of `value` alone exceeds `max_size`, `value` is not
+    cached.
+    """
+    self.remove(key)
+    
+    size = self._get_size(value)
+    if size > self._max_size:
+      return
+    
+    self._entries[key] = (value, size)
+    self._size += size
+    
+    self._discard_least_recently_used_entries()
+  
+  def remove(self, key):
+    """Removes the entry for `key` if it exists."""
+    entry = self._entries.pop(key, None)
+    if entry is not None:
+      self._size -= entry[1]
+  
+  def clear(self):
+    """Removes all entries. `num_hits` and `num_misses` are preserved."""
+    self._entries.clear()
+    self._size = 0
+  
+  def _discard_least_recently_used_entries(self):
+    while self._size > self._max_size and self._entries:
+      unused_, (unused_, size) = self._entries.popitem(last=False)
+      self._size -= size
+
+
 def empty_func(*args, **kwargs):
   """
   Use this function when an empty function is desired to be passed as a
@@ -12,6 +12,7 @@ import collections
 import datetime
 import re
 import string
+import types
 
 from export_layers import pygimplib as pg
 
@@ -19,17 +20,123 @@ from export_layers import actions
 
 
 class ItemRenamer(object):
+  """Class renaming items according to a pattern containing fields.
+  
+  The pattern is compiled into a sequence of literal chunks and fields with
+  preprocessed arguments (e.g. precompiled regular expressions). Compiled
+  patterns are cached by the pattern string, hence creating renamers repeatedly
+  for the same pattern (e.g. on each `Batcher.run()`) does not parse the
+  pattern again.
+  
+  Fields keeping state (such as numbering) are instantiated for each renamer.
+  """
   
   def __init__(self, pattern, fields_raw=None):
-    self._filename_pattern = pg.path.StringPattern(
-      pattern=pattern,
-      fields=_get_fields_and_substitute_funcs(_init_fields(fields_raw)))
+    if fields_raw is None:
+      fields_raw = _FIELDS_LIST
+    
+    self._pattern = pattern
+    
+    fields = _init_fields(fields_raw)
+    fields_by_regex = {field.regex: field for field in fields}
+    
+    self._parts = tuple(
+      (literal,
+       fields_by_regex[field_regex].compiled_substitute_func if field_regex is not None else None,
+       field_args)
+      for literal, field_regex, field_args in _get_compiled_pattern(pattern, fields_raw, fields))
+  
+  @property
+  def pattern(self):
+    return self._pattern
   
   def rename(self, batcher, item=None):
     if item is None:
       item = batcher.current_item
     
-    return self._filename_pattern.substitute(batcher, item)
+    processed_parts = []
+    
+    for literal, substitute_func, field_args in self._parts:
+      if substitute_func is None:
+        processed_parts.append(literal)
+      else:
+        try:
+          processed_parts.append(str(substitute_func(batcher, item, *field_args)))
+        except Exception:
+          processed_parts.append(literal)
+    
+    return ''.join(processed_parts)
+
+
+_COMPILED_PATTERNS_MAX_COUNT = 256
+
+# key: (pattern, fields_raw key)
+# value: tuple of (literal, field regex or None, compiled field arguments)
+_compiled_patterns = collections.OrderedDict()
+
+
+def _get_compiled_pattern(pattern, fields_raw, fields):
+  key = (
+    pattern,
+    tuple(
+      (field_raw['type'], field_raw['regex'], field_raw.get('substitute_func'))
+      for field_raw in fields_raw))
+  
+  try:
+    return _compiled_patterns[key]
+  except KeyError:
+    pass
+  
+  compiled_pattern = _compile_pattern(pattern, fields)
+  
+  if len(_compiled_patterns) >= _COMPILED_PATTERNS_MAX_COUNT:
+    _compiled_patterns.popitem(last=False)
+  
+  _compiled_patterns[key] = compiled_pattern
+  
+  return compiled_pattern
+
+
+def _compile_pattern(pattern, fields):
+  """Parses `pattern` and returns a tuple of
+  `(literal, field regex, compiled field arguments)` tuples.
+  
+  For literal chunks, `field regex` is `None`. For fields, `literal` is the
+  original field string used if the substitution fails. Fields whose arguments
+  cannot be compiled are turned into literal chunks.
+  """
+  fields_by_regex = {field.regex: field for field in fields}
+  
+  pattern_parts, unused_, parsed_fields_and_matching_regexes = (
+    pg.path.StringPattern.parse_pattern(pattern, _get_fields_and_substitute_funcs(fields)))
+  
+  compiled_parts = []
+  
+  def _add_literal(literal):
+    if not literal:
+      return
+    
+    if compiled_parts and compiled_parts[-1][1] is None:
+      compiled_parts[-1] = (compiled_parts[-1][0] + literal, None, ())
+    else:
+      compiled_parts.append((literal, None, ()))
+  
+  for part in pattern_parts:
+    if isinstance(part, types.StringTypes):
+      _add_literal(part)
+      continue
+    
+    field_name, field_args, field_str = part[:3]
+    field_regex = parsed_fields_and_matching_regexes[field_name]
+    
+    try:
+      compiled_field_args = fields_by_regex[field_regex].compile_args(field_name, field_args)
+    except Exception:
+      _add_literal('[{}]'.format(field_str))
+    else:
+      compiled_parts.append(('[{}]'.format(field_str), field_regex, compiled_field_args))
+  
+  return tuple(compiled_parts)
 
 
 def _get_fields_and_substitute_funcs(fields):
@@ -125,6 +232,23 @@ class Field(object):
   @property
   def examples(self):
     return _get_formatted_examples(self._examples_lines)
+  
+  @property
+  def compiled_substitute_func(self):
+    """Function substituting the field, accepting the batcher, the item and the
+    arguments returned by `compile_args()`.
+    """
+    return self._substitute_func
+  
+  def compile_args(self, field_name, field_args):
+    """Returns a tuple of arguments passed to `compiled_substitute_func` after
+    the batcher and the item.
+    
+    Subclasses may override this method to process field arguments once per
+    pattern rather than once per item. Any exception raised here causes the
+    field to be left unsubstituted.
+    """
+    return (field_name,) + tuple(field_args)
 
 
 class NumberField(Field):
@@ -164,12 +288,16 @@ class NumberField(Field):
       yield str_i
       i += increment
   
-  def _get_number(self, batcher, item, field_value, *args):
+  @property
+  def compiled_substitute_func(self):
+    return self._get_number_with_compiled_args
+  
+  def compile_args(self, field_name, field_args):
     reset_numbering_on_parent = True
     ascending = True
     padding = None
     
-    for arg in args:
+    for arg in field_args:
       if arg == '%n':
         reset_numbering_on_parent = False
       elif arg.startswith('%d'):
@@ -179,6 +307,14 @@ class NumberField(Field):
         except ValueError:
           pass
     
+    return field_name, reset_numbering_on_parent, ascending, padding
+  
+  def _get_number(self, batcher, item, field_value, *args):
+    return self._get_number_with_compiled_args(
+      batcher, item, *self.compile_args(field_value, args))
+  
+  def _get_number_with_compiled_args(
+        self, batcher, item, field_value, reset_numbering_on_parent, ascending, padding):
     if reset_numbering_on_parent:
       parent_item = item.parent if item.parent is not None else None
       parent_id = parent_item.raw.ID if parent_item is not None else None
@@ -193,13 +329,7 @@ class NumberField(Field):
       
       if initial_number == 0 and not ascending:
         if reset_numbering_on_parent:
-          if parent_item is not None:
-            initial_number = len([
-              tree_item for tree_item in batcher.item_tree
-              if tree_item.depth == parent_item.depth + 1 and tree_item.parent == parent_item])
-          else:
-            initial_number = len(
-              [tree_item for tree_item in batcher.item_tree if tree_item.depth == 0])
+          initial_number = batcher.item_tree.get_num_items_per_parent().get(parent_item, 0)
         else:
           initial_number = len(batcher.item_tree)
       
@@ -209,6 +339,16 @@ class NumberField(Field):
     return next(self._global_number_generators[field_value][parent_id])
 
 
+class ReplaceField(Field):
+  
+  @property
+  def compiled_substitute_func(self):
+    return _replace_with_compiled_args
+  
+  def compile_args(self, field_name, field_args):
+    return _compile_replace_args(*field_args)
+
+
 class _PercentTemplate(string.Template):
   
   delimiter = '%'
@@ -325,12 +465,16 @@ def _get_attributes(batcher, item, field_value, pattern, measure='%px'):
   
   layer_fields = {}
   
+  width = batcher.pdb.gimp_drawable_width(item.raw)
+  height = batcher.pdb.gimp_drawable_height(item.raw)
+  offsets = batcher.pdb.gimp_drawable_offsets(item.raw)
+  
   if measure == '%px':
     layer_fields = {
-      'w': item.raw.width,
-      'h': item.raw.height,
-      'x': item.raw.offsets[0],
-      'y': item.raw.offsets[1],
+      'w': width,
+      'h': height,
+      'x': offsets[0],
+      'y': offsets[1],
     }
   elif measure.startswith('%pc'):
     match = re.match(r'^' + re.escape('%pc') + r'([0-9]*)$', measure)
@@ -342,10 +486,10 @@ def _get_attributes(batcher, item, field_value, pattern, measure='%px'):
         round_digits = 2
       
       layer_fields = {
-        'w': round(item.raw.width / image.width, round_digits),
-        'h': round(item.raw.height / image.height, round_digits),
-        'x': round(item.raw.offsets[0] / image.width, round_digits),
-        'y': round(item.raw.offsets[1] / image.height, round_digits),
+        'w': round(width / image.width, round_digits),
+        'h': round(height / image.height, round_digits),
+        'x': round(offsets[0] / image.width, round_digits),
+        'y': round(offsets[1] / image.height, round_digits),
       }
   
   fields.update(layer_fields)
@@ -355,14 +499,19 @@ def _get_attributes(batcher, item, field_value, pattern, measure='%px'):
 
 def _replace(
       batcher, item, field_value, field_to_replace_str, pattern, replacement, *count_and_flags):
+  return _replace_with_compiled_args(
+    batcher,
+    item,
+    *_compile_replace_args(field_to_replace_str, pattern, replacement, *count_and_flags))
+
+
+def _compile_replace_args(field_to_replace_str, pattern, replacement, *count_and_flags):
   field_name, field_args = pg.path.StringPattern.parse_field(field_to_replace_str)
   
   try:
     field_func = FIELDS[field_name]['substitute_func']
   except KeyError:
-    return ''
-  
-  str_to_process = field_func(batcher, item, field_name, *field_args)
+    return None, (), None, replacement, 0
   
   count = 0
   flags = 0
@@ -376,7 +525,15 @@ def _replace(
   for flag_name in count_and_flags[1:]:
     flags |= getattr(re, flag_name.upper())
   
-  return re.sub(pattern, replacement, str_to_process, count=count, flags=flags)
+  return (
+    field_func, (field_name,) + tuple(field_args), re.compile(pattern, flags), replacement, count)
+
+
+def _replace_with_compiled_args(batcher, item, field_func, field_args, regex, replacement, count):
+  if field_func is None:
+    return ''
+  
+  return regex.sub(replacement, field_func(batcher, item, *field_args), count=count)
 
 
 _FIELDS_LIST = [
@@ -444,7 +601,7 @@ _FIELDS_LIST = [
     ],
   },
   {
-    'type': Field,
+    'type': ReplaceField,
     'regex': 'replace',
     'substitute_func': _replace,
     'display_name': _('Replace'),
@@ -0,0 +1,487 @@
+# -*- coding: utf-8 -*-
+
+"""Splitting batch processing of a single image into shards processed in
+parallel by separate GIMP instances (workers).
+
+Item names are processed for all items before splitting so that the output
+names are identical to the names obtained by processing all items in a single
+run.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import collections
+import contextlib
+import distutils.spawn
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import traceback
+
+import gimp
+from gimp import pdb
+
+from export_layers import pygimplib as pg
+
+from export_layers import actions
+from export_layers import exceptions
+from export_layers import export as export_
+
+
+SHARD_PROCEDURE_NAME = 'plug-in-export-layers-shard'
+
+DEFAULT_TIMEOUT_SECONDS = 3600
+"""Default time limit for all workers to finish in `run()`."""
+
+FAILED_WORKER_ACTION_NAME = 'shard_worker'
+"""Key in `Batcher.failed_procedures` under which items of workers killed
+before finishing are reported.
+"""
+
+_IMAGE_FILENAME = 'image.xcf'
+_SHARD_FILENAME_PATTERN = 'shard_{}.json'
+_RESULT_FILENAME_PATTERN = 'result_{}.json'
+
+_WORKER_POLL_INTERVAL_SECONDS = 0.1
+
+_ACTION_RESULT_NAMES = [
+  'skipped_procedures', 'skipped_constraints', 'failed_procedures', 'failed_constraints']
+
+
+def run(
+      batcher,
+      config_filepath,
+      num_workers=None,
+      gimp_executable=None,
+      timeout_seconds=DEFAULT_TIMEOUT_SECONDS,
+      **kwargs):
+  """Batch-processes items in `batcher.input_image` split into shards, each
+  processed in a separate GIMP instance.
+  
+  `config_filepath` is the path to the configuration file containing settings
+  that the workers load. The file must correspond to the settings `batcher` was
+  created with.
+  
+  `num_workers` is the number of GIMP instances to start. If `None`, the number
+  of CPUs is used.
+  
+  `gimp_executable` is the path to the GIMP executable to start workers with.
+  If `None`, the GIMP console executable is looked up in the system path.
+  
+  `timeout_seconds` is the time limit for all workers to finish. Workers
+  running after the time limit are killed. If `None`, there is no time limit.
+  
+  `**kwargs` are passed to `Batcher.run()`.
+  
+  Results from the workers (exported items, skipped and failed actions) are
+  merged into `batcher`. Items of killed workers are reported in
+  `batcher.failed_procedures` under `FAILED_WORKER_ACTION_NAME`.
+  
+  If `num_workers` is 1 or the current settings cannot be processed in shards
+  (e.g. batch editing or exporting multiple layers into one image), all items
+  are processed by `batcher` directly.
+  
+  If any of the workers fails or times out, `exceptions.BatcherError` is raised
+  after all workers finish or are killed. If `batcher.stop()` is called while
+  waiting for the workers, the remaining workers are killed and
+  `exceptions.BatcherCancelError` is raised.
+  """
+  if num_workers is None:
+    num_workers = multiprocessing.cpu_count()
+  
+  if num_workers <= 1 or not can_run_in_shards(batcher, **kwargs):
+    batcher.run(**kwargs)
+    return
+  
+  resolved_names, item_names = resolve_names(batcher, **kwargs)
+  
+  shards = split_into_shards(item_names, num_workers)
+  if len(shards) <= 1:
+    batcher.run(**kwargs)
+    return
+  
+  if gimp_executable is None:
+    gimp_executable = get_gimp_console_executable()
+  
+  temp_dirpath = tempfile.mkdtemp(prefix='export_layers_shards_')
+  
+  try:
+    image_filepath = os.path.join(temp_dirpath, _IMAGE_FILENAME)
+    _save_image_copy(batcher.input_image, image_filepath)
+    
+    result_filepaths = []
+    processes = []
+    
+    for shard_index, shard in enumerate(shards):
+      shard_filepath = os.path.join(temp_dirpath, _SHARD_FILENAME_PATTERN.format(shard_index))
+      result_filepath = os.path.join(temp_dirpath, _RESULT_FILENAME_PATTERN.format(shard_index))
+      
+      write_shard_file(shard_filepath, shard, resolved_names, result_filepath)
+      result_filepaths.append(result_filepath)
+      
+      processes.append(
+        subprocess.Popen(
+          get_worker_command(gimp_executable, image_filepath, config_filepath, shard_filepath)))
+    
+    batcher.progress_updater.reset()
+    batcher.progress_updater.num_total_tasks = len(processes)
+    
+    killed_process_indexes = _wait_for_workers(batcher, processes, timeout_seconds)
+    
+    if batcher.should_stop:
+      killed_worker_message = 'worker was stopped by user'
+    else:
+      killed_worker_message = 'worker did not finish within {} seconds'.format(timeout_seconds)
+    
+    errors = merge_results(
+      batcher,
+      [result_filepath for index, result_filepath in enumerate(result_filepaths)
+       if index not in killed_process_indexes],
+      [(shards[index], killed_worker_message) for index in killed_process_indexes])
+  finally:
+    shutil.rmtree(temp_dirpath, ignore_errors=True)
+  
+  if killed_process_indexes and batcher.should_stop:
+    raise exceptions.BatcherCancelError('stopped by user')
+  
+  if errors:
+    raise exceptions.BatcherError('\n\n'.join(errors))
+
+
+def run_shard(batcher, shard_filepath, **kwargs):
+  """Batch-processes items from the shard specified in `shard_filepath` and
+  saves the results to the result file specified in the shard file.
+  
+  This function is supposed to be invoked by a worker (a separate GIMP
+  instance) started by `run()`. Items are matched by their original names as
+  item IDs differ in each GIMP instance. Constraints are not applied as items
+  were already filtered before the shard was created.
+  """
+  shard = read_shard_file(shard_filepath)
+  shard_item_names = set(shard['items'])
+  
+  batcher.add_constraint(
+    _is_item_in_shard, groups=[actions.DEFAULT_CONSTRAINTS_GROUP], args=[shard_item_names])
+  
+  error = None
+  
+  try:
+    with _override_settings(
+           [(constraint['enabled'], False) for constraint in actions.walk(batcher.constraints)]):
+      batcher.run(resolved_names=shard['resolved_names'], **kwargs)
+  except Exception:
+    error = traceback.format_exc()
+  finally:
+    _write_json(shard['result_filepath'], _get_batcher_result(batcher, error))
+
+
+def can_run_in_shards(batcher, **kwargs):
+  """Returns `True` if items can be processed independently of each other by
+  separate `Batcher` instances, `False` otherwise.
+  """
+  if kwargs.get('edit_mode', batcher.edit_mode):
+    return False
+  
+  for procedure in actions.walk(kwargs.get('procedures', batcher.procedures)):
+    if (procedure['orig_name'].value == 'export' and procedure['enabled'].value
+        and procedure['arguments/export_mode'].value != export_.ExportModes.EACH_LAYER):
+      return False
+  
+  return True
+
+
+def resolve_names(batcher, **kwargs):
+  """Processes names of items in `batcher.input_image` without processing
+  their contents.
+  
+  Two values are returned:
+  * dictionary of processed names suitable for `Batcher.resolved_names`,
+  * list of original names of items to be processed, in the order of
+    processing.
+  
+  Constraints and procedures are applied as in a regular run, regardless of
+  whether they are enabled for previews.
+  """
+  procedures = kwargs.get('procedures', batcher.procedures)
+  constraints = kwargs.get('constraints', batcher.constraints)
+  
+  settings_to_override = [
+    (action['enabled_for_previews'], True)
+    for action in list(actions.walk(procedures)) + list(actions.walk(constraints))]
+  settings_to_override.extend(
+    (procedure['arguments/preserve_layer_name_after_export'], False)
+    for procedure in actions.walk(procedures) if procedure['orig_name'].value == 'export')
+  
+  name_kwargs = dict(kwargs)
+  name_kwargs.update(
+    is_preview=True, process_contents=False, process_names=True, process_export=False)
+  
+  with _override_settings(settings_to_override):
+    batcher.run(**name_kwargs)
+  
+  resolved_names = {'items': {}, 'folders': {}}
+  item_names = []
+  
+  for item in batcher.item_tree:
+    item_names.append(item.orig_name)
+    resolved_names['items'][item.orig_name] = item.name
+    for parent in item.parents:
+      resolved_names['folders'][parent.orig_name] = parent.name
+  
+  batcher.item_tree.reset_all()
+  
+  return _get_resolved_names_for_batcher(resolved_names), item_names
+
+
+def split_into_shards(item_names, num_shards):
+  """Splits `item_names` into at most `num_shards` contiguous lists of nearly
+  equal length.
+  
+  Items in the same folder thus tend to end up in the same shard.
+  """
+  num_shards = max(min(num_shards, len(item_names)), 1)
+  shard_size, num_larger_shards = divmod(len(item_names), num_shards)
+  
+  shards = []
+  start = 0
+  for shard_index in range(num_shards):
+    end = start + shard_size + (1 if shard_index < num_larger_shards else 0)
+    shards.append(item_names[start:end])
+    start = end
+  
+  return [shard for shard in shards if shard]
+
+
+def merge_results(batcher, result_filepaths, killed_worker_shards=None):
+  """Merges results saved by workers into `batcher`, replacing results from
+  the previous run of `batcher`.
+  
+  `killed_worker_shards` is a list of (list of original item names, message)
+  pairs for workers killed before finishing. Their items are reported in
+  `batcher.failed_procedures` under `FAILED_WORKER_ACTION_NAME`.
+  
+  Returns a list of error messages from workers that failed.
+  """
+  errors = []
+  
+  results = {
+    'exported_raw_items': [],
+    'unchanged_raw_items': [],
+  }
+  for attr_name in _ACTION_RESULT_NAMES:
+    results[attr_name] = collections.defaultdict(list)
+  
+  for result_filepath in result_filepaths:
+    try:
+      result = _read_json(result_filepath)
+    except (IOError, OSError, ValueError) as e:
+      errors.append('could not read result file "{}": {}'.format(result_filepath, e))
+      continue
+    
+    for item_name in result['exported_items']:
+      results['exported_raw_items'].append(batcher.item_tree[item_name].raw)
+    
+    for item_name in result['unchanged_items']:
+      results['unchanged_raw_items'].append(batcher.item_tree[item_name].raw)
+    
+    for attr_name in _ACTION_RESULT_NAMES:
+      for action_name, entries in result[attr_name].items():
+        for entry in entries:
+          item = batcher.item_tree[entry[0]] if entry[0] is not None else None
+          results[attr_name][action_name].append(tuple([item] + entry[1:]))
+    
+    if result['error'] is not None:
+      errors.append(result['error'])
+  
+  for item_names, message in (killed_worker_shards or []):
+    for item_name in item_names:
+      results['failed_procedures'][FAILED_WORKER_ACTION_NAME].append(
+        (batcher.item_tree[item_name], message, None))
+    
+    errors.append('{}: {}'.format(message, ', '.join(item_names)))
+  
+  batcher.set_results(**results)
+  
+  return errors
+
+
+def write_shard_file(filepath, item_names, resolved_names, result_filepath):
+  _write_json(filepath, {
+    'items': item_names,
+    'resolved_names': {
+      'items': {
+        key: name for key, name in resolved_names.items() if not isinstance(key, tuple)},
+      'folders': {
+        key[0]: name for key, name in resolved_names.items() if isinstance(key, tuple)},
+    },
+    'result_filepath': result_filepath,
+  })
+
+
+def read_shard_file(filepath):
+  shard = _read_json(filepath)
+  shard['resolved_names'] = _get_resolved_names_for_batcher(shard['resolved_names'])
+  return shard
+
+
+def get_worker_command(gimp_executable, image_filepath, config_filepath, shard_filepath):
+  """Returns a list of command-line arguments starting a GIMP instance without
+  GUI that processes the shard specified in `shard_filepath`.
+  """
+  script = (
+    '(let* ((image (car (gimp-xcf-load 0 "{image}" "{image}"))))'
+    ' ({procedure} RUN-NONINTERACTIVE image "{config}" "{shard}")'
+    ' (gimp-image-delete image))').format(
+      image=_escape_script_fu_string(image_filepath),
+      procedure=SHARD_PROCEDURE_NAME,
+      config=_escape_script_fu_string(config_filepath),
+      shard=_escape_script_fu_string(shard_filepath))
+  
+  return [
+    gimp_executable,
+    '--no-interface',
+    '--batch-interpreter', 'plug-in-script-fu-eval',
+    '--batch', script,
+    '--batch', '(gimp-quit 0)',
+  ]
+
+
+def get_gimp_console_executable():
+  """Returns the path to the GIMP executable without GUI found in the system
+  path, or `'gimp-console'` if not found.
+  """
+  major_minor_version = '{}.{}'.format(*gimp.version[:2])
+  
+  for executable_name in [
+        'gimp-console-' + major_minor_version,
+        'gimp-console',
+        'gimp-' + major_minor_version,
+        'gimp']:
+    executable_path = distutils.spawn.find_executable(executable_name)
+    if executable_path is not None:
+      return executable_path
+  
+  return 'gimp-console'
+
+
+def _wait_for_workers(batcher, processes, timeout_seconds):
+  """Waits until all `processes` finish.
+  
+  If the processes do not finish within `timeout_seconds` or if
+  `batcher.stop()` is called, the remaining processes are killed.
+  
+  Returns a list of indexes of killed processes.
+  """
+  if timeout_seconds is not None:
+    deadline = time.time() + timeout_seconds
+  else:
+    deadline = None
+  
+  running_process_indexes = list(range(len(processes)))
+  
+  while True:
+    for index in list(running_process_indexes):
+      if processes[index].poll() is not None:
+        running_process_indexes.remove(index)
+        batcher.progress_updater.update_tasks()
+    
+    if not running_process_indexes:
+      return []
+    
+    if batcher.should_stop or (deadline is not None and time.time() >= deadline):
+      for index in running_process_indexes:
+        _kill_process(processes[index])
+      
+      return running_process_indexes
+    
+    # This also allows the GUI to respond (e.g. to the user stopping the run).
+    batcher.progress_updater.update_text(
+      _('Waiting for {} of {} workers to finish').format(
+        len(running_process_indexes), len(processes)))
+    
+    time.sleep(_WORKER_POLL_INTERVAL_SECONDS)
+
+
+def _kill_process(process):
+  try:
+    process.kill()
+  except OSError:
+    # The process has already finished.
+    pass
+  
+  process.wait()
+
+
+def _is_item_in_shard(item, shard_item_names):
+  return item.orig_name in shard_item_names
+
+
+def _get_resolved_names_for_batcher(resolved_names):
+  names = dict(resolved_names['items'])
+  names.update(
+    ((folder_name, pg.itemtree.FOLDER_KEY), name)
+    for folder_name, name in resolved_names['folders'].items())
+  return names
+
+
+def _get_batcher_result(batcher, error):
+  result = {
+    'exported_items': [
+      batcher.item_tree[raw_item.ID].orig_name for raw_item in batcher.exported_raw_items],
+    'unchanged_items': [
+      batcher.item_tree[raw_item.ID].orig_name for raw_item in batcher.unchanged_raw_items],
+    'error': error,
+  }
+  
+  for attr_name in _ACTION_RESULT_NAMES:
+    result[attr_name] = {
+      action_name: [
+        [entry[0].orig_name if entry[0] is not None else None] + list(entry[1:])
+        for entry in entries]
+      for action_name, entries in getattr(batcher, attr_name).items()}
+  
+  return result
+
+
+def _save_image_copy(image, filepath):
+  image_copy = pdb.gimp_image_duplicate(image)
+  try:
+    pdb.gimp_xcf_save(
+      0, image_copy, None, pg.utils.safe_encode_gimp(filepath), pg.utils.safe_encode_gimp(filepath))
+  finally:
+    pdb.gimp_image_delete(image_copy)
+
+
+@contextlib.contextmanager
+def _override_settings(settings_and_values):
+  orig_values = [(setting, setting.value) for setting, unused_ in settings_and_values]
+  
+  for setting, value in settings_and_values:
+    setting.set_value(value)
+  
+  try:
+    yield
+  finally:
+    for setting, orig_value in orig_values:
+      setting.set_value(orig_value)
+
+
+def _escape_script_fu_string(str_):
+  return str_.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _write_json(filepath, data):
+  with io.open(filepath, 'w', encoding=pg.TEXT_FILE_ENCODING) as f:
+    # Workaround for Python 2 code to properly handle Unicode strings
+    f.write(unicode(json.dumps(data)))
+
+
+def _read_json(filepath):
+  with io.open(filepath, 'r', encoding=pg.TEXT_FILE_ENCODING) as f:
+    return json.load(f)
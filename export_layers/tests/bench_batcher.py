@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks measuring the overhead of `Batcher` when applying actions to
+items.
+
+To run the benchmarks in GIMP, pass `'bench_'` as the prefix of test modules
+to `runtests.plug_in_run_tests`.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import timeit
+import unittest
+
+import mock
+
+import gimpenums
+
+from export_layers import pygimplib as pg
+
+from export_layers.pygimplib.tests import stubs_gimp
+
+from export_layers import actions as actions_
+from export_layers import batcher as batcher_
+
+
+class BenchmarkBatcherActionOverhead(unittest.TestCase):
+  
+  NUM_ITEMS = 500
+  NUM_ACTIONS = 12
+  NUM_REPEATS = 3
+  
+  def setUp(self):
+    self.image = stubs_gimp.ImageStub()
+    self.layers = [
+      stubs_gimp.LayerStub('layer {}'.format(i), image=self.image) for i in range(self.NUM_ITEMS)]
+    self.image.layers = list(self.layers)
+    
+    self.procedure_stub = stubs_gimp.PdbProcedureStub(
+      name='plug-in-benchmark',
+      type_=gimpenums.PLUGIN,
+      params=(
+        (gimpenums.PDB_INT32, 'run-mode', 'The run mode'),
+        (gimpenums.PDB_IMAGE, 'image', 'Input image'),
+        (gimpenums.PDB_DRAWABLE, 'drawable', 'Input drawable'),
+        (gimpenums.PDB_INT32, 'offset-x', 'Offset X'),
+        (gimpenums.PDB_INT32, 'offset-y', 'Offset Y'),
+        (gimpenums.PDB_STRING, 'text', 'Text')),
+      return_vals=None,
+      blurb='Does nothing')
+    
+    self.procedures = actions_.create('procedures')
+    for unused_ in range(self.NUM_ACTIONS):
+      actions_.add(self.procedures, self.procedure_stub)
+    
+    self.batcher = batcher_.Batcher(
+      initial_run_mode=0,
+      input_image=self.image,
+      procedures=self.procedures,
+      constraints=actions_.create('constraints'),
+      edit_mode=True,
+      overwrite_chooser=mock.MagicMock(),
+      progress_updater=mock.MagicMock())
+  
+  def test_per_item_overhead(self):
+    with mock.patch('export_layers.batcher.pdb') as pdb_mock:
+      pdb_mock.__getitem__.return_value = self.procedure_stub
+      
+      self.batcher._invoker = pg.invoker.Invoker()
+      for procedure in actions_.walk(self.procedures):
+        self.batcher._add_action_from_settings(procedure)
+    
+    self.batcher._current_image = self.image
+    
+    batcher_time = min(
+      timeit.repeat(self._apply_actions_via_batcher, number=1, repeat=self.NUM_REPEATS))
+    direct_time = min(
+      timeit.repeat(self._apply_actions_directly, number=1, repeat=self.NUM_REPEATS))
+    
+    print(
+      '\n{}: {} items, {} actions: {:.1f} us per item via Batcher,'
+      ' {:.1f} us per item calling actions directly, overhead {:.1f} us per item'.format(
+        type(self).__name__,
+        self.NUM_ITEMS,
+        self.NUM_ACTIONS,
+        batcher_time / self.NUM_ITEMS * 1e6,
+        direct_time / self.NUM_ITEMS * 1e6,
+        (batcher_time - direct_time) / self.NUM_ITEMS * 1e6))
+  
+  def _apply_actions_via_batcher(self):
+    for layer in self.layers:
+      self.batcher._current_raw_item = layer
+      self.batcher._invoke_actions(actions_.DEFAULT_PROCEDURES_GROUP, [self.batcher])
+  
+  def _apply_actions_directly(self):
+    for layer in self.layers:
+      for unused_ in range(self.NUM_ACTIONS):
+        self.procedure_stub(self.image, layer, 0, 0, '', run_mode=gimpenums.RUN_NONINTERACTIVE)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks measuring the time to rename items via `renamer.ItemRenamer`.
+
+To run the benchmarks in GIMP, pass `'bench_'` as the prefix of test modules
+to `runtests.plug_in_run_tests`.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import timeit
+import unittest
+
+import mock
+import parameterized
+
+from export_layers import pygimplib as pg
+
+from export_layers.pygimplib.tests import stubs_gimp
+
+from export_layers import renamer as renamer_
+
+
+def _create_image(num_layers, num_layers_per_group):
+  image = stubs_gimp.ImageStub(name='image.xcf')
+  image.width = 1000
+  image.height = 500
+  
+  group = None
+  
+  for i in range(num_layers):
+    if i % num_layers_per_group == 0:
+      group = stubs_gimp.LayerGroupStub('group {}'.format(i), image=image)
+      image.layers.append(group)
+    
+    layer = stubs_gimp.LayerStub('Animal copy #{}.png'.format(i), image=image, parent=group)
+    layer.width = 100 + i % 50
+    layer.height = 50 + i % 20
+    group.layers.append(layer)
+  
+  return image
+
+
+@mock.patch(
+  pg.utils.get_pygimplib_module_path() + '.itemtree.pdb',
+  new=stubs_gimp.PdbStub())
+@mock.patch(
+  pg.utils.get_pygimplib_module_path() + '.itemtree.gimp.GroupLayer',
+  new=stubs_gimp.LayerGroupStub)
+class BenchmarkItemRenamer(unittest.TestCase):
+  
+  NUM_ITEMS = 10000
+  NUM_LAYERS_PER_GROUP = 10
+  NUM_REPEATS = 3
+  
+  @mock.patch(
+    pg.utils.get_pygimplib_module_path() + '.itemtree.pdb',
+    new=stubs_gimp.PdbStub())
+  @mock.patch(
+    pg.utils.get_pygimplib_module_path() + '.itemtree.gimp.GroupLayer',
+    new=stubs_gimp.LayerGroupStub)
+  def setUp(self):
+    self.image = _create_image(self.NUM_ITEMS, self.NUM_LAYERS_PER_GROUP)
+    
+    self.item_tree = pg.itemtree.LayerTree(self.image)
+    self.items = [
+      item for item in self.item_tree.iter(with_folders=False)
+      if item.type == pg.itemtree.TYPE_ITEM]
+    
+    self.batcher = mock.Mock()
+    self.batcher.item_tree = self.item_tree
+    self.batcher.current_image = self.image
+    self.batcher.pdb = stubs_gimp.PdbStub()
+    self.batcher.file_extension = 'png'
+  
+  @parameterized.parameterized.expand([
+    ('number', 'image[001]'),
+    ('descending_number', 'image[000, %d]'),
+    ('descending_number_across_groups', 'image[000, %d, %n]'),
+    ('layer_path_and_number',
+     '[layer path, _, (%c), %e]_[001, %n]'),
+    ('replace',
+     '[replace, [layer name], [ copy(?: #[[0-9]]+)*$], [] ]'
+     '_[replace, [layer name], [a], [b], 1, ignorecase]'),
+    ('complex',
+     '[image name]-[layer path, -, [[[%c]]] ]'
+     '-[replace, [layer name], [^(\\w+) copy #([[0-9]]+)$], [\\2_\\1] ]'
+     '-[attributes, %w-%h-%x-%y]-[tags, _, (%t)]-[000, %d]'),
+  ])
+  def test_rename(self, test_case_name_suffix, pattern):
+    def _rename_compiled():
+      renamer = renamer_.ItemRenamer(pattern)
+      for item in self.items:
+        renamer.rename(self.batcher, item)
+    
+    def _rename_with_string_pattern():
+      string_pattern = pg.path.StringPattern(
+        pattern,
+        fields=renamer_._get_fields_and_substitute_funcs(renamer_._init_fields(None)))
+      for item in self.items:
+        string_pattern.substitute(self.batcher, item)
+    
+    compiled_time = min(timeit.repeat(_rename_compiled, number=1, repeat=self.NUM_REPEATS))
+    string_pattern_time = min(
+      timeit.repeat(_rename_with_string_pattern, number=1, repeat=self.NUM_REPEATS))
+    
+    print(
+      '\n{} ({}): {} items: {:.3f} s compiled, {:.3f} s via StringPattern'.format(
+        type(self).__name__,
+        test_case_name_suffix,
+        len(self.items),
+        compiled_time,
+        string_pattern_time))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks measuring the time to make names of many items with the same name
+unique via `uniquifier.ItemUniquifier`.
+
+To run the benchmarks in GIMP, pass `'bench_'` as the prefix of test modules
+to `runtests.plug_in_run_tests`.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import timeit
+import unittest
+
+from export_layers import uniquifier
+
+
+class _ItemStub(object):
+  
+  def __init__(self, name, parent=None):
+    self.name = name
+    self.parent = parent
+
+
+class BenchmarkItemUniquifier(unittest.TestCase):
+  
+  NUM_ITEMS = 1000
+  SCALE = 8
+  NUM_REPEATS = 3
+  
+  def test_uniquify_items_with_same_name(self):
+    time_per_item = self._get_uniquify_time(self.NUM_ITEMS) / self.NUM_ITEMS
+    scaled_time_per_item = (
+      self._get_uniquify_time(self.NUM_ITEMS * self.SCALE) / (self.NUM_ITEMS * self.SCALE))
+    
+    # With linear complexity, the time per item should remain roughly the same.
+    # Quadratic complexity would make the time per item grow `SCALE` times.
+    print(
+      '\n{}: {:.2f} us per item for {} items, {:.2f} us per item for {} items'.format(
+        type(self).__name__,
+        time_per_item * 1e6,
+        self.NUM_ITEMS,
+        scaled_time_per_item * 1e6,
+        self.NUM_ITEMS * self.SCALE))
+  
+  def _get_uniquify_time(self, num_items):
+    def _uniquify():
+      item_uniquifier = uniquifier.ItemUniquifier()
+      for item in items:
+        item.name = 'Layer'
+        item_uniquifier.uniquify(item)
+    
+    parent = _ItemStub('Group')
+    items = [_ItemStub('Layer', parent) for unused_ in range(num_items)]
+    
+    return min(timeit.repeat(_uniquify, number=1, repeat=self.NUM_REPEATS))
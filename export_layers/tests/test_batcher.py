@@ -6,12 +6,15 @@ from future.builtins import *
 import mock
 import unittest
 
+import parameterized
+
 from gimp import pdb
 import gimpenums
 
 from export_layers import pygimplib as pg
 
 from export_layers.pygimplib.tests import stubs_gimp
+from export_layers.pygimplib.tests import utils_itemtree
 
 from export_layers import actions as actions_
 from export_layers import batcher as batcher_
@@ -97,50 +100,64 @@ class TestAddActionFromSettings(unittest.TestCase):
     procedure = actions_.add(
       self.procedures, builtin_procedures.BUILTIN_PROCEDURES['insert_background_layers'])
     
-    self.batcher._add_action_from_settings(procedure)
+    function_mock = mock.Mock()
+    
+    with mock.patch.dict(
+           builtin_procedures.BUILTIN_PROCEDURES_FUNCTIONS,
+           {'insert_background_layers': function_mock}):
+      self.batcher._add_action_from_settings(procedure)
     
     added_action_items = self.invoker.list_actions(group=actions_.DEFAULT_PROCEDURES_GROUP)
     
     self.assertEqual(len(added_action_items), 1)
-    self.assertEqual(
-      added_action_items[0][1],
-      list(procedure['arguments'])
-      + [builtin_procedures.BUILTIN_PROCEDURES_FUNCTIONS['insert_background_layers']])
+    self.assertEqual(added_action_items[0][1], ())
     self.assertEqual(added_action_items[0][2], {})
+    
+    added_action_items[0][0](self.batcher)
+    
+    function_mock.assert_called_once_with(self.batcher, 'background')
+  
+  def test_add_action_from_settings_disabled_action_is_not_added(self):
+    procedure = actions_.add(
+      self.procedures, builtin_procedures.BUILTIN_PROCEDURES['insert_background_layers'])
+    procedure['enabled'].set_value(False)
+    
+    self.batcher._add_action_from_settings(procedure)
+    
+    self.assertFalse(self.invoker.list_actions(group=actions_.DEFAULT_PROCEDURES_GROUP))
   
   def test_add_pdb_proc_as_action_without_run_mode(self):
     self.procedure_stub.params = self.procedure_stub.params[1:]
-    self._test_add_pdb_proc_as_action(
-      self.procedure_stub, [('save-options', ()), ('filename', '')], {})
+    self._test_add_pdb_proc_as_action(self.procedure_stub, [(), ''], {})
   
   def test_add_pdb_proc_as_action_with_run_mode(self):
     self._test_add_pdb_proc_as_action(
-      self.procedure_stub, [('run-mode', 0), ('save-options', ()), ('filename', '')], {})
+      self.procedure_stub, [(), ''], {b'run_mode': gimpenums.RUN_NONINTERACTIVE})
   
-  def _test_add_pdb_proc_as_action(
-        self, pdb_procedure, expected_arg_names_and_values, expected_kwargs):
+  def _test_add_pdb_proc_as_action(self, pdb_procedure, expected_args, expected_kwargs):
     procedure = actions_.add(self.procedures, pdb_procedure)
     
+    pdb_procedure_mock = mock.Mock(wraps=pdb_procedure, params=pdb_procedure.params)
+    
     with mock.patch('export_layers.batcher.pdb') as pdb_mock:
-      pdb_mock.__getitem__.return_value = pdb_procedure
+      pdb_mock.__getitem__.return_value = pdb_procedure_mock
       
       self.batcher._add_action_from_settings(procedure)
     
     added_action_items = self.invoker.list_actions(group=actions_.DEFAULT_PROCEDURES_GROUP)
     
-    added_action_item_names_and_values = [
-      (setting.name, setting.value) for setting in added_action_items[0][1][:-1]
-    ]
-    
     self.assertEqual(len(added_action_items), 1)
-    self.assertEqual(added_action_item_names_and_values, added_action_item_names_and_values)
-    self.assertEqual(added_action_items[0][1][-1], pdb_procedure)
-    self.assertDictEqual(added_action_items[0][2], expected_kwargs)
+    self.assertEqual(added_action_items[0][1], ())
+    self.assertDictEqual(added_action_items[0][2], {})
+    
+    added_action_items[0][0](self.batcher)
+    
+    pdb_procedure_mock.assert_called_once_with(*expected_args, **expected_kwargs)
 
 
 class TestGetReplacedArgsAndKwargs(unittest.TestCase):
   
-  def test_get_replaced_args(self):
+  def test_placeholder_args_are_replaced_on_each_call(self):
     batcher = batcher_.Batcher(
       initial_run_mode=0,
       input_image=mock.MagicMock(),
@@ -199,6 +216,176 @@ class TestGetReplacedArgsAndKwargs(unittest.TestCase):
       ],
     })
     
-    replaced_args = batcher._get_replaced_args(actions['autocrop/arguments'])
+    function_mock = mock.Mock()
+    
+    compiled_function = batcher._get_processed_function(actions['autocrop'], function_mock)
+    compiled_function(batcher)
+    
+    function_mock.assert_called_once_with(batcher, 0, image, layer, 10, 50, 'current_image')
+    
+    batcher._current_raw_item = stubs_gimp.LayerStub()
+    compiled_function(batcher)
+    
+    function_mock.assert_called_with(
+      batcher, 0, image, batcher._current_raw_item, 10, 50, 'current_image')
+
+
+class TestBatcherSetResults(unittest.TestCase):
+  
+  def test_set_results(self):
+    batcher = batcher_.Batcher(
+      initial_run_mode=0,
+      input_image=mock.MagicMock(),
+      procedures=mock.MagicMock(),
+      constraints=mock.MagicMock())
+    
+    layer = stubs_gimp.LayerStub('main-background')
+    
+    batcher.set_results(
+      exported_raw_items=[layer],
+      failed_procedures={'autocrop': [(None, 'error', None)]})
+    
+    self.assertListEqual(batcher.exported_raw_items, [layer])
+    self.assertDictEqual(batcher.failed_procedures, {'autocrop': [(None, 'error', None)]})
+    
+    batcher.set_results(unchanged_raw_items=[layer])
+    
+    self.assertListEqual(batcher.exported_raw_items, [])
+    self.assertListEqual(batcher.unchanged_raw_items, [layer])
+    self.assertDictEqual(batcher.failed_procedures, {})
+    self.assertDictEqual(batcher.skipped_constraints, {})
+
+
+class TestBatcherRunSingle(unittest.TestCase):
+  
+  @mock.patch(
+    pg.utils.get_pygimplib_module_path() + '.itemtree.pdb', new=stubs_gimp.PdbStub())
+  @mock.patch(
+    pg.utils.get_pygimplib_module_path() + '.itemtree.gimp.GroupLayer',
+    new=stubs_gimp.LayerGroupStub)
+  def setUp(self):
+    image = utils_itemtree.parse_layers("""
+      Corners {
+        top-left-corner
+        top-right-corner
+      }
+      main-background
+      hidden-background
+    """)
+    
+    self.item_tree = pg.itemtree.LayerTree(image)
+    
+    self.batcher = batcher_.Batcher(
+      initial_run_mode=0,
+      input_image=image,
+      procedures=actions_.create('procedures'),
+      constraints=actions_.create('constraints'),
+      edit_mode=True,
+      overwrite_chooser=mock.MagicMock(),
+      progress_updater=mock.MagicMock(),
+      item_tree=self.item_tree)
+    
+    self.processed_items = []
+    
+    self.batcher.add_procedure(
+      lambda batcher, item, raw_item: self.processed_items.append(item.orig_name),
+      ['before_process_item'])
+    self.batcher.add_constraint(
+      lambda item: not item.orig_name.startswith('hidden'),
+      [actions_.DEFAULT_CONSTRAINTS_GROUP])
+    
+    self.run_kwargs = dict(
+      is_preview=True, process_contents=False, process_names=True, process_export=False)
+  
+  def test_run_single(self):
+    self.batcher.run_single(self.item_tree['top-right-corner'], **self.run_kwargs)
+    
+    self.assertListEqual(self.processed_items, ['top-right-corner'])
+    self.assertEqual(self.batcher.progress_updater.num_total_tasks, 1)
+  
+  @parameterized.parameterized.expand([
+    ('item_not_matching_constraints', 'hidden-background'),
+    ('folder', ('Corners', pg.itemtree.FOLDER_KEY)),
+  ])
+  def test_run_single_does_not_process_item(self, test_case_name_suffix, item_key):
+    self.batcher.run_single(self.item_tree[item_key], **self.run_kwargs)
+    
+    self.assertListEqual(self.processed_items, [])
+  
+  def test_run_single_reuses_action_plan_from_previous_run(self):
+    with mock.patch.object(
+           self.batcher, '_compile_action_plan',
+           wraps=self.batcher._compile_action_plan) as compile_action_plan_mock:
+      self.batcher.run(**self.run_kwargs)
+      self.batcher.run_single(self.item_tree['main-background'], **self.run_kwargs)
+      self.batcher.run_single(self.item_tree['top-left-corner'], **self.run_kwargs)
+    
+    self.assertEqual(compile_action_plan_mock.call_count, 1)
+    self.assertListEqual(
+      self.processed_items,
+      ['top-left-corner', 'top-right-corner', 'Corners', 'main-background',
+       'main-background', 'top-left-corner'])
+  
+  @parameterized.parameterized.expand([
+    ('is_preview_changed', {'is_preview': False}),
+    ('procedures_changed', {'procedures': actions_.create('procedures')}),
+    ('pdb_queries_cached', {'cache_pdb_queries': True}),
+  ])
+  def test_run_single_compiles_action_plan_again(
+        self, test_case_name_suffix, run_single_kwargs):
+    kwargs = dict(self.run_kwargs)
+    kwargs.update(run_single_kwargs)
+    
+    with mock.patch.object(
+           self.batcher, '_compile_action_plan',
+           wraps=self.batcher._compile_action_plan) as compile_action_plan_mock:
+      self.batcher.run(**self.run_kwargs)
+      self.batcher.run_single(self.item_tree['main-background'], **kwargs)
+    
+    self.assertEqual(compile_action_plan_mock.call_count, 2)
+  
+  @parameterized.parameterized.expand([
+    ('argument_changed', 'arguments/suffix', ' (changed)', ['main-background (changed)']),
+    ('enabled_changed', 'enabled', False, []),
+  ])
+  def test_run_single_uses_changed_action_settings(
+        self, test_case_name_suffix, setting_path, new_value, expected_processed_names):
+    processed_names = []
+    
+    def append_suffix(batcher, suffix):
+      processed_names.append(batcher.current_item.orig_name + suffix)
+    
+    actions_.add(self.batcher.procedures, {
+      'name': 'append_suffix',
+      'additional_tags': [builtin_procedures.NAME_ONLY_TAG],
+      'arguments': [
+        {
+          'type': 'string',
+          'name': 'suffix',
+          'default_value': '',
+        },
+      ],
+    })
+    
+    with mock.patch.dict(
+           builtin_procedures.BUILTIN_PROCEDURES_FUNCTIONS, {'append_suffix': append_suffix}):
+      self.batcher.run(**self.run_kwargs)
+      
+      self.assertIn('main-background', processed_names)
+      
+      del processed_names[:]
+      self.batcher.procedures['append_suffix'][setting_path].set_value(new_value)
+      
+      self.batcher.run_single(self.item_tree['main-background'], **self.run_kwargs)
+    
+    self.assertListEqual(processed_names, expected_processed_names)
+  
+  def test_run_single_without_item_tree(self):
+    batcher = batcher_.Batcher(
+      initial_run_mode=0,
+      input_image=mock.MagicMock(),
+      procedures=actions_.create('procedures'),
+      constraints=actions_.create('constraints'))
     
-    self.assertListEqual(replaced_args, [0, image, layer, 10, 50, 'current_image'])
+    with self.assertRaises(ValueError):
+      batcher.run_single(self.item_tree['main-background'])
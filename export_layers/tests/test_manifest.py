@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from export_layers import manifest as manifest_
+
+
+class TestExportManifest(unittest.TestCase):
+  
+  def setUp(self):
+    self.output_directory = tempfile.mkdtemp()
+    self.output_filepath = os.path.join(self.output_directory, 'Frames', 'top-frame.png')
+    
+    os.makedirs(os.path.dirname(self.output_filepath))
+    with io.open(self.output_filepath, 'wb'):
+      pass
+  
+  def tearDown(self):
+    shutil.rmtree(self.output_directory)
+  
+  def test_is_unchanged_without_entry(self):
+    export_manifest = manifest_.ExportManifest(self.output_directory)
+    
+    self.assertFalse(export_manifest.is_unchanged(self.output_filepath, 'abc', 'def'))
+  
+  def test_is_unchanged_after_save_and_load(self):
+    export_manifest = manifest_.ExportManifest(self.output_directory)
+    export_manifest.update(self.output_filepath, 'abc', 'def')
+    export_manifest.save()
+    
+    export_manifest = manifest_.ExportManifest(self.output_directory)
+    
+    self.assertTrue(export_manifest.is_unchanged(self.output_filepath, 'abc', 'def'))
+    self.assertFalse(export_manifest.is_unchanged(self.output_filepath, 'abd', 'def'))
+    self.assertFalse(export_manifest.is_unchanged(self.output_filepath, 'abc', 'deg'))
+  
+  def test_is_unchanged_if_output_file_was_removed(self):
+    export_manifest = manifest_.ExportManifest(self.output_directory)
+    export_manifest.update(self.output_filepath, 'abc', 'def')
+    
+    os.remove(self.output_filepath)
+    
+    self.assertFalse(export_manifest.is_unchanged(self.output_filepath, 'abc', 'def'))
+  
+  def test_is_unchanged_with_different_output_file(self):
+    filepath = os.path.join(self.output_directory, 'Frames', 'top-frame.unsupported')
+    
+    export_manifest = manifest_.ExportManifest(self.output_directory)
+    export_manifest.update(filepath, 'abc', 'def', self.output_filepath)
+    export_manifest.save()
+    
+    export_manifest = manifest_.ExportManifest(self.output_directory)
+    
+    self.assertTrue(export_manifest.is_unchanged(filepath, 'abc', 'def'))
+    self.assertFalse(export_manifest.is_unchanged(self.output_filepath, 'abc', 'def'))
+    
+    os.remove(self.output_filepath)
+    
+    self.assertFalse(export_manifest.is_unchanged(filepath, 'abc', 'def'))
+  
+  def test_save_preserves_entries_saved_by_others(self):
+    other_output_filepath = os.path.join(self.output_directory, 'bottom-frame.png')
+    with io.open(other_output_filepath, 'wb'):
+      pass
+    
+    export_manifest = manifest_.ExportManifest(self.output_directory)
+    other_export_manifest = manifest_.ExportManifest(self.output_directory)
+    
+    other_export_manifest.update(other_output_filepath, 'ghi', 'def')
+    other_export_manifest.save()
+    
+    export_manifest.update(self.output_filepath, 'abc', 'def')
+    export_manifest.save()
+    
+    export_manifest = manifest_.ExportManifest(self.output_directory)
+    
+    self.assertTrue(export_manifest.is_unchanged(self.output_filepath, 'abc', 'def'))
+    self.assertTrue(export_manifest.is_unchanged(other_output_filepath, 'ghi', 'def'))
+  
+  def test_invalid_manifest_file_is_ignored(self):
+    with io.open(os.path.join(self.output_directory, manifest_.MANIFEST_FILENAME), 'w') as f:
+      f.write('invalid data')
+    
+    export_manifest = manifest_.ExportManifest(self.output_directory)
+    
+    self.assertFalse(export_manifest.is_unchanged(self.output_filepath, 'abc', 'def'))
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import unittest
+
+import mock
+
+from export_layers.pygimplib.tests import stubs_gimp
+
+from export_layers import actions as actions_
+from export_layers import builtin_procedures
+from export_layers import settings_main
+
+from export_layers.gui import preview_image as preview_image_
+
+
+class TestImagePreviewCache(unittest.TestCase):
+  
+  def setUp(self):
+    self.settings = settings_main.create_settings()
+    
+    self.batcher = mock.MagicMock()
+    self.image_preview = preview_image_.ImagePreview(self.batcher, self.settings)
+    
+    self.raw_item = stubs_gimp.LayerStub('main-background')
+    self.raw_item.width = 20
+    self.raw_item.height = 10
+    self.item = mock.Mock(raw=self.raw_item)
+    
+    self.rendered_pixbufs = []
+    
+    patcher_get_in_memory_preview = mock.patch.object(
+      self.image_preview, '_get_in_memory_preview', new=self._render)
+    patcher_get_in_memory_preview.start()
+    self.addCleanup(patcher_get_in_memory_preview.stop)
+    
+    patcher_pdb = mock.patch('export_layers.gui.preview_image.pdb')
+    mock_pdb = patcher_pdb.start()
+    mock_pdb.gimp_image_is_dirty.return_value = False
+    self.addCleanup(patcher_pdb.stop)
+  
+  def _render(self, item, display_errors=True):
+    pixbuf = mock.Mock(**{'get_rowstride.return_value': 80, 'get_height.return_value': 10})
+    self.rendered_pixbufs.append(pixbuf)
+    self.image_preview._preview_pixbuf = pixbuf
+    
+    return pixbuf, None
+  
+  def test_cache_hit_for_unchanged_settings(self):
+    pixbuf, unused_ = self.image_preview._get_cached_or_in_memory_preview(self.item)
+    cached_pixbuf, unused_ = self.image_preview._get_cached_or_in_memory_preview(self.item)
+    
+    self.assertEqual(len(self.rendered_pixbufs), 1)
+    self.assertIs(cached_pixbuf, pixbuf)
+  
+  def test_settings_change_results_in_cache_miss_and_new_render(self):
+    procedure = actions_.add(
+      self.settings['main/procedures'],
+      builtin_procedures.BUILTIN_PROCEDURES['insert_background_layers'])
+    
+    pixbuf, unused_ = self.image_preview._get_cached_or_in_memory_preview(self.item)
+    
+    procedure['arguments/tag'].set_value('foreground')
+    
+    new_pixbuf, unused_ = self.image_preview._get_cached_or_in_memory_preview(self.item)
+    
+    self.assertEqual(len(self.rendered_pixbufs), 2)
+    self.assertIs(new_pixbuf, self.rendered_pixbufs[-1])
+    self.assertIsNot(new_pixbuf, pixbuf)
+    self.assertEqual(self.image_preview._pixbuf_cache.num_misses, 2)
+    
+    procedure['enabled'].set_value(False)
+    
+    self.image_preview._get_cached_or_in_memory_preview(self.item)
+    
+    self.assertEqual(len(self.rendered_pixbufs), 3)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import unittest
+
+import mock
+
+from export_layers import pygimplib as pg
+
+from export_layers.gui import previews_controller
+
+
+class _PreviewStub(object):
+  
+  def __init__(self):
+    self.is_update_locked = False
+    self.updates = []
+
+
+class _TimeoutStub(object):
+  
+  def __init__(self):
+    self.scheduled_funcs = {}
+  
+  def add(self, interval, callback, *callback_args, **callback_kwargs):
+    self.scheduled_funcs[callback] = interval
+  
+  def remove(self, callback):
+    self.scheduled_funcs.pop(callback, None)
+  
+  def run(self):
+    scheduled_funcs = list(self.scheduled_funcs)
+    self.scheduled_funcs.clear()
+    
+    for func in scheduled_funcs:
+      func()
+
+
+class TestPreviewUpdateScheduler(unittest.TestCase):
+  
+  UPDATE_NAMES = previews_controller.PreviewUpdateScheduler.UPDATE_NAMES
+  UPDATE_CONTENTS = previews_controller.PreviewUpdateScheduler.UPDATE_CONTENTS
+  UPDATE_RESET = previews_controller.PreviewUpdateScheduler.UPDATE_RESET
+  
+  def setUp(self):
+    self.timeout = _TimeoutStub()
+    
+    patcher_add = mock.patch(
+      pg.utils.get_pygimplib_module_path() + '.invocation.timeout_add_strict',
+      new=self.timeout.add)
+    patcher_remove = mock.patch(
+      pg.utils.get_pygimplib_module_path() + '.invocation.timeout_remove_strict',
+      new=self.timeout.remove)
+    
+    patcher_add.start()
+    patcher_remove.start()
+    self.addCleanup(patcher_add.stop)
+    self.addCleanup(patcher_remove.stop)
+    
+    self.scheduler = previews_controller.PreviewUpdateScheduler(50, 500)
+    
+    self.preview = _PreviewStub()
+    self.scheduler.add_preview(
+      self.preview,
+      {
+        self.UPDATE_NAMES: lambda: self.preview.updates.append('names'),
+        self.UPDATE_CONTENTS: lambda: self.preview.updates.append('contents'),
+        self.UPDATE_RESET: lambda: self.preview.updates.append('reset'),
+      })
+  
+  def test_request(self):
+    self.scheduler.request(self.preview, self.UPDATE_CONTENTS)
+    
+    self.assertTrue(self.scheduler.is_pending(self.preview))
+    self.assertFalse(self.preview.updates)
+    
+    self.timeout.run()
+    
+    self.assertFalse(self.scheduler.is_pending(self.preview))
+    self.assertEqual(self.preview.updates, ['contents'])
+    self.assertEqual(self.scheduler.num_requests, 1)
+    self.assertEqual(self.scheduler.num_merged_requests, 0)
+    self.assertEqual(self.scheduler.num_executed_updates, 1)
+  
+  def test_request_merges_pending_requests_into_most_thorough_update(self):
+    self.scheduler.request(self.preview, self.UPDATE_NAMES)
+    self.scheduler.request(self.preview, self.UPDATE_RESET)
+    self.scheduler.request(self.preview, self.UPDATE_CONTENTS)
+    
+    self.timeout.run()
+    
+    self.assertEqual(self.preview.updates, ['reset'])
+    self.assertEqual(self.scheduler.num_requests, 3)
+    self.assertEqual(self.scheduler.num_merged_requests, 2)
+    self.assertEqual(self.scheduler.num_executed_updates, 1)
+  
+  def test_request_after_executed_update_is_not_merged(self):
+    self.scheduler.request(self.preview, self.UPDATE_RESET)
+    self.timeout.run()
+    
+    self.scheduler.request(self.preview, self.UPDATE_NAMES)
+    self.timeout.run()
+    
+    self.assertEqual(self.preview.updates, ['reset', 'names'])
+    self.assertEqual(self.scheduler.num_merged_requests, 0)
+    self.assertEqual(self.scheduler.num_executed_updates, 2)
+  
+  def test_request_for_kind_without_function_uses_more_thorough_kind(self):
+    preview = _PreviewStub()
+    self.scheduler.add_preview(
+      preview, {self.UPDATE_RESET: lambda: preview.updates.append('reset')})
+    
+    self.scheduler.request(preview, self.UPDATE_NAMES)
+    self.timeout.run()
+    
+    self.assertEqual(preview.updates, ['reset'])
+  
+  def test_request_for_kind_without_function_or_more_thorough_kind_raises_error(self):
+    preview = _PreviewStub()
+    self.scheduler.add_preview(
+      preview, {self.UPDATE_NAMES: lambda: preview.updates.append('names')})
+    
+    self.scheduler.request(preview, self.UPDATE_CONTENTS)
+    
+    with self.assertRaises(ValueError):
+      self.timeout.run()
+  
+  def test_requests_for_different_previews_are_not_merged(self):
+    preview = _PreviewStub()
+    self.scheduler.add_preview(
+      preview, {self.UPDATE_CONTENTS: lambda: preview.updates.append('contents')})
+    
+    self.scheduler.request(self.preview, self.UPDATE_NAMES)
+    self.scheduler.request(preview, self.UPDATE_CONTENTS)
+    
+    self.timeout.run()
+    
+    self.assertEqual(self.preview.updates, ['names'])
+    self.assertEqual(preview.updates, ['contents'])
+    self.assertEqual(self.scheduler.num_merged_requests, 0)
+  
+  def test_pending_update_of_preview_to_update_first_is_executed_first(self):
+    updates = []
+    
+    preview_to_update_first = _PreviewStub()
+    self.scheduler.add_preview(
+      preview_to_update_first, {self.UPDATE_CONTENTS: lambda: updates.append('first')})
+    
+    preview = _PreviewStub()
+    self.scheduler.add_preview(
+      preview,
+      {self.UPDATE_CONTENTS: lambda: updates.append('second')},
+      update_after=[preview_to_update_first])
+    
+    self.scheduler.request(preview_to_update_first, self.UPDATE_CONTENTS, 500)
+    self.scheduler.update_now(preview, self.UPDATE_CONTENTS)
+    
+    self.assertEqual(updates, ['first', 'second'])
+    self.assertFalse(self.scheduler.is_pending(preview_to_update_first))
+    self.assertFalse(self.timeout.scheduled_funcs)
+  
+  def test_update_after_preview_without_pending_update(self):
+    preview = _PreviewStub()
+    self.scheduler.add_preview(
+      preview,
+      {self.UPDATE_CONTENTS: lambda: preview.updates.append('contents')},
+      update_after=[self.preview])
+    
+    self.scheduler.update_now(preview, self.UPDATE_CONTENTS)
+    
+    self.assertEqual(preview.updates, ['contents'])
+    self.assertFalse(self.preview.updates)
+  
+  def test_update_now_merges_and_cancels_pending_request(self):
+    self.scheduler.request(self.preview, self.UPDATE_RESET)
+    self.scheduler.update_now(self.preview, self.UPDATE_NAMES)
+    
+    self.assertEqual(self.preview.updates, ['reset'])
+    self.assertFalse(self.timeout.scheduled_funcs)
+    self.assertEqual(self.scheduler.num_requests, 2)
+    self.assertEqual(self.scheduler.num_merged_requests, 1)
+    self.assertEqual(self.scheduler.num_executed_updates, 1)
+  
+  def test_cancel(self):
+    self.scheduler.request(self.preview, self.UPDATE_CONTENTS)
+    self.scheduler.cancel(self.preview)
+    
+    self.timeout.run()
+    
+    self.assertFalse(self.scheduler.is_pending(self.preview))
+    self.assertFalse(self.preview.updates)
+    self.assertEqual(self.scheduler.num_executed_updates, 0)
+  
+  def test_delay_adapts_to_update_duration(self):
+    self.assertEqual(self.scheduler.get_delay_milliseconds(self.preview), 50)
+    
+    with mock.patch('export_layers.gui.previews_controller.time.time') as mock_time:
+      mock_time.side_effect = [10.0, 10.2, 20.0, 20.4, 30.0, 32.0]
+      
+      self.scheduler.update_now(self.preview, self.UPDATE_CONTENTS)
+      self.assertAlmostEqual(
+        self.scheduler.get_average_duration_seconds(self.preview), 0.2)
+      self.assertEqual(self.scheduler.get_delay_milliseconds(self.preview), 200)
+      
+      self.scheduler.update_now(self.preview, self.UPDATE_CONTENTS)
+      self.assertAlmostEqual(
+        self.scheduler.get_average_duration_seconds(self.preview), 0.3)
+      
+      self.scheduler.update_now(self.preview, self.UPDATE_CONTENTS)
+      self.assertEqual(self.scheduler.get_delay_milliseconds(self.preview), 500)
+    
+    self.scheduler.request(self.preview, self.UPDATE_CONTENTS)
+    self.assertEqual(list(self.timeout.scheduled_funcs.values()), [500])
+  
+  def test_delay_is_at_least_min_delay(self):
+    with mock.patch('export_layers.gui.previews_controller.time.time') as mock_time:
+      mock_time.side_effect = [10.0, 10.001]
+      self.scheduler.update_now(self.preview, self.UPDATE_CONTENTS)
+    
+    self.assertEqual(self.scheduler.get_delay_milliseconds(self.preview), 50)
+    
+    self.scheduler.request(self.preview, self.UPDATE_CONTENTS, min_delay_milliseconds=100)
+    self.assertEqual(list(self.timeout.scheduled_funcs.values()), [100])
+  
+  def test_duration_of_locked_preview_is_not_recorded(self):
+    self.preview.is_update_locked = True
+    
+    self.scheduler.update_now(self.preview, self.UPDATE_CONTENTS)
+    
+    self.assertEqual(self.preview.updates, ['contents'])
+    self.assertIsNone(self.scheduler.get_average_duration_seconds(self.preview))
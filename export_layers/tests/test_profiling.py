@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import csv
+import inspect
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from export_layers import profiling
+
+
+class TestActionProfile(unittest.TestCase):
+  
+  def setUp(self):
+    self.profile = profiling.ActionProfile()
+  
+  def test_add(self):
+    self.profile.add('default_procedures', 'resize', 'top-frame', 1.0)
+    self.profile.add('default_procedures', 'resize', 'top-frame', 2.0)
+    self.profile.add('default_procedures', 'resize', 'bottom-frame', 0.5)
+    
+    self.assertListEqual(
+      self.profile.entries,
+      [profiling.ProfileEntry('default_procedures', 'resize', 'top-frame', 2, 3.0),
+       profiling.ProfileEntry('default_procedures', 'resize', 'bottom-frame', 1, 0.5)])
+  
+  def test_add_group(self):
+    self.profile.add_group('before_process_item', 1.0)
+    self.profile.add_group('before_process_item', 0.5)
+    
+    self.assertListEqual(
+      self.profile.group_entries,
+      [profiling.ProfileEntry('before_process_item', None, None, 2, 1.5)])
+  
+  def test_get_slowest_actions(self):
+    self.profile.add('default_procedures', 'resize', 'top-frame', 1.0)
+    self.profile.add('default_procedures', 'resize', 'bottom-frame', 1.0)
+    self.profile.add('default_procedures', 'export', 'top-frame', 1.5)
+    self.profile.add('default_procedures', 'rename', 'top-frame', 0.25)
+    self.profile.add('name', 'rename', 'top-frame', 0.25)
+    
+    slowest_actions = self.profile.get_slowest_actions(2)
+    
+    self.assertListEqual(
+      [(entry.action_name, entry.num_calls, entry.total_time) for entry in slowest_actions],
+      [('resize', 2, 2.0), ('export', 1, 1.5)])
+    self.assertEqual(slowest_actions[0].average_time, 1.0)
+  
+  def test_measure_records_time_if_exception_is_raised(self):
+    with self.assertRaises(ValueError):
+      with self.profile.measure('default_procedures', 'resize', 'top-frame'):
+        raise ValueError
+    
+    self.assertEqual(len(self.profile.entries), 1)
+    self.assertEqual(self.profile.entries[0].num_calls, 1)
+
+
+class TestGetProfiledFunction(unittest.TestCase):
+  
+  def setUp(self):
+    self.profile = profiling.ActionProfile()
+    self.item_name = 'top-frame'
+  
+  def _get_item_name(self):
+    return self.item_name
+  
+  def test_function(self):
+    profiled_function = profiling.get_profiled_function(
+      lambda value: value * 2,
+      self.profile,
+      lambda: 'default_procedures',
+      'double',
+      self._get_item_name)
+    
+    self.assertEqual(profiled_function(3), 6)
+    self.assertEqual(
+      [(entry.group, entry.action_name, entry.item_name, entry.num_calls)
+       for entry in self.profile.entries],
+      [('default_procedures', 'double', 'top-frame', 1)])
+  
+  def test_generator_records_each_step_for_current_item(self):
+    
+    def generator():
+      while True:
+        value = yield
+        if value == 'stop':
+          break
+    
+    profiled_function = profiling.get_profiled_function(
+      generator, self.profile, lambda: 'default_procedures', 'gen', self._get_item_name)
+    
+    profiled_generator = profiled_function()
+    next(profiled_generator)
+    
+    self.item_name = 'bottom-frame'
+    profiled_generator.send(None)
+    
+    with self.assertRaises(StopIteration):
+      profiled_generator.send('stop')
+    
+    self.assertEqual(
+      [(entry.item_name, entry.num_calls) for entry in self.profile.entries],
+      [('top-frame', 1), ('bottom-frame', 2)])
+
+
+class TestGetFunctionTrackingAction(unittest.TestCase):
+  
+  def setUp(self):
+    self.action_names = []
+  
+  def test_function(self):
+    recorded_action_names = []
+    
+    def function(value):
+      recorded_action_names.append(list(self.action_names))
+      return value * 2
+    
+    tracking_function = profiling.get_function_tracking_action(
+      function, 'double', self.action_names)
+    
+    self.assertEqual(tracking_function(3), 6)
+    self.assertListEqual(recorded_action_names, [['double']])
+    self.assertListEqual(self.action_names, [])
+  
+  def test_nested_functions(self):
+    recorded_action_names = []
+    
+    def inner_function():
+      recorded_action_names.append(list(self.action_names))
+    
+    tracking_inner_function = profiling.get_function_tracking_action(
+      inner_function, 'inner', self.action_names)
+    
+    def outer_function():
+      tracking_inner_function()
+      recorded_action_names.append(list(self.action_names))
+    
+    profiling.get_function_tracking_action(outer_function, 'outer', self.action_names)()
+    
+    self.assertListEqual(recorded_action_names, [['outer', 'inner'], ['outer']])
+  
+  def test_action_name_is_removed_if_exception_is_raised(self):
+    
+    def function():
+      raise ValueError
+    
+    with self.assertRaises(ValueError):
+      profiling.get_function_tracking_action(function, 'fail', self.action_names)()
+    
+    self.assertListEqual(self.action_names, [])
+  
+  def test_generator_tracks_each_step(self):
+    recorded_action_names = []
+    
+    def generator():
+      recorded_action_names.append(list(self.action_names))
+      yield
+      recorded_action_names.append(list(self.action_names))
+    
+    tracking_generator = profiling.get_function_tracking_action(
+      generator, 'gen', self.action_names)()
+    
+    self.assertListEqual(recorded_action_names, [])
+    
+    next(tracking_generator)
+    self.assertListEqual(self.action_names, [])
+    
+    with self.assertRaises(StopIteration):
+      next(tracking_generator)
+    
+    self.assertListEqual(recorded_action_names, [['gen'], ['gen']])
+    self.assertListEqual(self.action_names, [])
+  
+  def test_generator_function_remains_generator_function(self):
+    
+    def generator():
+      yield
+    
+    tracking_function = profiling.get_function_tracking_action(
+      generator, 'gen', self.action_names)
+    
+    self.assertTrue(inspect.isgeneratorfunction(tracking_function))
+  
+  def test_generator_function_receives_sent_values(self):
+    received_values = []
+    
+    def generator():
+      while True:
+        value = yield
+        received_values.append((value, list(self.action_names)))
+    
+    tracking_generator = profiling.get_function_tracking_action(
+      generator, 'gen', self.action_names)()
+    
+    next(tracking_generator)
+    tracking_generator.send(True)
+    
+    self.assertListEqual(received_values, [(True, ['gen'])])
+    self.assertListEqual(self.action_names, [])
+
+
+class TestActionProfileSave(unittest.TestCase):
+  
+  def setUp(self):
+    self.temp_dirpath = tempfile.mkdtemp()
+    
+    self.profile = profiling.ActionProfile()
+    self.profile.add('default_procedures', 'resize', 'top-frame', 1.0)
+    self.profile.add('default_procedures', 'resize', None, 2.0)
+    self.profile.add_group('default_procedures', 3.5)
+  
+  def tearDown(self):
+    shutil.rmtree(self.temp_dirpath)
+  
+  def test_save_json(self):
+    filepath = os.path.join(self.temp_dirpath, 'profile.json')
+    self.profile.save(filepath)
+    
+    with io.open(filepath, 'r') as f:
+      data = json.load(f)
+    
+    self.assertEqual(len(data['actions']), 2)
+    self.assertEqual(data['actions'][0]['item_name'], 'top-frame')
+    self.assertEqual(data['actions'][1]['item_name'], None)
+    self.assertEqual(data['groups'], [
+      {'group': 'default_procedures', 'num_calls': 1, 'total_time': 3.5}])
+  
+  def test_save_csv(self):
+    filepath = os.path.join(self.temp_dirpath, 'profile.csv')
+    self.profile.save(filepath)
+    
+    with io.open(filepath, 'rb') as f:
+      rows = list(csv.reader(f))
+    
+    self.assertEqual(len(rows), 4)
+    self.assertEqual(rows[0], ['group', 'action', 'item', 'num_calls', 'total_time'])
+    self.assertEqual(rows[1], ['default_procedures', 'resize', 'top-frame', '1', '1.0'])
+    self.assertEqual(rows[2], ['default_procedures', 'resize', '', '1', '2.0'])
+    self.assertEqual(rows[3], ['default_procedures', '', '', '1', '3.5'])
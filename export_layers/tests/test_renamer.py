@@ -207,3 +207,61 @@ class TestRenameWithNumberField(unittest.TestCase):
     self.assertListEqual(
       [renamed_item.name for renamed_item in layer_tree.iter(with_folders=False, filtered=False)],
       [expected_item.name for expected_item in expected_layer_tree])
+
+
+class TestItemRenamerCompiledPattern(unittest.TestCase):
+  
+  def setUp(self):
+    self.batcher = mock.Mock()
+    self.batcher.file_extension = 'png'
+    
+    self.item = mock.Mock(parents=[])
+    self.item.name = 'Animal copy #1'
+    self.item.orig_name = 'Animal copy #1'
+  
+  @parameterized.parameterized.expand([
+    ('replace_single_character',
+     '[replace, [layer name], [a], [b] ]', 'Animbl copy #1'),
+    ('replace_with_regex',
+     '[replace, [layer name], [ copy(?: #[[0-9]]+)*$], [] ]', 'Animal'),
+    ('replace_with_count_and_flags',
+     '[replace, [layer name], [a], [b], 1, ignorecase]', 'bnimal copy #1'),
+    ('replace_unknown_field',
+     'image_[replace, [unknown], [a], [b] ]', 'image_'),
+    ('replace_invalid_regex',
+     'image_[replace, [layer name], [(], [b] ]', 'image_[replace, [layer name], [(], [b] ]'),
+    ('replace_missing_arguments',
+     '[replace, [layer name]]', '[replace, [layer name]]'),
+    ('literal_and_fields',
+     '[[[layer name]]]-[layer path, _, (%c)]', '[Animal copy #1]-(Animal copy #1)'),
+  ])
+  def test_rename(self, test_case_name_suffix, pattern, expected_name):
+    renamer = renamer_.ItemRenamer(pattern)
+    
+    self.assertEqual(renamer.rename(self.batcher, self.item), expected_name)
+    self.assertEqual(renamer.rename(self.batcher, self.item), expected_name)
+  
+  def test_compiled_pattern_is_cached(self):
+    pattern = '[replace, [layer name], [a], [b] ]_[001]'
+    
+    with mock.patch('export_layers.renamer._compile_pattern', wraps=renamer_._compile_pattern) as (
+          compile_pattern_mock):
+      renamer_._compiled_patterns.clear()
+      
+      renamer_.ItemRenamer(pattern)
+      renamer_.ItemRenamer(pattern)
+      
+      self.assertEqual(compile_pattern_mock.call_count, 1)
+      
+      renamer_.ItemRenamer(pattern + '_')
+      
+      self.assertEqual(compile_pattern_mock.call_count, 2)
+  
+  def test_numbering_restarts_for_each_renamer_with_cached_pattern(self):
+    self.item.parent = None
+    
+    for unused_ in range(2):
+      renamer = renamer_.ItemRenamer('image[001]')
+      
+      self.assertEqual(renamer.rename(self.batcher, self.item), 'image001')
+      self.assertEqual(renamer.rename(self.batcher, self.item), 'image002')
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from future.builtins import *
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import parameterized
+
+from export_layers import pygimplib as pg
+
+from export_layers import sharding
+
+
+class TestSplitIntoShards(unittest.TestCase):
+  
+  @parameterized.parameterized.expand([
+    ('evenly_divisible',
+     ['a', 'b', 'c', 'd'], 2, [['a', 'b'], ['c', 'd']]),
+    ('first_shards_are_larger',
+     ['a', 'b', 'c', 'd', 'e'], 3, [['a', 'b'], ['c', 'd'], ['e']]),
+    ('more_shards_than_items',
+     ['a', 'b'], 4, [['a'], ['b']]),
+    ('single_shard',
+     ['a', 'b', 'c'], 1, [['a', 'b', 'c']]),
+    ('no_items',
+     [], 3, []),
+  ])
+  def test_split_into_shards(self, test_case_name_suffix, item_names, num_shards, expected_shards):
+    self.assertEqual(sharding.split_into_shards(item_names, num_shards), expected_shards)
+
+
+class TestShardFile(unittest.TestCase):
+  
+  def setUp(self):
+    self.temp_dirpath = tempfile.mkdtemp()
+  
+  def tearDown(self):
+    shutil.rmtree(self.temp_dirpath)
+  
+  def test_write_and_read_shard_file(self):
+    resolved_names = {
+      'bottom-frame': 'bottom-frame.png',
+      'top-frame': 'top-frame (1).png',
+      ('Frames', pg.itemtree.FOLDER_KEY): 'Frames (1)',
+    }
+    shard_filepath = os.path.join(self.temp_dirpath, 'shard.json')
+    result_filepath = os.path.join(self.temp_dirpath, 'result.json')
+    
+    sharding.write_shard_file(
+      shard_filepath, ['bottom-frame', 'top-frame'], resolved_names, result_filepath)
+    
+    shard = sharding.read_shard_file(shard_filepath)
+    
+    self.assertEqual(shard['items'], ['bottom-frame', 'top-frame'])
+    self.assertEqual(shard['resolved_names'], resolved_names)
+    self.assertEqual(shard['result_filepath'], result_filepath)
+
+
+class TestGetWorkerCommand(unittest.TestCase):
+  
+  def test_get_worker_command_escapes_paths(self):
+    command = sharding.get_worker_command(
+      'gimp-console', 'C:\\image "1".xcf', 'config.json', 'shard.json')
+    
+    self.assertEqual(command[0], 'gimp-console')
+    self.assertIn('"C:\\\\image \\"1\\".xcf"', command[command.index('--batch') + 1])
+    self.assertIn(sharding.SHARD_PROCEDURE_NAME, command[command.index('--batch') + 1])
+    self.assertEqual(command[-1], '(gimp-quit 0)')
+
+
+class TestWaitForWorkers(unittest.TestCase):
+  
+  def setUp(self):
+    self.batcher = mock.Mock(should_stop=False)
+    
+    self.finished_process = mock.Mock(**{'poll.return_value': 0})
+    self.running_process = mock.Mock(**{'poll.return_value': None})
+    
+    patcher = mock.patch('export_layers.sharding.time.sleep')
+    patcher.start()
+    self.addCleanup(patcher.stop)
+  
+  def test_all_workers_finish(self):
+    killed_process_indexes = sharding._wait_for_workers(
+      self.batcher, [self.finished_process, self.finished_process], None)
+    
+    self.assertListEqual(killed_process_indexes, [])
+    self.assertEqual(self.batcher.progress_updater.update_tasks.call_count, 2)
+  
+  def test_workers_running_after_timeout_are_killed(self):
+    killed_process_indexes = sharding._wait_for_workers(
+      self.batcher, [self.finished_process, self.running_process], 0)
+    
+    self.assertListEqual(killed_process_indexes, [1])
+    self.running_process.kill.assert_called_once_with()
+    self.running_process.wait.assert_called_once_with()
+    self.assertFalse(self.finished_process.kill.called)
+  
+  def test_workers_are_killed_on_stop(self):
+    def _stop(*args, **kwargs):
+      self.batcher.should_stop = True
+    
+    self.batcher.progress_updater.update_text.side_effect = _stop
+    
+    killed_process_indexes = sharding._wait_for_workers(
+      self.batcher, [self.running_process, self.finished_process], None)
+    
+    self.assertListEqual(killed_process_indexes, [0])
+    self.running_process.kill.assert_called_once_with()
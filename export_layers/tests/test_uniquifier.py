@@ -204,3 +204,74 @@ class TestUniquify(unittest.TestCase):
   @staticmethod
   def _preprocess_name(item):
     item.name = item.name.replace(':', '')
+
+
+class _ItemStub(object):
+  
+  def __init__(self, name, parent=None):
+    self.name = name
+    self.parent = parent
+
+
+class TestUniquifyManyItemsWithSameName(unittest.TestCase):
+  
+  def test_uniquify(self):
+    item_uniquifier = uniquifier.ItemUniquifier()
+    items = [_ItemStub('Layer') for unused_ in range(5)]
+    items.insert(2, _ItemStub('Layer (2)'))
+    items.append(_ItemStub('Layer (4)'))
+    
+    for item in items:
+      item_uniquifier.uniquify(item)
+    
+    self.assertListEqual(
+      [item.name for item in items],
+      ['Layer', 'Layer (1)', 'Layer (2)', 'Layer (3)', 'Layer (4)', 'Layer (5)', 'Layer (4) (1)'])
+  
+  def test_uniquify_with_custom_generator(self):
+    def _generate_unique_copy_string():
+      i = 1
+      while True:
+        yield ' - copy {}'.format(i)
+        i += 1
+    
+    item_uniquifier = uniquifier.ItemUniquifier(generator=_generate_unique_copy_string())
+    items = [_ItemStub('Layer') for unused_ in range(3)]
+    
+    for item in items:
+      item_uniquifier.uniquify(item)
+    
+    self.assertListEqual(
+      [item.name for item in items], ['Layer', 'Layer - copy 1', 'Layer - copy 2'])
+  
+  def test_uniquify_probes_constant_number_of_names_per_item_with_same_name(self):
+    num_items = 100
+    
+    parent = _ItemStub('Group')
+    items = [_ItemStub('Layer', parent) for unused_ in range(num_items)]
+    
+    item_uniquifier = uniquifier.ItemUniquifier()
+    item_uniquifier.uniquify(items[0])
+    
+    item_names = _LookupCountingSet(item_uniquifier._uniquified_item_names[parent])
+    item_uniquifier._uniquified_item_names[parent] = item_names
+    
+    for item in items[1:]:
+      item_uniquifier.uniquify(item)
+    
+    self.assertEqual(items[-1].name, 'Layer ({})'.format(num_items - 1))
+    # One lookup detects the duplicate name and one lookup checks the new name.
+    # Probing numbers from 1 for each item would make the count quadratic.
+    self.assertEqual(item_names.num_lookups, 2 * (num_items - 1))
+
+
+class _LookupCountingSet(set):
+  
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    
+    self.num_lookups = 0
+  
+  def __contains__(self, element):
+    self.num_lookups += 1
+    return super().__contains__(element)
@@ -24,6 +24,11 @@ class ItemUniquifier(object):
     # key: `Item` instance (parent) or None (item tree root)
     # value: set of `Item.name` strings
     self._uniquified_item_names = {}
+    
+    # key: (`Item` instance (parent) or None, `Item.name`, position)
+    # value: number in the unique substring to try first for the next item with
+    #  the same name
+    self._next_unique_numbers = {}
   
   def uniquify(self, item, position=None):
     """Renames the `Item` instance by making it unique among all other `Item`
@@ -43,6 +48,10 @@ class ItemUniquifier(object):
     * `position` - Position (index) where a unique substring is inserted into
       the item's name. If `None`, insert the substring at the end of the name
       (i.e. append it).
+    
+    If `generator` is `None`, the number in the unique substring is tracked for
+    each parent, name and position, so that names already taken are not tried
+    again.
     """
     parent = item.parent
     
@@ -56,8 +65,11 @@ class ItemUniquifier(object):
       
       has_same_name = item.name in self._uniquified_item_names[parent]
       if has_same_name:
-        item.name = pg.path.uniquify_string(
-          item.name, self._uniquified_item_names[parent], position, generator=self.generator)
+        if self.generator is None:
+          item.name = self._get_name_with_unique_number(parent, item.name, position)
+        else:
+          item.name = pg.path.uniquify_string(
+            item.name, self._uniquified_item_names[parent], position, generator=self.generator)
       
       self._uniquified_item_names[parent].add(item.name)
   
@@ -65,3 +77,26 @@ class ItemUniquifier(object):
     """Clears cache of items passed to `uniquify()`."""
     self._uniquified_items = {}
     self._uniquified_item_names = {}
+    self._next_unique_numbers = {}
+  
+  def _get_name_with_unique_number(self, parent, name, position):
+    # Names under a parent are never removed until `reset()` is called. Numbers
+    # smaller than the stored number are therefore still taken and the result
+    # is identical to that of `pg.path.uniquify_string()`.
+    if position is None:
+      position = len(name)
+    
+    key = (parent, name, position)
+    uniquified_item_names = self._uniquified_item_names[parent]
+    
+    number = self._next_unique_numbers.get(key, 1)
+    
+    while True:
+      unique_name = '{}{}{}'.format(name[0:position], ' ({})'.format(number), name[position:])
+      number += 1
+      if unique_name not in uniquified_item_names:
+        break
+    
+    self._next_unique_numbers[key] = number
+    
+    return unique_name